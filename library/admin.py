@@ -6,7 +6,110 @@ Good reference for seeing the data and testing relationships.
 """
 
 from django.contrib import admin
-from .models import Author, Book, Member, MemberProfile, Loan, Tag, BookTag
+from django.contrib.admin.views.main import PAGE_VAR
+from django.db import transaction
+from django.db.models import BooleanField, Case, Value, When
+from django.db.models.functions import Now
+from .models import (
+    ArchivedLoan, Author, Book, Job, Member, MemberProfile, Loan, Tag, BookTag, RecommendationBuild,
+    RiskRecomputeRun, chunked, expand_ranges, pk_ranges, range_size,
+)
+from . import availability, jobs, search
+from .pagination import ApproximateCountPaginator
+
+
+class CountRangeFilter(admin.SimpleListFilter):
+    """
+    Sidebar filter over an annotated count column.
+    Subclasses set ``parameter_name`` to the annotation name.
+    """
+    ranges = (
+        ('0', 'None', 0, 0),
+        ('1-5', '1 to 5', 1, 5),
+        ('6-20', '6 to 20', 6, 20),
+        ('21+', 'More than 20', 21, None),
+    )
+
+    def lookups(self, request, model_admin):
+        return [(key, label) for key, label, _, _ in self.ranges]
+
+    def queryset(self, request, queryset):
+        for key, _, low, high in self.ranges:
+            if self.value() == key:
+                queryset = queryset.filter(**{f'{self.parameter_name}__gte': low})
+                if high is not None:
+                    queryset = queryset.filter(**{f'{self.parameter_name}__lte': high})
+                return queryset
+        return queryset
+
+
+class LoanCountFilter(CountRangeFilter):
+    title = 'total loans'
+    parameter_name = 'loan_count'
+
+
+class BookCountFilter(CountRangeFilter):
+    title = 'number of books'
+    parameter_name = 'book_count'
+
+
+class InputFilter(admin.SimpleListFilter):
+    """
+    Sidebar filter rendered as a text box instead of a list of choices,
+    so the page does not grow with the size of the related table.
+    """
+    template = 'admin/library/input_filter.html'
+
+    def lookups(self, request, model_admin):
+        # Must be non-empty for the filter to be displayed
+        return ((None, None),)
+
+    def choices(self, changelist):
+        # Keep every other query parameter (except the page) when submitting
+        query_parts = []
+        for key, value in changelist.params.items():
+            if key in (self.parameter_name, PAGE_VAR):
+                continue
+            for item in value if isinstance(value, list) else [value]:
+                query_parts.append((key, item))
+        yield {
+            'selected': self.value() is None,
+            'query_string': changelist.get_query_string(remove=[self.parameter_name]),
+            'query_parts': query_parts,
+        }
+
+
+class AuthorFilter(InputFilter):
+    """Filter books by author id or by part of the author's name."""
+    title = 'author'
+    parameter_name = 'author'
+
+    def queryset(self, request, queryset):
+        value = (self.value() or '').strip()
+        if not value:
+            return queryset
+        if value.isdigit():
+            return queryset.filter(author_id=int(value))
+        return queryset.filter(author__name__icontains=value)
+
+
+class ApproximateCountMixin:
+    """
+    Changelist settings for tables too large to count on every page view:
+    no "N total" COUNT, and counts capped by ``ApproximateCountPaginator``.
+    """
+    paginator = ApproximateCountPaginator
+    show_full_result_count = False
+
+    def get_paginator(self, request, queryset, per_page, orphans=0, allow_empty_first_page=True):
+        return self.paginator(
+            queryset, per_page, orphans, allow_empty_first_page, page_number=request.GET.get(PAGE_VAR, 1)
+        )
+
+
+def is_autocomplete(request):
+    """True for the admin's autocomplete endpoint, which only needs plain rows."""
+    return getattr(request.resolver_match, 'url_name', None) == 'autocomplete'
 
 
 @admin.register(Author)
@@ -29,12 +132,14 @@ class AuthorAdmin(admin.ModelAdmin):
 
 
 @admin.register(Book)
-class BookAdmin(admin.ModelAdmin):
+class BookAdmin(ApproximateCountMixin, admin.ModelAdmin):
     """Admin interface for Book model."""
     list_display = ('title', 'author', 'isbn', 'status', 'is_available', 'created_at')
-    list_filter = ('status', 'author', 'created_at')
+    list_select_related = ('author',)
+    list_filter = ('status', AuthorFilter, 'created_at')
     search_fields = ('title', 'isbn', 'author__name')
     readonly_fields = ('created_at', 'is_available')
+    autocomplete_fields = ('author',)
 
     fieldsets = (
         ('Book Information', {
@@ -52,15 +157,49 @@ class BookAdmin(admin.ModelAdmin):
 
     actions = ['mark_as_available', 'mark_as_lost']
 
+    def get_queryset(self, request):
+        """Load the author with each book; ``Book.__str__`` (and autocomplete) shows it."""
+        return super().get_queryset(request).select_related('author')
+
+    def get_search_results(self, request, queryset, search_term):
+        """Use the FTS5 index for title/author/tag search and an exact ISBN match."""
+        search_term = search_term.strip()
+        if not search_term or not search.is_available() or not search.build_match_query(search_term):
+            return super().get_search_results(request, queryset, search_term)
+        matches = search.filter_books(queryset, search_term) | queryset.filter(isbn=search_term)
+        return matches, False
+
+    def update_status(self, book_ids, status):
+        """Set ``status`` on every book in ``book_ids`` and write it through to the cache."""
+        with transaction.atomic():
+            return sum(jobs.set_chunk_status(chunk, status) for chunk in chunked(book_ids))
+
+    def delete_queryset(self, request, queryset):
+        """Delete the books and drop them from the availability cache."""
+        rows = list(queryset.values_list('pk', 'isbn'))
+        super().delete_queryset(request, queryset)
+        availability.invalidate(book_ids=[pk for pk, _ in rows], isbns=[isbn for _, isbn in rows])
+
+    def mark_as(self, request, queryset, status):
+        """Set ``status`` inline, or through a background job for large selections."""
+        label = status.lower()
+        book_ranges = pk_ranges(queryset)
+        selected = range_size(book_ranges)
+        if selected > jobs.inline_limit():
+            # The payload holds id ranges, not every id, so "select all" stays small
+            job = jobs.enqueue('books.set_status', book_ranges=book_ranges, status=status)
+            self.message_user(request, f'{selected} books will be marked as {label} by job #{job.pk}.')
+            return
+        updated = self.update_status(list(expand_ranges(book_ranges)), status)
+        self.message_user(request, f'{updated} books marked as {label}.')
+
     def mark_as_available(self, request, queryset):
         """Admin action to mark books as available."""
-        updated = queryset.update(status='AVAILABLE')
-        self.message_user(request, f'{updated} books marked as available.')
+        self.mark_as(request, queryset, 'AVAILABLE')
 
     def mark_as_lost(self, request, queryset):
         """Admin action to mark books as lost."""
-        updated = queryset.update(status='LOST')
-        self.message_user(request, f'{updated} books marked as lost.')
+        self.mark_as(request, queryset, 'LOST')
 
     mark_as_available.short_description = "Mark selected books as available"
     mark_as_lost.short_description = "Mark selected books as lost"
@@ -69,17 +208,17 @@ class BookAdmin(admin.ModelAdmin):
 @admin.register(Member)
 class MemberAdmin(admin.ModelAdmin):
     """Admin interface for Member model."""
-    list_display = ('full_name', 'email', 'joined_at', 'loan_count')
-    list_filter = ('joined_at',)
+    list_display = ('full_name', 'email', 'joined_at', 'loan_count', 'active_loan_count')
+    list_filter = ('joined_at', LoanCountFilter)
     search_fields = ('full_name', 'email')
-    readonly_fields = ('joined_at', 'loan_count')
+    readonly_fields = ('joined_at', 'loan_count', 'active_loan_count')
 
     fieldsets = (
         ('Member Information', {
             'fields': ('full_name', 'email')
         }),
         ('Statistics', {
-            'fields': ('loan_count',),
+            'fields': ('loan_count', 'active_loan_count'),
             'classes': ('collapse',)
         }),
         ('Metadata', {
@@ -88,20 +227,35 @@ class MemberAdmin(admin.ModelAdmin):
         }),
     )
 
+    def get_queryset(self, request):
+        """Annotate loan counts so the changelist does not COUNT per row."""
+        queryset = super().get_queryset(request)
+        return queryset if is_autocomplete(request) else queryset.with_loan_counts()
+
     def loan_count(self, obj):
-        """Display total number of loans for the member."""
-        return obj.loans.count()
+        """Display total number of loans for the member, archived ones included."""
+        return getattr(obj, 'loan_count', 0)
 
     loan_count.short_description = "Total Loans"
+    loan_count.admin_order_field = 'loan_count'
+
+    def active_loan_count(self, obj):
+        """Display number of loans not yet returned."""
+        return getattr(obj, 'active_loan_count', 0)
+
+    active_loan_count.short_description = "Active Loans"
+    active_loan_count.admin_order_field = 'active_loan_count'
 
 
 @admin.register(MemberProfile)
 class MemberProfileAdmin(admin.ModelAdmin):
     """Admin interface for MemberProfile model."""
     list_display = ('member', 'nickname', 'risk_level', 'updated_at')
+    list_select_related = ('member',)
     list_filter = ('risk_level', 'updated_at')
     search_fields = ('member__full_name', 'nickname')
     readonly_fields = ('created_at', 'updated_at')
+    autocomplete_fields = ('member',)
 
     fieldsets = (
         ('Profile Information', {
@@ -119,15 +273,18 @@ class BookTagInline(admin.TabularInline):
     model = BookTag
     extra = 1
     readonly_fields = ('added_at',)
+    autocomplete_fields = ('book', 'tag')
 
 
 @admin.register(Loan)
-class LoanAdmin(admin.ModelAdmin):
+class LoanAdmin(ApproximateCountMixin, admin.ModelAdmin):
     """Admin interface for Loan model."""
     list_display = ('book', 'member', 'loaned_at', 'due_at', 'is_active', 'is_overdue')
+    list_select_related = ('book__author', 'member')
     list_filter = ('loaned_at', 'due_at', 'returned_at')
     search_fields = ('book__title', 'member__full_name')
     readonly_fields = ('loaned_at', 'is_active', 'is_overdue')
+    autocomplete_fields = ('book', 'member')
 
     fieldsets = (
         ('Loan Information', {
@@ -144,35 +301,71 @@ class LoanAdmin(admin.ModelAdmin):
 
     actions = ['mark_as_returned']
 
+    def get_queryset(self, request):
+        """Compute the overdue flag in SQL so it can be sorted on."""
+        return super().get_queryset(request).annotate(
+            overdue_flag=Case(
+                When(returned_at__isnull=True, due_at__lt=Now(), then=Value(True)),
+                default=Value(False),
+                output_field=BooleanField(),
+            )
+        )
+
     def is_active(self, obj):
         """Show if loan is active (not returned)."""
         return obj.returned_at is None
 
     is_active.boolean = True
     is_active.short_description = "Is Active"
+    is_active.admin_order_field = 'returned_at'
 
     def is_overdue(self, obj):
         """Show if loan is overdue."""
+        if hasattr(obj, 'overdue_flag'):
+            return obj.overdue_flag
         return obj.is_overdue
 
     is_overdue.boolean = True
     is_overdue.short_description = "Is Overdue"
+    is_overdue.admin_order_field = 'overdue_flag'
 
     def mark_as_returned(self, request, queryset):
-        """Admin action to mark loans as returned."""
-        count = 0
-        for loan in queryset.filter(returned_at__isnull=True):
-            loan.return_book()
-            count += 1
-        self.message_user(request, f'{count} loans marked as returned.')
+        """Admin action to mark loans as returned; large selections go to a background job."""
+        loan_ranges = pk_ranges(queryset.filter(returned_at__isnull=True))
+        selected = range_size(loan_ranges)
+        if selected > jobs.inline_limit():
+            job = jobs.enqueue('loans.return', loan_ranges=loan_ranges)
+            self.message_user(request, f'{selected} loans will be marked as returned by job #{job.pk}.')
+            return
+        loans_returned, books_updated = Loan.objects.bulk_return(queryset)
+        self.message_user(
+            request,
+            f'{loans_returned} loans marked as returned, {books_updated} books marked as available.'
+        )
 
     mark_as_returned.short_description = "Mark selected loans as returned"
 
 
+@admin.register(ArchivedLoan)
+class ArchivedLoanAdmin(admin.ModelAdmin):
+    """Read-only view of loans moved out by ``archive_loans``."""
+    list_display = ('id', 'book', 'member', 'loaned_at', 'due_at', 'returned_at')
+    list_select_related = ('book__author', 'member')
+    list_filter = ('returned_at',)
+    search_fields = ('book__title', 'member__full_name')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
 @admin.register(Tag)
 class TagAdmin(admin.ModelAdmin):
     """Admin interface for Tag model."""
     list_display = ('name', 'book_count')
+    list_filter = (BookCountFilter,)
     search_fields = ('name', 'description')
     readonly_fields = ('book_count',)
 
@@ -186,20 +379,28 @@ class TagAdmin(admin.ModelAdmin):
         }),
     )
 
+    def get_queryset(self, request):
+        """Annotate the book count so the changelist does not COUNT per row."""
+        queryset = super().get_queryset(request)
+        return queryset if is_autocomplete(request) else queryset.with_book_counts()
+
     def book_count(self, obj):
         """Display number of books with this tag."""
-        return obj.book_tags.count()
+        return getattr(obj, 'book_count', 0)
 
     book_count.short_description = "Number of Books"
+    book_count.admin_order_field = 'book_count'
 
 
 @admin.register(BookTag)
-class BookTagAdmin(admin.ModelAdmin):
+class BookTagAdmin(ApproximateCountMixin, admin.ModelAdmin):
     """Admin interface for BookTag model (through table)."""
     list_display = ('book', 'tag', 'added_at')
+    list_select_related = ('book__author', 'tag')
     list_filter = ('tag', 'added_at')
     search_fields = ('book__title', 'tag__name')
     readonly_fields = ('added_at',)
+    autocomplete_fields = ('book', 'tag')
 
     fieldsets = (
         ('Relationship', {
@@ -210,3 +411,56 @@ class BookTagAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         }),
     )
+
+
+@admin.register(RiskRecomputeRun)
+class RiskRecomputeRunAdmin(admin.ModelAdmin):
+    """Read-only history of risk recomputation runs."""
+    list_display = ('started_at', 'finished_at', 'incremental', 'members_scanned', 'profiles_changed')
+    list_filter = ('incremental',)
+    readonly_fields = ('started_at', 'finished_at', 'incremental', 'members_scanned', 'profiles_changed')
+
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(RecommendationBuild)
+class RecommendationBuildAdmin(admin.ModelAdmin):
+    """Read-only history of "also borrowed" recommendation builds."""
+    list_display = ('started_at', 'finished_at', 'incremental', 'last_loan_id', 'books_updated')
+    list_filter = ('incremental',)
+    readonly_fields = ('started_at', 'finished_at', 'incremental', 'last_loan_id', 'books_updated')
+
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    """Read-only view of the background job queue, with a retry action."""
+    list_display = ('id', 'kind', 'status', 'progress_display', 'attempts', 'created_at', 'finished_at', 'worker')
+    list_filter = ('status', 'kind')
+    readonly_fields = (
+        'kind', 'payload', 'status', 'attempts', 'max_attempts', 'run_after', 'created_at', 'started_at',
+        'finished_at', 'heartbeat_at', 'worker', 'progress', 'total', 'result', 'error',
+    )
+    actions = ['retry_jobs']
+
+    def has_add_permission(self, request):
+        return False
+
+    def progress_display(self, obj):
+        if obj.total:
+            return f"{obj.progress}/{obj.total} ({100 * obj.progress // obj.total}%)"
+        return obj.progress
+
+    progress_display.short_description = "Progress"
+
+    def retry_jobs(self, request, queryset):
+        """Put FAILED jobs back in the queue with a fresh set of attempts."""
+        requeued = queryset.filter(status='FAILED').update(
+            status='QUEUED', attempts=0, run_after=Now(), finished_at=None
+        )
+        self.message_user(request, f'{requeued} failed jobs queued again.')
+
+    retry_jobs.short_description = "Retry selected failed jobs"
@@ -2,8 +2,16 @@
 Apps configuration for library app.
 """
 from django.apps import AppConfig
+from django.core import checks
+from django.db.backends.signals import connection_created
 
 
 class LibraryConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'library'
+
+    def ready(self):
+        from .availability import check_shared_cache
+        from .db import configure_sqlite
+        connection_created.connect(configure_sqlite, dispatch_uid='library_configure_sqlite')
+        checks.register(check_shared_cache, checks.Tags.caches)
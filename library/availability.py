@@ -0,0 +1,203 @@
+"""
+Cache of book availability.
+
+``Book.status`` is cached per book id, and each ISBN maps to its book id,
+so "is this ISBN available right now" is usually answered without a
+database read. The cache is write-through: every code path that changes a
+book's status (``Book.save``, the bulk Loan operations and the admin bulk
+actions) calls ``set_statuses()``, deferred until the surrounding
+transaction commits so a rollback never leaves a wrong value behind.
+
+The cache alias and timeout come from the ``LIBRARY_AVAILABILITY_CACHE``
+and ``LIBRARY_AVAILABILITY_TIMEOUT`` settings. Statuses also change in
+``run_worker`` jobs and management commands, so the cache must be shared
+by every process: a per-process LocMemCache fails the ``library.E001``
+system check, and ``LIBRARY_AVAILABILITY_CACHE = None`` turns caching off
+(every lookup reads the database). Hit/miss counters are per process.
+"""
+
+from collections import Counter
+
+from django.conf import settings
+from django.core import checks
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+
+
+STATUS_KEY = 'library:book-status:{}'
+ISBN_KEY = 'library:book-isbn:{}'
+
+_stats = Counter()
+
+
+def get_cache():
+    """The availability cache, or None if caching is turned off."""
+    alias = getattr(settings, 'LIBRARY_AVAILABILITY_CACHE', 'default')
+    return None if alias is None else caches[alias]
+
+
+def get_timeout():
+    return getattr(settings, 'LIBRARY_AVAILABILITY_TIMEOUT', 3600)
+
+
+def get_many(ids=(), isbns=()):
+    """
+    Return ``{book_id: status}`` and ``{isbn: book_id}`` for the given books.
+
+    Cache misses are loaded with a single query and written back. Unknown
+    ids and ISBNs are left out of the result.
+    """
+    cache = get_cache()
+    lookup = _Lookup(ids, isbns)
+    if cache is not None and lookup.isbns:
+        lookup.add_isbn_hits(cache.get_many(lookup.isbn_keys()))
+    if cache is not None and lookup.ids:
+        lookup.add_status_hits(cache.get_many(lookup.status_keys()))
+    queryset = lookup.missing_queryset()
+    if queryset is not None:
+        entries = lookup.add_loaded(queryset)
+        if cache is not None:
+            cache.set_many(entries, timeout=get_timeout())
+    return lookup.statuses, lookup.isbn_to_id
+
+
+async def aget_many(ids=(), isbns=()):
+    """Async version of ``get_many()`` using the async cache and ORM APIs."""
+    cache = get_cache()
+    lookup = _Lookup(ids, isbns)
+    if cache is not None and lookup.isbns:
+        lookup.add_isbn_hits(await cache.aget_many(lookup.isbn_keys()))
+    if cache is not None and lookup.ids:
+        lookup.add_status_hits(await cache.aget_many(lookup.status_keys()))
+    queryset = lookup.missing_queryset()
+    if queryset is not None:
+        entries = lookup.add_loaded([row async for row in queryset])
+        if cache is not None:
+            await cache.aset_many(entries, timeout=get_timeout())
+    return lookup.statuses, lookup.isbn_to_id
+
+
+class _Lookup:
+    """Bookkeeping shared by ``get_many()`` and ``aget_many()``."""
+
+    def __init__(self, ids, isbns):
+        self.ids = set(ids)
+        self.isbns = list(isbns)
+        self.isbn_to_id = {}
+        self.statuses = {}
+
+    def isbn_keys(self):
+        return [ISBN_KEY.format(isbn) for isbn in self.isbns]
+
+    def status_keys(self):
+        return [STATUS_KEY.format(book_id) for book_id in self.ids]
+
+    def add_isbn_hits(self, cached):
+        for isbn in self.isbns:
+            book_id = cached.get(ISBN_KEY.format(isbn))
+            if book_id is not None:
+                self.isbn_to_id[isbn] = book_id
+                self.ids.add(book_id)
+
+    def add_status_hits(self, cached):
+        for book_id in self.ids:
+            key = STATUS_KEY.format(book_id)
+            if key in cached:
+                self.statuses[book_id] = cached[key]
+
+    def missing_queryset(self):
+        """Query for everything not found in the cache, or None if nothing is missing."""
+        from .models import Book
+
+        missing_ids = self.ids - self.statuses.keys()
+        missing_isbns = [isbn for isbn in self.isbns if isbn not in self.isbn_to_id]
+        _stats['hits'] += len(self.statuses) + len(self.isbn_to_id)
+        _stats['misses'] += len(missing_ids) + len(missing_isbns)
+        if not missing_ids and not missing_isbns:
+            return None
+        rows = Book.objects.none()
+        if missing_ids:
+            rows |= Book.objects.filter(pk__in=missing_ids)
+        if missing_isbns:
+            rows |= Book.objects.filter(isbn__in=missing_isbns)
+        return rows.order_by().values_list('pk', 'isbn', 'status')
+
+    def add_loaded(self, rows):
+        """Merge ``(pk, isbn, status)`` rows and return the cache entries to write."""
+        entries = {}
+        wanted_isbns = set(self.isbns)
+        for book_id, isbn, status in rows:
+            self.statuses[book_id] = status
+            if isbn in wanted_isbns:
+                self.isbn_to_id[isbn] = book_id
+            entries[STATUS_KEY.format(book_id)] = status
+            entries[ISBN_KEY.format(isbn)] = book_id
+        return entries
+
+
+def get_status(book_id):
+    """Return the status of one book, or None if it does not exist."""
+    statuses, _ = get_many(ids=[book_id])
+    return statuses.get(book_id)
+
+
+def get_status_by_isbn(isbn):
+    """Return the status of the book with ``isbn``, or None if it does not exist."""
+    statuses, isbn_to_id = get_many(isbns=[isbn])
+    return statuses.get(isbn_to_id.get(isbn))
+
+
+def is_available(book_id=None, isbn=None):
+    """True if the book (given by id or ISBN) exists and is AVAILABLE."""
+    status = get_status(book_id) if book_id is not None else get_status_by_isbn(isbn)
+    return status == 'AVAILABLE'
+
+
+def set_statuses(statuses):
+    """Write ``{book_id: status}`` through to the cache once the transaction commits."""
+    if not statuses or get_cache() is None:
+        return
+    values = {STATUS_KEY.format(book_id): status for book_id, status in statuses.items()}
+    transaction.on_commit(lambda: get_cache().set_many(values, timeout=get_timeout()))
+
+
+def set_status(book_ids, status):
+    """Write the same ``status`` for every id in ``book_ids``."""
+    set_statuses({book_id: status for book_id in book_ids})
+
+
+def invalidate(book_ids=(), isbns=()):
+    """Drop cached entries, e.g. after books are deleted or their ISBN changes."""
+    keys = [STATUS_KEY.format(book_id) for book_id in book_ids]
+    keys += [ISBN_KEY.format(isbn) for isbn in isbns]
+    if keys and get_cache() is not None:
+        transaction.on_commit(lambda: get_cache().delete_many(keys))
+
+
+def check_shared_cache(app_configs=None, **kwargs):
+    """System check: refuse a per-process cache, which other processes' writes never reach."""
+    cache = get_cache()
+    if not isinstance(cache, LocMemCache):
+        return []
+    return [checks.Error(
+        f"LIBRARY_AVAILABILITY_CACHE ({settings.LIBRARY_AVAILABILITY_CACHE!r}) is a per-process LocMemCache.",
+        hint=(
+            "Status changes made by run_worker and management commands would not reach the web "
+            "process. Use a cache shared by all processes (e.g. set LIBRARY_REDIS_URL), or set "
+            "LIBRARY_AVAILABILITY_CACHE = None."
+        ),
+        obj='library.availability',
+        id='library.E001',
+    )]
+
+
+def stats():
+    """Return hit/miss counters and the hit ratio for this process."""
+    hits, misses = _stats['hits'], _stats['misses']
+    total = hits + misses
+    return {'hits': hits, 'misses': misses, 'hit_ratio': hits / total if total else 0.0}
+
+
+def reset_stats():
+    _stats.clear()
@@ -0,0 +1,88 @@
+"""
+Small benchmarking helpers for the library app.
+
+Used by the ``bench_library`` management command to time a callable
+repeatedly and summarize latency percentiles and query counts.
+"""
+
+import statistics
+import time
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def measure(name, func, iterations=100, warmup=5, setup=None, teardown=None):
+    """
+    Run ``func`` ``iterations`` times and return a result dict.
+
+    ``setup`` is called before each run and its return value is passed to
+    ``func``; ``teardown`` receives the return value of ``func``. Neither is
+    included in the timings or query counts.
+    """
+    def run_once():
+        arg = setup() if setup else None
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            result = func(arg) if setup else func()
+            elapsed = time.perf_counter() - start
+        if teardown:
+            teardown(result)
+        return elapsed, len(queries)
+
+    for _ in range(warmup):
+        run_once()
+
+    latencies = []
+    query_counts = []
+    for _ in range(iterations):
+        elapsed, query_count = run_once()
+        latencies.append(elapsed)
+        query_counts.append(query_count)
+
+    latencies.sort()
+    total = sum(latencies)
+    return {
+        'name': name,
+        'iterations': iterations,
+        'ops_per_sec': iterations / total if total else 0.0,
+        'mean_ms': statistics.fmean(latencies) * 1000,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p95_ms': percentile(latencies, 95) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'queries_per_op': statistics.fmean(query_counts),
+        'max_queries': max(query_counts),
+    }
+
+
+def compare(results, baseline):
+    """
+    Compare two lists of result dicts by benchmark name.
+    Returns ``(name, baseline_ops, current_ops, change_pct, query_delta)`` rows.
+    """
+    previous = {result['name']: result for result in baseline}
+    rows = []
+    for result in results:
+        before = previous.get(result['name'])
+        if before is None:
+            continue
+        change = (
+            (result['ops_per_sec'] - before['ops_per_sec']) / before['ops_per_sec'] * 100
+            if before['ops_per_sec'] else 0.0
+        )
+        rows.append((
+            result['name'],
+            before['ops_per_sec'],
+            result['ops_per_sec'],
+            change,
+            result['queries_per_op'] - before['queries_per_op'],
+        ))
+    return rows
@@ -0,0 +1,124 @@
+"""
+Bulk catalog import with ISBN upsert.
+
+Input records are dicts with ``isbn``, ``title`` and ``author`` keys and
+optional ``country`` and ``tags`` (a list, or a ``|``-separated string in
+CSV files). Records are processed in chunks; each chunk is one transaction
+that resolves authors and tags through in-memory name -> id maps, upserts
+books on their unique ISBN with ``bulk_create(update_conflicts=True)`` and
+links tags with ``bulk_create(ignore_conflicts=True)``. Re-running a chunk
+is harmless, which is what makes resuming after a failure safe.
+"""
+
+import csv
+import json
+
+from django.db import transaction
+
+from .models import Author, Book, BookTag, Tag, chunked
+
+
+TAG_SEPARATOR = '|'
+
+ISBN_MAX_LENGTH = Book._meta.get_field('isbn').max_length
+TITLE_MAX_LENGTH = Book._meta.get_field('title').max_length
+
+
+class InvalidRecord(ValueError):
+    """Raised for an input record that cannot be imported."""
+
+
+def read_records(fh, fmt):
+    """Yield input records from an open CSV or NDJSON file."""
+    if fmt == 'csv':
+        yield from csv.DictReader(fh)
+    elif fmt == 'ndjson':
+        for line in fh:
+            if line.strip():
+                yield json.loads(line)
+    else:
+        raise ValueError(f"Unknown format: {fmt!r}")
+
+
+def clean_record(record):
+    """Return a normalized ``(isbn, title, author, country, tags)`` tuple."""
+    isbn = (record.get('isbn') or '').strip()
+    title = (record.get('title') or '').strip()
+    author = (record.get('author') or '').strip()
+    if not isbn or not title or not author:
+        raise InvalidRecord("isbn, title and author are required")
+    if len(isbn) > ISBN_MAX_LENGTH:
+        raise InvalidRecord(f"isbn longer than {ISBN_MAX_LENGTH} characters")
+    tags = record.get('tags') or []
+    if isinstance(tags, str):
+        tags = tags.split(TAG_SEPARATOR)
+    tags = sorted({tag.strip() for tag in tags if tag.strip()})
+    country = (record.get('country') or '').strip() or None
+    return isbn, title[:TITLE_MAX_LENGTH], author, country, tags
+
+
+class CatalogImporter:
+    """Imports chunks of cleaned records, keeping author and tag id maps between chunks."""
+
+    def __init__(self):
+        self.author_ids = {}
+        self.tag_ids = {}
+        self.books_upserted = 0
+        self.tags_linked = 0
+
+    def import_chunk(self, records):
+        """Import a list of cleaned records in one transaction."""
+        # Last occurrence of an ISBN wins within a chunk
+        by_isbn = {record[0]: record for record in records}
+        with transaction.atomic():
+            self.resolve_authors({(author, country) for _, _, author, country, _ in by_isbn.values()})
+            self.resolve_tags({tag for *_, tags in by_isbn.values() for tag in tags})
+
+            books = Book.objects.bulk_create(
+                [
+                    Book(isbn=isbn, title=title, author_id=self.author_ids[author])
+                    for isbn, title, author, _, _ in by_isbn.values()
+                ],
+                update_conflicts=True,
+                unique_fields=['isbn'],
+                update_fields=['title', 'author'],
+            )
+            book_ids = self.book_ids(books)
+            self.books_upserted += len(books)
+
+            links = [
+                BookTag(book_id=book_ids[isbn], tag_id=self.tag_ids[tag])
+                for isbn, *_, tags in by_isbn.values() for tag in tags
+            ]
+            BookTag.objects.bulk_create(links, ignore_conflicts=True)
+            self.tags_linked += len(links)
+
+    def resolve_authors(self, authors):
+        """Fill ``author_ids`` for every ``(name, country)``, creating missing authors."""
+        missing = {name: country for name, country in authors if name not in self.author_ids}
+        for chunk in chunked(missing):
+            for pk, name in Author.objects.filter(name__in=chunk).order_by('-pk').values_list('pk', 'name'):
+                self.author_ids[name] = pk
+        created = Author.objects.bulk_create(
+            Author(name=name, country=country) for name, country in missing.items()
+            if name not in self.author_ids
+        )
+        self.author_ids.update((author.name, author.pk) for author in created)
+
+    def resolve_tags(self, names):
+        """Fill ``tag_ids`` for every tag name, creating missing tags."""
+        missing = [name for name in names if name not in self.tag_ids]
+        if not missing:
+            return
+        Tag.objects.bulk_create((Tag(name=name) for name in missing), ignore_conflicts=True)
+        for chunk in chunked(missing):
+            self.tag_ids.update(Tag.objects.filter(name__in=chunk).values_list('name', 'pk'))
+
+    def book_ids(self, books):
+        """Map ISBN -> id for upserted books, querying only if the backend returned no ids."""
+        if all(book.pk for book in books):
+            return {book.isbn: book.pk for book in books}
+        ids = {}
+        for chunk in chunked([book.isbn for book in books]):
+            ids.update(Book.objects.filter(isbn__in=chunk).values_list('isbn', 'pk'))
+        return ids
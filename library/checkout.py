@@ -0,0 +1,97 @@
+"""
+Race-free checkout and return.
+
+``Loan.save()`` reads ``book.status`` in ``clean()`` and writes it back
+later, so two concurrent checkouts of the same book can both pass
+validation. Here the admission gate is a single conditional UPDATE
+("set LOANED where AVAILABLE"): exactly one caller gets a row count of 1
+and goes on to insert the loan in the same transaction, every other
+caller is rejected without doing any further work.
+
+SQLite reports lock contention as "database is locked"; those errors are
+retried a bounded number of times with jittered exponential backoff.
+"""
+
+import random
+import time
+
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, OperationalError, transaction
+from django.utils import timezone
+
+from . import availability
+from .models import Book, Loan
+
+
+MAX_RETRIES = 5
+BACKOFF_SECONDS = 0.01
+
+
+class BookUnavailable(ValidationError):
+    """The book exists but is not AVAILABLE, or does not exist at all."""
+
+
+def is_lock_error(exc):
+    return 'locked' in str(exc).lower()
+
+
+def with_lock_retry(func, retries=MAX_RETRIES, backoff=BACKOFF_SECONDS, on_retry=None):
+    """Call ``func`` and retry it on "database is locked" errors."""
+    for attempt in range(retries + 1):
+        try:
+            return func()
+        except OperationalError as exc:
+            if not is_lock_error(exc) or attempt == retries:
+                raise
+            if on_retry:
+                on_retry(attempt + 1)
+            time.sleep(backoff * (2 ** attempt) * random.uniform(0.5, 1.5))
+
+
+def checkout(book_id, member_id, due_at, retries=MAX_RETRIES, on_retry=None):
+    """
+    Check out ``book_id`` to ``member_id`` and return the new Loan.
+    Raises ``BookUnavailable`` if another checkout got the book first.
+    """
+    if due_at <= timezone.now():
+        raise ValidationError("Due date must be after the loan date")
+
+    def attempt():
+        with transaction.atomic():
+            claimed = Book.objects.filter(pk=book_id, status='AVAILABLE').update(status='LOANED')
+            if not claimed:
+                status = Book.objects.filter(pk=book_id).values_list('status', flat=True).first()
+                if status is None:
+                    raise BookUnavailable("Book does not exist")
+                raise BookUnavailable(f"Book is not available (status: {status})")
+            # Loan.save() would re-validate against the status we just changed
+            loan, = Loan.objects.bulk_create([Loan(book_id=book_id, member_id=member_id, due_at=due_at)])
+            availability.set_statuses({book_id: 'LOANED'})
+        return loan
+
+    try:
+        return with_lock_retry(attempt, retries=retries, on_retry=on_retry)
+    except IntegrityError as exc:
+        # Unknown member, or an active loan left behind with status AVAILABLE
+        raise ValidationError(f"Could not check out book {book_id}: {exc}") from exc
+
+
+def checkin(loan_id, returned_at=None, retries=MAX_RETRIES, on_retry=None):
+    """
+    Return an active loan; the conditional UPDATE on the loan is the gate.
+    Returns False if the loan was already returned (or does not exist).
+    """
+    returned_at = returned_at or timezone.now()
+
+    def attempt():
+        with transaction.atomic():
+            # Write first: a read would take a SHARED lock that SQLite cannot
+            # upgrade while another writer waits, failing without busy-waiting.
+            if not Loan.objects.filter(pk=loan_id, returned_at__isnull=True).update(returned_at=returned_at):
+                return False
+            book_id = Loan.objects.filter(pk=loan_id).values_list('book_id', flat=True).get()
+            Book.objects.filter(pk=book_id).update(status='AVAILABLE')
+            availability.set_statuses({book_id: 'AVAILABLE'})
+        return True
+
+    return with_lock_retry(attempt, retries=retries, on_retry=on_retry)
@@ -0,0 +1,105 @@
+"""
+Member dashboard: profile, active loans and recent history in one call.
+
+``member_summary()`` loads everything with a fixed number of queries
+however many loans the member has: the member joined to its profile, then
+one prefetch for the active loans and one each for the most recent
+returned loans in the hot table and in the archive, all joined to Book and
+Author. The two recent lists are merged in Python. The overdue and
+returned-late flags are computed in SQL against the database clock.
+"""
+
+from heapq import merge
+from itertools import islice
+
+from django.db.models import BooleanField, Case, F, Prefetch, Q, Value, When
+from django.db.models.functions import Now
+
+from .models import ArchivedLoan, Loan, Member
+
+
+RECENT_LOANS = 10
+
+
+def flag(condition):
+    return Case(When(condition, then=Value(True)), default=Value(False), output_field=BooleanField())
+
+
+def recent_returns(queryset, recent):
+    """The ``recent`` latest returned loans of ``queryset``, flagged if returned late."""
+    return (
+        queryset.filter(returned_at__isnull=False)
+        .select_related('book__author')
+        .annotate(returned_late=flag(Q(returned_at__gt=F('due_at'))))
+        .order_by('-returned_at', '-id')[:recent]
+    )
+
+
+def member_queryset(recent=RECENT_LOANS):
+    """
+    Members with profile, ``active_loans`` and the ``recent`` latest returned
+    loans of each store (``recent_loans`` and ``recent_archived_loans``) prefetched.
+    """
+    active = Loan.objects.select_related('book__author').active()
+    return Member.objects.select_related('profile').prefetch_related(
+        Prefetch(
+            'loans',
+            queryset=active.annotate(overdue=flag(Q(due_at__lt=Now()))).order_by('due_at', 'id'),
+            to_attr='active_loans',
+        ),
+        Prefetch('loans', queryset=recent_returns(Loan.objects.all(), recent), to_attr='recent_loans'),
+        Prefetch(
+            'archived_loans',
+            queryset=recent_returns(ArchivedLoan.objects.all(), recent),
+            to_attr='recent_archived_loans',
+        ),
+    )
+
+
+def book_summary(book):
+    return {'id': book.pk, 'title': book.title, 'isbn': book.isbn, 'author': book.author.name}
+
+
+def member_summary(member_id, recent=RECENT_LOANS):
+    """
+    Return the dashboard dict for ``member_id`` in four queries.
+    Raises ``Member.DoesNotExist`` for unknown ids.
+    """
+    member = member_queryset(recent).get(pk=member_id)
+    # Both lists are newest first, so merging them gives the overall latest
+    newest = merge(
+        member.recent_loans, member.recent_archived_loans,
+        key=lambda loan: (loan.returned_at, loan.pk), reverse=True,
+    )
+    recent_loans = islice(newest, recent)
+    profile = getattr(member, 'profile', None)
+    active = [
+        {
+            'id': loan.pk,
+            'book': book_summary(loan.book),
+            'loaned_at': loan.loaned_at,
+            'due_at': loan.due_at,
+            'is_overdue': loan.overdue,
+        }
+        for loan in member.active_loans
+    ]
+    return {
+        'id': member.pk,
+        'full_name': member.full_name,
+        'email': member.email,
+        'joined_at': member.joined_at,
+        'profile': profile and {'nickname': profile.nickname, 'risk_level': profile.risk_level},
+        'active_loans': active,
+        'overdue_count': sum(loan['is_overdue'] for loan in active),
+        'recent_loans': [
+            {
+                'id': loan.pk,
+                'book': book_summary(loan.book),
+                'loaned_at': loan.loaned_at,
+                'due_at': loan.due_at,
+                'returned_at': loan.returned_at,
+                'returned_late': loan.returned_late,
+            }
+            for loan in recent_loans
+        ],
+    }
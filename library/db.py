@@ -0,0 +1,65 @@
+"""
+SQLite connection tuning for the library app.
+
+When ``LIBRARY_SQLITE_PRAGMAS`` is set (see the production profile in
+``library_demo/settings.py``) every new SQLite connection runs those
+PRAGMA statements from a ``connection_created`` receiver, connected in
+``LibraryConfig.ready()``.
+"""
+
+from django.conf import settings
+
+
+# Recommended pragmas for a write-heavy production SQLite database:
+# WAL lets readers run while a writer commits, NORMAL sync is safe in WAL
+# mode, and busy_timeout makes writers wait for the lock instead of failing.
+PRODUCTION_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'cache_size': -64000,  # negative = KiB, i.e. 64 MB
+    'mmap_size': 268435456,  # 256 MB
+    'temp_store': 'MEMORY',
+    'foreign_keys': 'ON',
+}
+
+# Pragmas reported by check_sqlite, with the values SQLite returns them as
+REPORTED_PRAGMAS = ['journal_mode', 'synchronous', 'busy_timeout', 'cache_size', 'mmap_size', 'temp_store', 'foreign_keys']
+
+# SQLite reports these pragmas as integers
+ENUM_VALUES = {
+    'synchronous': {'OFF': 0, 'NORMAL': 1, 'FULL': 2, 'EXTRA': 3},
+    'temp_store': {'DEFAULT': 0, 'FILE': 1, 'MEMORY': 2},
+    'foreign_keys': {'OFF': 0, 'ON': 1},
+}
+
+
+def apply_pragmas(cursor, pragmas):
+    for name, value in pragmas.items():
+        cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def read_pragmas(cursor, names=REPORTED_PRAGMAS):
+    """Return ``{name: value}`` as currently reported by SQLite."""
+    values = {}
+    for name in names:
+        cursor.execute(f'PRAGMA {name}')
+        row = cursor.fetchone()
+        values[name] = row[0] if row else None
+    return values
+
+
+def expected_value(name, value):
+    """Normalize a configured pragma value to what SQLite reports back."""
+    if isinstance(value, str):
+        value = ENUM_VALUES.get(name, {}).get(value.upper(), value.lower())
+    return value
+
+
+def configure_sqlite(sender, connection, **kwargs):
+    """``connection_created`` receiver applying ``LIBRARY_SQLITE_PRAGMAS``."""
+    pragmas = getattr(settings, 'LIBRARY_SQLITE_PRAGMAS', None)
+    if connection.vendor != 'sqlite' or not pragmas:
+        return
+    with connection.cursor() as cursor:
+        apply_pragmas(cursor, pragmas)
@@ -0,0 +1,76 @@
+"""
+Tag x status facet counts for catalog browsing.
+
+``TagFacet`` holds one row per (tag, status) with the number of books
+carrying that tag in that status. On SQLite the rows are maintained by
+triggers on ``library_booktag`` and on ``library_book.status``, so every
+write path (``Loan.save()``, the checkout service, bulk checkouts and
+returns, ``mark_lost`` and admin actions) keeps them current without
+extra code. Reading the facets costs one query over
+``number of tags x statuses`` rows instead of a GROUP BY over every book.
+"""
+
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count
+
+from .models import Book, BookTag, TagFacet
+
+
+STATUSES = [status for status, _ in Book.STATUS_CHOICES]
+
+
+def computed_counts():
+    """``{(tag_id, status): count}`` computed from BookTag and Book."""
+    rows = BookTag.objects.values_list('tag_id', 'book__status').annotate(n=Count('pk')).order_by()
+    return {(tag_id, status): n for tag_id, status, n in rows}
+
+
+def stored_counts():
+    """``{(tag_id, status): count}`` as currently stored, skipping zeros."""
+    rows = TagFacet.objects.exclude(book_count=0).values_list('tag_id', 'status', 'book_count')
+    return {(tag_id, status): n for tag_id, status, n in rows}
+
+
+def rebuild(progress=None):
+    """
+    Replace every facet row with freshly computed counts. Returns the row count.
+    ``progress(rows)`` is called between computing the counts and writing them.
+    """
+    counts = computed_counts()
+    if progress:
+        progress(len(counts))
+    with transaction.atomic():
+        TagFacet.objects.all().delete()
+        TagFacet.objects.bulk_create([
+            TagFacet(tag_id=tag_id, status=status, book_count=n)
+            for (tag_id, status), n in counts.items()
+        ])
+    return len(counts)
+
+
+def drift():
+    """``{(tag_id, status): (stored, computed)}`` for every facet that is out of date."""
+    stored, computed = stored_counts(), computed_counts()
+    return {
+        key: (stored.get(key, 0), computed.get(key, 0))
+        for key in stored.keys() | computed.keys()
+        if stored.get(key, 0) != computed.get(key, 0)
+    }
+
+
+def tag_facets():
+    """
+    Per-tag book counts by status, ordered by tag name:
+    ``[{'id', 'name', 'counts': {status: n}, 'total'}]``.
+    """
+    rows = TagFacet.objects.order_by('tag__name', 'tag_id').values_list('tag_id', 'tag__name', 'status', 'book_count')
+    facets = {}
+    for tag_id, name, status, n in rows:
+        facet = facets.setdefault(tag_id, {'id': tag_id, 'name': name, 'counts': defaultdict(int), 'total': 0})
+        facet['counts'][status] += n
+        facet['total'] += n
+    for facet in facets.values():
+        facet['counts'] = {status: facet['counts'][status] for status in STATUSES}
+    return [facet for facet in facets.values() if facet['total']]
@@ -0,0 +1,300 @@
+"""
+Persistent background jobs.
+
+Bulk admin actions, exports and recomputations can take longer than an
+HTTP request is allowed to, so they are stored as ``Job`` rows and run by
+the ``run_worker`` command instead. A worker claims a job with the same
+conditional-UPDATE gate ``checkout`` uses ("set RUNNING where QUEUED"), so
+two workers polling at once can never both run it.
+
+Handlers are registered by name with ``@handler('kind')`` and called as
+``func(progress, **payload)``; ``progress(done, total=None)`` records how
+far the job has got and doubles as the worker's heartbeat. Whatever the
+handler returns is stored in ``Job.result`` and must be JSON-serialisable.
+A handler that raises is retried after ``RETRY_DELAY_SECONDS * 2 **
+(attempt - 1)`` until the job's ``max_attempts`` is used up.
+
+A job without a heartbeat for ``STALE_AFTER_SECONDS`` is requeued and may
+be claimed again, so every write a worker makes to its job is conditional
+on still owning that claim (same worker, same attempt). A worker that has
+lost its job stops at the next progress report and records nothing.
+"""
+
+import os
+import socket
+import threading
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import OperationalError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import availability, exports, facets, recommendations, risk
+from .checkout import is_lock_error, with_lock_retry
+from .models import Book, Job, Loan, chunked, expand_ranges, range_size
+
+
+DEFAULT_MAX_ATTEMPTS = 3
+RETRY_DELAY_SECONDS = 30
+# RUNNING jobs without a progress report for this long are assumed to belong
+# to a worker that died and are put back in the queue
+STALE_AFTER_SECONDS = 3600
+
+HANDLERS = {}
+
+
+class JobLost(Exception):
+    """The job was requeued as stale and is no longer owned by this worker."""
+
+
+def handler(kind):
+    """Register the decorated function as the handler for ``kind`` jobs."""
+    def register(func):
+        HANDLERS[kind] = func
+        return func
+    return register
+
+
+def inline_limit():
+    """Admin actions on more rows than this are enqueued instead of run inline."""
+    return getattr(settings, 'LIBRARY_JOB_INLINE_LIMIT', 1000)
+
+
+def enqueue(kind, /, max_attempts=DEFAULT_MAX_ATTEMPTS, **payload):
+    """Queue a ``kind`` job with ``payload`` as its keyword arguments and return it."""
+    if kind not in HANDLERS:
+        raise ValidationError(f"Unknown job: {kind!r}")
+    return with_lock_retry(lambda: Job.objects.create(kind=kind, payload=payload, max_attempts=max_attempts))
+
+
+def worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+
+
+def claim(worker):
+    """Mark the oldest due QUEUED job as RUNNING for ``worker`` and return it, or None."""
+    def attempt():
+        while True:
+            now = timezone.now()
+            job_id = (
+                Job.objects.filter(status='QUEUED', run_after__lte=now)
+                .order_by('run_after', 'pk')
+                .values_list('pk', flat=True)
+                .first()
+            )
+            if job_id is None:
+                return None
+            claimed = Job.objects.filter(pk=job_id, status='QUEUED').update(
+                status='RUNNING',
+                worker=worker,
+                attempts=F('attempts') + 1,
+                started_at=now,
+                heartbeat_at=now,
+                finished_at=None,
+            )
+            if claimed:
+                return Job.objects.get(pk=job_id)
+            # Another worker got there first; try the next one
+
+    return with_lock_retry(attempt)
+
+
+def owned(job):
+    """The job's row, as long as it is still RUNNING under this claim."""
+    return Job.objects.filter(pk=job.pk, status='RUNNING', worker=job.worker, attempts=job.attempts)
+
+
+def reporter(job):
+    """
+    Return the ``progress(done, total=None)`` callback handed to ``job``'s handler.
+
+    Reports are best effort: a handler still iterating a cursor (exports) pins
+    an SQLite read snapshot, and writing from that connection fails at once
+    whenever another worker has committed since, so a lock error skips the
+    report rather than failing the job. Raises ``JobLost`` once the job has
+    been requeued under the handler.
+    """
+    def progress(done, total=None):
+        job.progress = done
+        if total is not None:
+            job.total = total
+        try:
+            updated = owned(job).update(progress=job.progress, total=job.total, heartbeat_at=timezone.now())
+        except OperationalError as exc:
+            if not is_lock_error(exc):
+                raise
+        else:
+            if not updated:
+                raise JobLost(f"Job #{job.pk} was requeued while running")
+    return progress
+
+
+def retry_at(job, now):
+    return now + timedelta(seconds=RETRY_DELAY_SECONDS * 2 ** max(job.attempts - 1, 0))
+
+
+def run(job):
+    """
+    Execute a claimed job and record the outcome. Returns the job, or None
+    if it was requeued under this worker (the outcome is then left alone).
+    """
+    func = HANDLERS.get(job.kind)
+    try:
+        if func is None:
+            raise ValidationError(f"Unknown job: {job.kind!r}")
+        job.result = func(reporter(job), **job.payload)
+    except JobLost:
+        return None
+    except Exception:
+        now = timezone.now()
+        job.error = traceback.format_exc()
+        job.finished_at = now
+        if func is not None and job.attempts < job.max_attempts:
+            job.status = 'QUEUED'
+            job.run_after = retry_at(job, now)
+        else:
+            job.status = 'FAILED'
+    else:
+        job.status = 'DONE'
+        job.error = ''
+        job.finished_at = timezone.now()
+    fields = ['status', 'result', 'error', 'finished_at', 'run_after', 'progress', 'total']
+    updated = with_lock_retry(lambda: owned(job).update(**{name: getattr(job, name) for name in fields}))
+    return job if updated else None
+
+
+def requeue_stale(stale_after=STALE_AFTER_SECONDS):
+    """
+    Put RUNNING jobs without a heartbeat for ``stale_after`` seconds back in
+    the queue, or fail them if they are out of attempts. Returns the count.
+    """
+    now = timezone.now()
+    stale = Job.objects.filter(status='RUNNING', heartbeat_at__lt=now - timedelta(seconds=stale_after))
+    error = f"Worker stopped reporting progress for {stale_after}s"
+
+    def attempt():
+        with transaction.atomic():
+            failed = stale.filter(attempts__gte=F('max_attempts')).update(
+                status='FAILED', error=error, finished_at=now
+            )
+            return failed + stale.update(status='QUEUED', error=error, run_after=now)
+
+    return with_lock_retry(attempt)
+
+
+def work(poll=1.0, burst=False, max_jobs=None, stale_after=STALE_AFTER_SECONDS, stop=None):
+    """
+    Claim and run jobs until ``stop`` (a ``threading.Event``) is set,
+    ``max_jobs`` have run or, with ``burst=True``, the queue is empty.
+    Stale jobs are swept whenever the queue looks empty. Returns the number
+    of jobs run.
+    """
+    name = worker_name()
+    stop = stop or threading.Event()
+    processed = 0
+    requeue_stale(stale_after)
+    while not stop.is_set() and (max_jobs is None or processed < max_jobs):
+        job = claim(name)
+        if job is None:
+            if requeue_stale(stale_after):
+                continue
+            if burst:
+                break
+            stop.wait(poll)
+            continue
+        run(job)
+        processed += 1
+    return processed
+
+
+# ============================================================================
+# Handlers
+# ============================================================================
+
+
+def set_chunk_status(book_ids, status):
+    """Set ``status`` on one chunk of ``book_ids`` and write it through to the cache."""
+    with transaction.atomic():
+        books = Book.objects.filter(pk__in=book_ids)
+        updated = books.update(status=status)
+        if updated < len(book_ids):
+            # Some books were deleted since they were selected; cache only the rest
+            book_ids = list(books.values_list('pk', flat=True))
+        availability.set_status(book_ids, status)
+    return updated
+
+
+@handler('books.set_status')
+def set_book_status(progress, book_ranges, status):
+    """Set ``status`` on the books in ``book_ranges`` (see ``pk_ranges``), one chunk per transaction."""
+    if status not in dict(Book.STATUS_CHOICES):
+        raise ValidationError(f"Unknown book status: {status!r}")
+    updated = done = 0
+    total = range_size(book_ranges)
+    for chunk in chunked(expand_ranges(book_ranges)):
+        updated += with_lock_retry(lambda: set_chunk_status(chunk, status))
+        done += len(chunk)
+        progress(done, total)
+    return {'books_updated': updated}
+
+
+@handler('loans.return')
+def return_loans(progress, loan_ranges, returned_at=None):
+    """Return the active loans in ``loan_ranges`` (see ``pk_ranges``), one chunk per transaction."""
+    returned_at = exports.parse_moment(returned_at) if returned_at else timezone.now()
+    loans_returned = books_updated = done = 0
+    total = range_size(loan_ranges)
+    for chunk in chunked(expand_ranges(loan_ranges)):
+        returned, books = with_lock_retry(
+            lambda: Loan.objects.bulk_return(Loan.objects.filter(pk__in=chunk), returned_at=returned_at)
+        )
+        loans_returned += returned
+        books_updated += books
+        done += len(chunk)
+        progress(done, total)
+    return {'loans_returned': loans_returned, 'books_updated': books_updated}
+
+
+@handler('export')
+def export(progress, kind, path, format='csv', filters=None):
+    """Write an ``exports`` export to ``path`` on the worker's filesystem."""
+    header, rows = exports.export_queryset(kind, filters)
+    written = 0
+
+    def counted(rows):
+        nonlocal written
+        for row in rows:
+            yield row
+            written += 1
+            if written % exports.CHUNK_SIZE == 0:
+                progress(written)
+
+    with open(path, 'w', newline='') as output:
+        for line in exports.render(format, header, counted(rows)):
+            output.write(line)
+    progress(written, written)
+    return {'path': path, 'rows': written}
+
+
+@handler('risk.recompute')
+def recompute_risk(progress, incremental=False):
+    run = risk.recompute(incremental=incremental, progress=progress)
+    progress(run.members_scanned, run.members_scanned)
+    return {'run_id': run.pk, 'members_scanned': run.members_scanned, 'profiles_changed': run.profiles_changed}
+
+
+@handler('recommendations.build')
+def build_recommendations(progress, incremental=False, top_k=recommendations.DEFAULT_TOP_K):
+    build = recommendations.build(incremental=incremental, top_k=top_k, progress=progress)
+    progress(build.books_updated, build.books_updated)
+    return {'build_id': build.pk, 'books_updated': build.books_updated}
+
+
+@handler('facets.rebuild')
+def rebuild_facets(progress):
+    rows = facets.rebuild(progress=progress)
+    progress(rows, rows)
+    return {'rows': rows}
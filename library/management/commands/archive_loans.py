@@ -0,0 +1,60 @@
+"""
+Management command to move old returned loans into the archive table.
+
+Usage:
+    python manage.py archive_loans --older-than 365
+    python manage.py archive_loans --older-than 90 --batch-size 500 --dry-run
+
+Only loans returned more than ``--older-than`` days ago are moved; active
+loans always stay in ``library_loan``. Each batch is copied and deleted in
+its own transaction, so the command can be interrupted and re-run safely.
+History stays visible through ``library.archive.loan_stores()``, the member
+loans API and dashboard, the loans export, the statistics reports and the
+member admin's loan counts.
+"""
+
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from library.archive import archivable, archive_loans
+from library.models import IN_CLAUSE_CHUNK_SIZE
+
+
+class Command(BaseCommand):
+    help = 'Moves returned loans older than N days into the loan archive'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than', type=int, required=True, metavar='DAYS',
+                            help='Archive loans returned more than DAYS days ago')
+        parser.add_argument('--batch-size', type=int, default=IN_CLAUSE_CHUNK_SIZE,
+                            help=f'Loans moved per transaction (default: {IN_CLAUSE_CHUNK_SIZE})')
+        parser.add_argument('--dry-run', action='store_true', help='Only report how many loans would move')
+        parser.add_argument('--vacuum', action='store_true', help='Run VACUUM afterwards to shrink the SQLite file')
+
+    def handle(self, *args, **options):
+        if options['older_than'] < 0:
+            raise CommandError('--older-than must not be negative')
+        before = timezone.now() - timedelta(days=options['older_than'])
+
+        if options['dry_run']:
+            self.stdout.write(f"{archivable(before).count()} loans returned before {before:%Y-%m-%d} would be archived")
+            return
+
+        started = time.perf_counter()
+        progress = None
+        if options['verbosity'] > 1:
+            progress = lambda moved: self.stdout.write(f'  {moved} loans archived')
+        moved = archive_loans(before, batch_size=options['batch_size'], progress=progress)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ {moved} loans returned before {before:%Y-%m-%d} archived in {elapsed:.2f}s'
+        ))
+
+        if options['vacuum'] and moved and connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute('VACUUM')
+            self.stdout.write(self.style.SUCCESS('✓ Database vacuumed'))
@@ -0,0 +1,162 @@
+"""
+Management command to benchmark the library's hot paths.
+
+Usage:
+    python manage.py seed_demo --scale 10000 --seed 1
+    python manage.py bench_library --output bench.json
+    python manage.py bench_library --baseline bench.json
+
+Runs against the configured database. Every write benchmark runs inside a
+transaction that is rolled back at the end, so the seeded data is left
+untouched and runs are repeatable.
+"""
+
+import json
+import random
+from datetime import timedelta
+
+from django.contrib import admin
+from django.contrib.admin.templatetags.admin_list import results as changelist_rows
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import RequestFactory
+from django.utils import timezone
+
+from library.benchmarking import compare, measure
+from library.models import Book, BookTag, Loan, Member, Tag
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks checkout/return, admin changelists and common lookups'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50, help='Timed runs per benchmark (default: 50)')
+        parser.add_argument('--warmup', type=int, default=3, help='Untimed runs per benchmark (default: 3)')
+        parser.add_argument('--bulk-size', type=int, default=100, help='Books per bulk checkout (default: 100)')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for picking rows (default: 0)')
+        parser.add_argument('--only', nargs='*', help='Run only benchmarks whose name starts with these prefixes')
+        parser.add_argument('--output', help='Write JSON results to this file')
+        parser.add_argument('--baseline', help='Compare against a JSON results file from a previous run')
+
+    def handle(self, *args, **options):
+        if not Book.objects.exists() or not Member.objects.exists():
+            raise CommandError('The database is empty. Seed it first, e.g. "manage.py seed_demo --scale 10000".')
+
+        self.rng = random.Random(options['seed'])
+        self.iterations = options['iterations']
+        self.warmup = options['warmup']
+        self.bulk_size = options['bulk_size']
+        self.request = RequestFactory().get('/admin/')
+        self.request.user = User(username='bench', is_active=True, is_staff=True, is_superuser=True)
+
+        benchmarks = self.get_benchmarks()
+        if options['only']:
+            benchmarks = [b for b in benchmarks if b[0].startswith(tuple(options['only']))]
+
+        results = []
+        with transaction.atomic():
+            self.member_ids = list(Member.objects.order_by().values_list('pk', flat=True)[:1000])
+            for name, kwargs in benchmarks:
+                result = measure(name, iterations=self.iterations, warmup=self.warmup, **kwargs)
+                results.append(result)
+                self.stdout.write(
+                    f"{name:<32} {result['ops_per_sec']:>10.1f} ops/s  "
+                    f"p50 {result['p50_ms']:>8.2f}ms  p95 {result['p95_ms']:>8.2f}ms  "
+                    f"p99 {result['p99_ms']:>8.2f}ms  {result['queries_per_op']:>6.1f} queries"
+                )
+            transaction.set_rollback(True)
+
+        if options['output']:
+            with open(options['output'], 'w') as fh:
+                json.dump({'created_at': timezone.now().isoformat(), 'results': results}, fh, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+        if options['baseline']:
+            with open(options['baseline']) as fh:
+                baseline = json.load(fh)['results']
+            self.stdout.write('\nComparison with baseline:')
+            for name, before, after, change, query_delta in compare(results, baseline):
+                style = self.style.SUCCESS if change >= 0 else self.style.WARNING
+                self.stdout.write(style(
+                    f"{name:<32} {before:>10.1f} -> {after:>10.1f} ops/s ({change:+.1f}%)  "
+                    f"queries {query_delta:+.1f}"
+                ))
+
+    def get_benchmarks(self):
+        """Return ``(name, measure kwargs)`` pairs for every benchmark."""
+        benchmarks = [
+            ('checkout.single', {'setup': self.pick_available_book, 'func': self.checkout_single,
+                                 'teardown': self.undo_checkout}),
+            ('checkout.bulk', {'setup': self.pick_available_books, 'func': self.checkout_bulk,
+                               'teardown': self.undo_bulk_checkout}),
+            ('loan.return_book', {'setup': self.make_active_loan, 'func': lambda loan: loan.return_book()}),
+            ('loan.is_overdue_scan', {'func': self.is_overdue_scan}),
+            ('loan.overdue_query', {'func': lambda: Loan.objects.overdue().count()}),
+            ('tag.lookup', {'setup': self.pick_tag_name, 'func': self.tag_lookup}),
+        ]
+        for model in (Book, Loan, Member, Tag, BookTag):
+            benchmarks.append((
+                f'admin.changelist.{model._meta.model_name}',
+                {'func': lambda model=model: self.render_changelist(model)},
+            ))
+        return benchmarks
+
+    # =====================
+    # Setup helpers (not timed)
+    # =====================
+
+    def pick_available_book(self):
+        book = Book.objects.filter(status='AVAILABLE').order_by('?').first()
+        if book is None:
+            raise CommandError('No AVAILABLE books left to benchmark checkouts.')
+        return book
+
+    def pick_available_books(self):
+        return list(
+            Book.objects.filter(status='AVAILABLE').order_by('?').values_list('pk', flat=True)[:self.bulk_size]
+        )
+
+    def make_active_loan(self):
+        loan = self.checkout_single(self.pick_available_book())
+        return Loan.objects.get(pk=loan.pk)
+
+    def pick_tag_name(self):
+        return Tag.objects.order_by('?').values_list('name', flat=True).first()
+
+    def undo_checkout(self, loan):
+        Loan.objects.bulk_return(Loan.objects.filter(pk=loan.pk))
+
+    def undo_bulk_checkout(self, result):
+        Loan.objects.bulk_return(Loan.objects.filter(pk__in=[loan.pk for loan in result.loans]))
+
+    def due_at(self):
+        return timezone.now() + timedelta(days=14)
+
+    # =====================
+    # Timed operations
+    # =====================
+
+    def checkout_single(self, book):
+        loan = Loan(book=book, member_id=self.rng.choice(self.member_ids), due_at=self.due_at())
+        loan.save()
+        return loan
+
+    def checkout_bulk(self, book_ids):
+        return Loan.objects.bulk_checkout(
+            [(book_id, self.rng.choice(self.member_ids)) for book_id in book_ids],
+            due_at=self.due_at(),
+        )
+
+    def is_overdue_scan(self):
+        return sum(1 for loan in Loan.objects.filter(returned_at__isnull=True) if loan.is_overdue)
+
+    def tag_lookup(self, tag_name):
+        return list(Book.objects.filter(book_tags__tag__name=tag_name)[:100])
+
+    def render_changelist(self, model):
+        """Build the admin changelist for ``model`` and render its result rows."""
+        model_admin = admin.site._registry[model]
+        changelist = model_admin.get_changelist_instance(self.request)
+        changelist.formset = None
+        return [list(row) for row in changelist_rows(changelist)]
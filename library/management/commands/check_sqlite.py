@@ -0,0 +1,48 @@
+"""
+Management command to report the active SQLite pragmas.
+
+Usage:
+    python manage.py check_sqlite
+    LIBRARY_DB_PROFILE=production python manage.py check_sqlite
+
+Prints the pragmas of the current connection and flags any that differ
+from LIBRARY_SQLITE_PRAGMAS. Exits with an error if some do.
+"""
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from library.db import REPORTED_PRAGMAS, expected_value, read_pragmas
+
+
+class Command(BaseCommand):
+    help = 'Reports active SQLite pragmas and compares them with the configured profile'
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError(f'The default database is {connection.vendor}, not SQLite.')
+
+        configured = getattr(settings, 'LIBRARY_SQLITE_PRAGMAS', {}) or {}
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT sqlite_version()')
+            version = cursor.fetchone()[0]
+            active = read_pragmas(cursor, list(dict.fromkeys([*REPORTED_PRAGMAS, *configured])))
+
+        self.stdout.write(f"Profile: {getattr(settings, 'DB_PROFILE', 'default')}  SQLite {version}")
+        self.stdout.write(f"CONN_MAX_AGE: {connection.settings_dict.get('CONN_MAX_AGE')}")
+        mismatches = []
+        for name, value in active.items():
+            line = f'  {name:<14} {value}'
+            if name in configured:
+                expected = expected_value(name, configured[name])
+                if str(value).lower() != str(expected).lower():
+                    mismatches.append(name)
+                    self.stdout.write(self.style.ERROR(f'{line}  (expected {configured[name]})'))
+                    continue
+                line += '  ✓'
+            self.stdout.write(line)
+
+        if mismatches:
+            raise CommandError(f"Pragmas differ from the configured profile: {', '.join(mismatches)}")
+        self.stdout.write(self.style.SUCCESS('✓ SQLite pragmas match the configured profile'))
@@ -0,0 +1,45 @@
+"""
+Management command to stream loans, books or members to CSV or NDJSON.
+
+Usage:
+    python manage.py export_data loans --output loans.csv
+    python manage.py export_data loans --format ndjson --loaned-after 2024-01-01
+    python manage.py export_data books > books.csv
+"""
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from library import exports
+
+
+class Command(BaseCommand):
+    help = 'Streams loans, books or members to CSV or NDJSON with constant memory'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(exports.EXPORTS))
+        parser.add_argument('--format', choices=exports.FORMATS, default='csv')
+        parser.add_argument('--output', help='File to write (default: standard output)')
+        for name in exports.LOAN_FILTERS:
+            parser.add_argument(f"--{name.replace('_', '-')}", dest=name, help='ISO date or datetime (loans only)')
+
+    def handle(self, *args, **options):
+        filters = {name: options[name] for name in exports.LOAN_FILTERS if options[name]}
+        try:
+            header, rows = exports.export_queryset(options['kind'], filters)
+            lines = exports.render(options['format'], header, rows)
+        except ValidationError as exc:
+            raise CommandError(exc.messages[0])
+
+        if not options['output']:
+            for line in lines:
+                self.stdout.write(line, ending='')
+            return
+
+        count = 0
+        with open(options['output'], 'w', newline='') as output:
+            for line in lines:
+                output.write(line)
+                count += 1
+        rows_written = count - 1 if options['format'] == 'csv' else count
+        self.stdout.write(self.style.SUCCESS(f'✓ Wrote {rows_written} {options["kind"]} to {options["output"]}'))
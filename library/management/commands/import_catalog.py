@@ -0,0 +1,100 @@
+"""
+Management command to import a vendor catalog feed.
+
+Usage:
+    python manage.py import_catalog feed.csv
+    python manage.py import_catalog feed.ndjson --chunk-size 10000
+    python manage.py import_catalog feed.csv --resume
+
+CSV files need isbn, title and author columns, plus optional country and
+tags ("Fantasy|Epic"). NDJSON lines use the same keys, with tags as a list.
+Books are upserted on ISBN. After every committed chunk the number of
+input records consumed is written to <file>.checkpoint; --resume skips
+those records after a failure.
+"""
+
+import json
+import os
+import time
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+
+from library.catalog_import import CatalogImporter, InvalidRecord, clean_record, read_records
+
+
+class Command(BaseCommand):
+    help = 'Streams a CSV/NDJSON catalog feed into Authors, Books (upsert on ISBN) and Tags'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or NDJSON file to import')
+        parser.add_argument('--format', choices=['csv', 'ndjson'], help='Input format (default: from extension)')
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Records per transaction (default: 5000)')
+        parser.add_argument('--resume', action='store_true', help='Skip records committed by a previous run')
+        parser.add_argument('--max-errors', type=int, default=20, help='Invalid records reported in detail')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('ndjson' if path.endswith(('.ndjson', '.jsonl')) else 'csv')
+        checkpoint_path = f'{path}.checkpoint'
+        skip = self.read_checkpoint(checkpoint_path) if options['resume'] else 0
+
+        importer = CatalogImporter()
+        consumed = skip
+        invalid = 0
+        started = time.perf_counter()
+        if skip:
+            self.stdout.write(f'Resuming after {skip} records')
+
+        try:
+            with open(path, newline='', encoding='utf-8') as fh:
+                records = enumerate(read_records(fh, fmt), start=1)
+                for _ in islice(records, skip):
+                    pass
+                while True:
+                    batch = list(islice(records, options['chunk_size']))
+                    if not batch:
+                        break
+                    cleaned = []
+                    for number, record in batch:
+                        try:
+                            cleaned.append(clean_record(record))
+                        except (InvalidRecord, AttributeError) as exc:
+                            invalid += 1
+                            if invalid <= options['max_errors']:
+                                self.stderr.write(f'  record {number}: {exc}')
+                    importer.import_chunk(cleaned)
+                    consumed = batch[-1][0]
+                    self.write_checkpoint(checkpoint_path, consumed)
+                    elapsed = time.perf_counter() - started
+                    self.stdout.write(
+                        f'  {consumed} records, {importer.books_upserted} books '
+                        f'({(consumed - skip) / elapsed:.0f} records/s)'
+                    )
+        except (OSError, ValueError) as exc:
+            raise CommandError(f'Import stopped after record {consumed}: {exc}')
+
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+        elapsed = time.perf_counter() - started
+        rate = (consumed - skip) / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ Imported {consumed - skip} records in {elapsed:.1f}s ({rate:.0f} records/s): '
+            f'{importer.books_upserted} books upserted, {importer.tags_linked} tag links, '
+            f'{invalid} invalid records skipped'
+        ))
+
+    def read_checkpoint(self, path):
+        try:
+            with open(path) as fh:
+                return json.load(fh)['records']
+        except FileNotFoundError:
+            return 0
+        except (ValueError, KeyError) as exc:
+            raise CommandError(f'Unreadable checkpoint {path}: {exc}')
+
+    def write_checkpoint(self, path, records):
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w') as fh:
+            json.dump({'records': records}, fh)
+        os.replace(tmp_path, path)
@@ -0,0 +1,111 @@
+"""
+Management command comparing the WSGI and ASGI read paths under load.
+
+Usage:
+    python manage.py seed_demo --scale 10000
+    python manage.py loadtest_api --requests 2000 --concurrency 50
+
+Each scenario sends the same requests through Django's WSGI handler from a
+thread pool (one thread per concurrent client, as a threaded WSGI server
+would) and through the ASGI handler from a single event loop with
+``--concurrency`` in-flight requests. The handlers are driven in process
+by the test clients, so the numbers exclude network and server overhead
+and isolate how each path uses the process.
+"""
+
+import asyncio
+import json
+import random
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import AsyncClient, Client
+
+from library.benchmarking import percentile
+from library.models import Book, Loan, Tag
+
+
+class Command(BaseCommand):
+    help = 'Load-tests availability, active-loan and search endpoints over WSGI and ASGI'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=1000, help='Requests per scenario (default: 1000)')
+        parser.add_argument('--concurrency', type=int, default=32, help='Concurrent clients (default: 32)')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Write JSON results to this file')
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        isbns = list(Book.objects.order_by('?').values_list('isbn', flat=True)[:500])
+        member_ids = list(Loan.objects.active().order_by().values_list('member_id', flat=True).distinct()[:500])
+        words = [name.split()[0] for name in Tag.objects.values_list('name', flat=True)[:50]]
+        words += [title.split()[-2] for title in Book.objects.values_list('title', flat=True)[:50] if ' ' in title]
+        if not isbns or not member_ids or not words:
+            raise CommandError('Seed the database first, e.g. "manage.py seed_demo --scale 10000".')
+
+        scenarios = {
+            'availability': lambda prefix: f'/api/{prefix}books/availability/?isbn={rng.choice(isbns)}',
+            'active_loans': lambda prefix: f'/api/{prefix}members/{rng.choice(member_ids)}/active-loans/',
+            'search': lambda prefix: f'/api/{prefix}search/?q={rng.choice(words)}&limit=20',
+        }
+
+        results = []
+        for name, make_url in scenarios.items():
+            for mode, prefix, runner in (('wsgi', '', self.run_wsgi), ('asgi', 'async/', self.run_asgi)):
+                urls = [make_url(prefix) for _ in range(options['requests'])]
+                result = runner(urls, options['concurrency'])
+                result.update({'scenario': name, 'mode': mode})
+                results.append(result)
+                self.stdout.write(
+                    f"{name:<14} {mode:<5} {result['requests_per_sec']:>9.1f} req/s  "
+                    f"p50 {result['p50_ms']:>7.2f}ms  p95 {result['p95_ms']:>7.2f}ms  "
+                    f"p99 {result['p99_ms']:>7.2f}ms  errors {result['errors']}"
+                )
+
+        if options['output']:
+            with open(options['output'], 'w') as fh:
+                json.dump(results, fh, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+    def run_wsgi(self, urls, concurrency):
+        def fetch(url):
+            client = Client()
+            start = time.perf_counter()
+            status = client.get(url).status_code
+            return time.perf_counter() - start, status
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            samples = list(pool.map(fetch, urls))
+        return self.summarize(samples, time.perf_counter() - started)
+
+    def run_asgi(self, urls, concurrency):
+        async def run():
+            client = AsyncClient()
+            semaphore = asyncio.Semaphore(concurrency)
+
+            async def fetch(url):
+                async with semaphore:
+                    start = time.perf_counter()
+                    response = await client.get(url)
+                    return time.perf_counter() - start, response.status_code
+
+            return await asyncio.gather(*(fetch(url) for url in urls))
+
+        started = time.perf_counter()
+        samples = asyncio.run(run())
+        return self.summarize(samples, time.perf_counter() - started)
+
+    def summarize(self, samples, elapsed):
+        latencies = sorted(latency for latency, _ in samples)
+        return {
+            'requests': len(samples),
+            'errors': sum(1 for _, status in samples if status != 200),
+            'requests_per_sec': len(samples) / elapsed if elapsed else 0.0,
+            'mean_ms': statistics.fmean(latencies) * 1000,
+            'p50_ms': percentile(latencies, 50) * 1000,
+            'p95_ms': percentile(latencies, 95) * 1000,
+            'p99_ms': percentile(latencies, 99) * 1000,
+        }
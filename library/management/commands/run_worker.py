@@ -0,0 +1,122 @@
+"""
+Management command running queued background jobs (see library/jobs.py).
+
+Usage:
+    python manage.py run_worker
+    python manage.py run_worker --concurrency 4
+    python manage.py run_worker --concurrency 4 --pool process
+    python manage.py run_worker --burst
+
+Each pool worker has its own database connection and claims jobs one at a
+time, so ``--concurrency`` is the number of jobs run at once. Threads are
+enough for the SQL-bound handlers; ``--pool process`` forks instead, for
+handlers that spend their time in Python (exports, score computation);
+it needs the 'fork' start method, so it is not available on Windows.
+``--burst`` exits once the queue is empty instead of polling for new jobs.
+Ctrl-C lets pool workers finish their current job before exiting; a
+single worker stops at once, and a job it interrupts (or one left by a
+killed worker) stays RUNNING until ``--stale-after`` passes without a
+progress report, then goes back in the queue.
+
+With more than one worker, run under ``LIBRARY_DB_PROFILE=production``:
+without WAL mode a long-running read (an export) blocks every writer.
+"""
+
+import multiprocessing
+import signal
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+
+from library import jobs
+
+
+# Stop event of a forked pool worker, set by init_process_worker
+process_stop = None
+
+
+def init_process_worker(stop):
+    """Leave Ctrl-C to the parent, which sets ``stop`` once the current jobs finish."""
+    global process_stop
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    process_stop = stop
+
+
+def run_pool_worker(options, stop=None):
+    """Entry point of one pool worker; closes its connection when done."""
+    try:
+        return jobs.work(stop=stop or process_stop, **options)
+    finally:
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = 'Claims and runs queued background jobs with a thread or process pool'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=1, help='Jobs run at once (default: 1)')
+        parser.add_argument('--pool', choices=('thread', 'process'), default='thread')
+        parser.add_argument('--burst', action='store_true', help='Exit once the queue is empty')
+        parser.add_argument('--max-jobs', type=int, help='Stop each worker after this many jobs')
+        parser.add_argument('--poll', type=float, default=1.0, help='Seconds between polls of an empty queue')
+        parser.add_argument(
+            '--stale-after', type=int, default=jobs.STALE_AFTER_SECONDS,
+            help='Requeue RUNNING jobs without a progress report for this many seconds',
+        )
+
+    def handle(self, *args, **options):
+        if options['pool'] == 'process' and 'fork' not in multiprocessing.get_all_start_methods():
+            raise CommandError(
+                "--pool process needs the 'fork' start method, which this platform (e.g. Windows) "
+                "does not have; use --pool thread"
+            )
+        concurrency = max(1, options['concurrency'])
+        work_options = {
+            'poll': options['poll'],
+            'burst': options['burst'],
+            'max_jobs': options['max_jobs'],
+            'stale_after': options['stale_after'],
+        }
+        self.stdout.write(
+            f"Worker started: {concurrency} {options['pool']} worker(s)"
+            f"{' in burst mode' if options['burst'] else ''}"
+        )
+
+        if concurrency == 1 and options['pool'] == 'thread':
+            try:
+                processed = jobs.work(**work_options)
+            except KeyboardInterrupt:
+                processed = 0
+        elif options['pool'] == 'thread':
+            stop = threading.Event()
+            processed = self.run_pool(
+                ThreadPoolExecutor(max_workers=concurrency),
+                [(work_options, stop)] * concurrency,
+                stop,
+            )
+        else:
+            # Forked children must not share the parent's SQLite connection
+            connections.close_all()
+            context = multiprocessing.get_context('fork')
+            stop = context.Event()
+            executor = ProcessPoolExecutor(
+                max_workers=concurrency, mp_context=context,
+                initializer=init_process_worker, initargs=(stop,),
+            )
+            processed = self.run_pool(executor, [(work_options,)] * concurrency, stop)
+
+        self.stdout.write(self.style.SUCCESS(f'✓ Ran {processed} jobs'))
+
+    def run_pool(self, executor, argument_lists, stop):
+        with executor:
+            futures = [executor.submit(run_pool_worker, *arguments) for arguments in argument_lists]
+            try:
+                while wait(futures, timeout=1).not_done:
+                    pass
+            except KeyboardInterrupt:
+                self.stdout.write('Stopping after the current jobs...')
+                stop.set()
+                wait(futures)
+            return sum(future.result() for future in futures)
@@ -3,8 +3,9 @@ Custom management command to seed demo data into the library database.
 
 Usage:
     python manage.py seed_demo
+    python manage.py seed_demo --scale 100000 --seed 42
 
-This command creates:
+Without --scale this command creates:
 - 2 Authors
 - 4 Books (with FK to authors)
 - 2 Members
@@ -13,18 +14,69 @@ This command creates:
 - 4 BookTag relationships (ManyToMany through table)
 - 1 Active Loan (today)
 - 1 Returned Loan (completed)
+
+With --scale N it generates a deterministic synthetic dataset of N books
+(plus proportional authors, members, profiles, tags and book tags) and a mix
+of returned, active and overdue loans, inserted with chunked bulk_create.
+The same --seed always produces the same data.
 """
 
-from django.core.management.base import BaseCommand
+import random
+import time
+from array import array
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import F
 from django.utils import timezone
 from datetime import timedelta
 from library.models import Author, Book, Member, MemberProfile, Tag, BookTag, Loan
 
 
+COUNTRIES = [
+    "Argentina", "Chile", "France", "Germany", "Japan", "Mexico",
+    "Nigeria", "Spain", "United Kingdom", "United States", None,
+]
+WORDS = [
+    "Shadow", "River", "Empire", "Garden", "Silent", "Winter", "Crown",
+    "Glass", "Storm", "Forgotten", "City", "Night", "Iron", "Song",
+    "Ocean", "Last", "Hidden", "Fire", "Stone", "Dream",
+]
+FIRST_NAMES = ["Alice", "Bruno", "Carla", "Diego", "Elena", "Felipe", "Grace", "Hugo", "Irene", "Javier"]
+LAST_NAMES = ["Johnson", "Smith", "Rojas", "Martin", "Silva", "Tanaka", "Okafor", "Muller", "Dubois", "Lopez"]
+
+# Book plan status codes, kept in a compact array while seeding
+PLAN_AVAILABLE, PLAN_LOANED, PLAN_LOST = 0, 1, 2
+PLAN_STATUS = {PLAN_AVAILABLE: 'AVAILABLE', PLAN_LOANED: 'LOANED', PLAN_LOST: 'LOST'}
+
+
 class Command(BaseCommand):
     help = 'Seeds the database with demo data for the library system'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scale', type=int, default=0,
+            help='Generate a synthetic dataset with this many books instead of the fixed demo data'
+        )
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for --scale (default: 0)')
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help='Rows per bulk_create chunk for --scale (default: 5000)'
+        )
+        parser.add_argument(
+            '--loans-per-book', type=float, default=5.0,
+            help='Average number of loans generated per book for --scale (default: 5)'
+        )
+
     def handle(self, *args, **options):
+        if options['loans_per_book'] < 0:
+            raise CommandError('--loans-per-book must not be negative.')
+        if options['scale']:
+            self.seed_scaled(
+                options['scale'], options['seed'], options['batch_size'], options['loans_per_book']
+            )
+            return
+
         self.stdout.write(self.style.SUCCESS('Starting database seeding...'))
 
         # Clear existing data (optional, comment out if you want to append)
@@ -267,3 +319,143 @@ class Command(BaseCommand):
         self.stdout.write(f'  Tags: {Tag.objects.count()}')
         self.stdout.write(f'  Book Tags: {BookTag.objects.count()}')
         self.stdout.write(f'  Loans: {Loan.objects.count()}')
+
+    # =====================
+    # Synthetic data (--scale)
+    # =====================
+
+    def seed_scaled(self, scale, seed, batch_size, loans_per_book):
+        """Generate ``scale`` books and proportional related rows for ``seed``."""
+        prefix = f"SYN{seed}-"
+        if Book.objects.filter(isbn__startswith=prefix).exists():
+            raise CommandError(f'Synthetic data for seed {seed} already exists (ISBN prefix "{prefix}").')
+
+        rng = random.Random(seed)
+        now = timezone.now()
+        self.batch_size = batch_size
+        n_authors = max(1, scale // 10)
+        n_members = max(1, scale // 5)
+        n_tags = min(500, max(5, scale // 1000))
+        started = time.perf_counter()
+        self.stdout.write(self.style.SUCCESS(f'Seeding synthetic dataset (scale={scale}, seed={seed})...'))
+
+        author_ids = self._bulk_insert(Author, (
+            Author(
+                name=f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} #{prefix}{i}",
+                country=rng.choice(COUNTRIES),
+            )
+            for i in range(n_authors)
+        ), keep_ids=True)
+
+        tag_ids = self._bulk_insert(Tag, (
+            Tag(name=f"{rng.choice(WORDS)} {prefix}{i}", description=f"Synthetic tag {i}")
+            for i in range(n_tags)
+        ), keep_ids=True)
+
+        member_ids = self._bulk_insert(Member, (
+            Member(
+                full_name=f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+                email=f"member{i}.{prefix.lower()}@example.com",
+            )
+            for i in range(n_members)
+        ), keep_ids=True)
+
+        self._bulk_insert(MemberProfile, (
+            MemberProfile(
+                member_id=member_id,
+                nickname=rng.choice(FIRST_NAMES) if rng.random() < 0.3 else None,
+                risk_level=rng.choices(['LOW', 'MED', 'HIGH'], weights=[80, 15, 5])[0],
+            )
+            for member_id in member_ids
+        ))
+
+        # Decide up front how many loans each book gets and its final status,
+        # so Book.status always matches the generated loans.
+        loan_counts = array('L')
+        plans = array('B')
+        for _ in range(scale):
+            count = rng.randint(0, int(loans_per_book * 2))
+            loan_counts.append(count)
+            if count and rng.random() < 0.3:
+                plans.append(PLAN_LOANED)
+            elif rng.random() < 0.02:
+                plans.append(PLAN_LOST)
+            else:
+                plans.append(PLAN_AVAILABLE)
+
+        book_ids = self._bulk_insert(Book, (
+            Book(
+                title=f"The {rng.choice(WORDS)} {rng.choice(WORDS)} {i}",
+                isbn=f"{prefix}{i:09d}",
+                author_id=author_ids[rng.randrange(n_authors)],
+                status=PLAN_STATUS[plans[i]],
+            )
+            for i in range(scale)
+        ), keep_ids=True)
+
+        def book_tags():
+            for book_id in book_ids:
+                for tag_index in rng.sample(range(n_tags), rng.randint(1, min(3, n_tags))):
+                    yield BookTag(book_id=book_id, tag_id=tag_ids[tag_index])
+
+        self._bulk_insert(BookTag, book_tags())
+
+        def loans():
+            # Each book's loans follow one another: returned loans all end
+            # before ``history_end`` and the active loan starts after it
+            history_start = now - timedelta(days=730)
+            history_end = now - timedelta(days=30)
+            for index, book_id in enumerate(book_ids):
+                active = plans[index] == PLAN_LOANED
+                returned = loan_counts[index] - 1 if active else loan_counts[index]
+                loaned_at = history_start + timedelta(days=rng.uniform(0, 30))
+                for _ in range(returned):
+                    returned_at = loaned_at + timedelta(days=rng.uniform(1, 24))
+                    if returned_at >= history_end:
+                        break
+                    yield Loan(
+                        book_id=book_id, member_id=member_ids[rng.randrange(n_members)],
+                        due_at=loaned_at + timedelta(days=14), returned_at=returned_at,
+                    )
+                    loaned_at = returned_at + timedelta(days=rng.uniform(0, 60))
+                if active:
+                    # Active loan: roughly half of them end up overdue
+                    loaned_at = now - timedelta(days=rng.uniform(1, 28))
+                    yield Loan(
+                        book_id=book_id, member_id=member_ids[rng.randrange(n_members)],
+                        due_at=loaned_at + timedelta(days=14),
+                    )
+
+        with transaction.atomic():
+            loan_ids = self._bulk_insert(Loan, loans(), keep_ids=True)
+            if loan_ids:
+                # loaned_at is auto_now_add, so bulk_create stored "now"; every
+                # generated loan is due 14 days after it was loaned
+                Loan.objects.filter(pk__range=(loan_ids[0], loan_ids[-1])).update(
+                    loaned_at=F('due_at') - timedelta(days=14)
+                )
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f'\n✓ Synthetic seeding completed in {elapsed:.1f}s'))
+
+    def _bulk_insert(self, model, objects, keep_ids=False):
+        """Insert ``objects`` in chunks of ``self.batch_size`` inside one transaction."""
+        ids = array('q') if keep_ids else None
+        total = 0
+        batch = []
+        with transaction.atomic():
+            for obj in objects:
+                batch.append(obj)
+                if len(batch) >= self.batch_size:
+                    total += self._flush(model, batch, ids)
+                    batch = []
+            if batch:
+                total += self._flush(model, batch, ids)
+        self.stdout.write(f'  ✓ Created {total} {model._meta.verbose_name_plural}')
+        return ids
+
+    def _flush(self, model, batch, ids):
+        created = model.objects.bulk_create(batch, batch_size=self.batch_size)
+        if ids is not None:
+            ids.extend(obj.pk for obj in created)
+        return len(created)
@@ -0,0 +1,201 @@
+"""
+Management command hammering the checkout service from many threads.
+
+Usage:
+    python manage.py stress_checkout
+    python manage.py stress_checkout --threads 16 --books 4 --attempts 5000
+
+Creates a handful of "hot" books and members, then has ``--threads``
+workers (each with its own database connection) repeatedly check out a
+random hot book, returning the loans they hold now and then. Afterwards the invariants are
+checked: no book has more than one active loan, every LOANED book has
+exactly one, and no AVAILABLE book has any. The fixture rows are deleted
+unless ``--keep`` is given.
+
+``--mode model`` drives the same workload through ``Loan.save()`` and
+``Loan.return_book()`` instead, for comparison with the service.
+"""
+
+import json
+import random
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand
+from django.db import IntegrityError, OperationalError, connection, transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from library import checkout
+from library.models import Author, Book, Loan, Member
+
+
+class Command(BaseCommand):
+    help = 'Stress-tests concurrent checkouts and reports throughput, conflicts and invariant violations'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8, help='Concurrent workers (default: 8)')
+        parser.add_argument('--books', type=int, default=4, help='Number of contended books (default: 4)')
+        parser.add_argument('--members', type=int, default=50, help='Number of members (default: 50)')
+        parser.add_argument('--attempts', type=int, default=2000, help='Total checkout attempts (default: 2000)')
+        parser.add_argument('--return-rate', type=float, default=0.5,
+                            help='Chance per attempt that a worker first returns its oldest loan (default: 0.5)')
+        parser.add_argument('--mode', choices=['service', 'model'], default='service',
+                            help='Check out through library.checkout or through Loan.save() (default: service)')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--keep', action='store_true', help='Keep the fixture books, members and loans')
+        parser.add_argument('--output', help='Write JSON results to this file')
+
+    def handle(self, *args, **options):
+        books, members = self.create_fixture(options['books'], options['members'])
+        book_ids = [book.pk for book in books]
+        member_ids = [member.pk for member in members]
+        counts = Counter()
+        lock = threading.Lock()
+        do_checkout, do_checkin = {
+            'service': (self.service_checkout, self.service_checkin),
+            'model': (self.model_checkout, self.model_checkin),
+        }[options['mode']]
+
+        def record(key, amount=1):
+            with lock:
+                counts[key] += amount
+
+        def worker(attempts, seed):
+            rng = random.Random(seed)
+            due_at = timezone.now() + timedelta(days=14)
+            held = []
+            try:
+                for _ in range(attempts):
+                    if held and rng.random() < options['return_rate']:
+                        try:
+                            returned = do_checkin(held[0], record)
+                        except (IntegrityError, OperationalError):
+                            record('return_errors')
+                        else:
+                            held.pop(0)
+                            record('returns' if returned else 'double_returns')
+                    try:
+                        loan = do_checkout(rng.choice(book_ids), rng.choice(member_ids), due_at, record)
+                    except checkout.BookUnavailable:
+                        record('conflicts')
+                    except (ValidationError, IntegrityError, OperationalError):
+                        record('errors')
+                    else:
+                        record('checkouts')
+                        held.append(loan)
+            finally:
+                connection.close()
+
+        threads = max(options['threads'], 1)
+        share, extra = divmod(options['attempts'], threads)
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            futures = [
+                pool.submit(worker, share + (1 if i < extra else 0), options['seed'] + i)
+                for i in range(threads)
+            ]
+            for future in futures:
+                future.result()
+        elapsed = time.perf_counter() - started
+
+        violations = self.check_invariants(book_ids)
+        attempts = counts['checkouts'] + counts['conflicts'] + counts['errors']
+        result = {
+            'mode': options['mode'],
+            'threads': threads,
+            'books': len(book_ids),
+            'attempts': attempts,
+            'elapsed_sec': elapsed,
+            'attempts_per_sec': attempts / elapsed if elapsed else 0.0,
+            'checkouts': counts['checkouts'],
+            'returns': counts['returns'],
+            'conflicts': counts['conflicts'],
+            'conflict_rate': counts['conflicts'] / attempts if attempts else 0.0,
+            'lock_retries': counts['lock_retries'],
+            'errors': counts['errors'],
+            'return_errors': counts['return_errors'],
+            'double_returns': counts['double_returns'],
+            'violations': violations,
+        }
+
+        self.stdout.write(
+            f"[{options['mode']}] {attempts} attempts on {len(book_ids)} books from {threads} threads in {elapsed:.2f}s "
+            f"({result['attempts_per_sec']:.1f}/s)"
+        )
+        self.stdout.write(
+            f"  checkouts {result['checkouts']}  returns {result['returns']}  "
+            f"conflicts {result['conflicts']} ({result['conflict_rate']:.1%})  "
+            f"lock retries {result['lock_retries']}  "
+            f"errors {result['errors']}/{result['return_errors']}"
+        )
+        if violations:
+            for violation in violations:
+                self.stdout.write(self.style.ERROR(f"  ✗ {violation}"))
+        else:
+            self.stdout.write(self.style.SUCCESS('✓ No invariant violations'))
+
+        if options['output']:
+            with open(options['output'], 'w') as fh:
+                json.dump(result, fh, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+        if not options['keep']:
+            Loan.objects.filter(book_id__in=book_ids).delete()
+            Book.objects.filter(pk__in=book_ids).delete()
+            Member.objects.filter(pk__in=member_ids).delete()
+            Author.objects.filter(books__isnull=True, name='Stress Test Author').delete()
+        return None
+
+    def service_checkout(self, book_id, member_id, due_at, record):
+        return checkout.checkout(book_id, member_id, due_at, on_retry=lambda attempt: record('lock_retries'))
+
+    def service_checkin(self, loan, record):
+        return checkout.checkin(loan.pk, on_retry=lambda attempt: record('lock_retries'))
+
+    def model_checkout(self, book_id, member_id, due_at, record):
+        loan = Loan(book=Book.objects.get(pk=book_id), member_id=member_id, due_at=due_at)
+        try:
+            with transaction.atomic():
+                loan.save()
+        except ValidationError as exc:
+            if 'not available' in str(exc):
+                raise checkout.BookUnavailable(exc.messages) from exc
+            raise
+        return loan
+
+    def model_checkin(self, loan, record):
+        with transaction.atomic():
+            loan.return_book()
+        return True
+
+    def create_fixture(self, book_count, member_count):
+        token = f'{int(time.time() * 1000):x}'
+        author = Author.objects.create(name='Stress Test Author')
+        books = Book.objects.bulk_create([
+            Book(title=f'Stress Book {i}', isbn=f'S{token}{i:04d}', author=author)
+            for i in range(max(book_count, 1))
+        ])
+        members = Member.objects.bulk_create([
+            Member(full_name=f'Stress Member {i}', email=f'stress-{token}-{i}@example.com')
+            for i in range(max(member_count, 1))
+        ])
+        return books, members
+
+    def check_invariants(self, book_ids):
+        violations = []
+        books = Book.objects.filter(pk__in=book_ids).annotate(
+            active=Count('loans', filter=Q(loans__returned_at__isnull=True)),
+        ).values_list('pk', 'status', 'active')
+        for pk, status, active in books:
+            if active > 1:
+                violations.append(f"Book {pk} has {active} active loans")
+            elif status == 'LOANED' and active != 1:
+                violations.append(f"Book {pk} is LOANED with {active} active loans")
+            elif status == 'AVAILABLE' and active:
+                violations.append(f"Book {pk} is AVAILABLE with {active} active loans")
+        return violations
@@ -0,0 +1,116 @@
+# Full-text search index for the catalog (SQLite FTS5)
+
+from django.db import migrations
+
+
+FTS_TABLE = 'library_book_fts'
+
+TAGS_FOR_BOOK = """
+    COALESCE((SELECT group_concat(t.name, ' ')
+              FROM library_booktag bt JOIN library_tag t ON t.id = bt.tag_id
+              WHERE bt.book_id = {book_id}), '')
+"""
+
+CREATE_SQL = [
+    f"""
+    CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+        title, author, tags,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3'
+    )
+    """,
+    f"""
+    CREATE TRIGGER library_book_fts_ai AFTER INSERT ON library_book BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, title, author, tags)
+        VALUES (NEW.id, NEW.title,
+                (SELECT name FROM library_author WHERE id = NEW.author_id),
+                {TAGS_FOR_BOOK.format(book_id='NEW.id')});
+    END
+    """,
+    f"""
+    CREATE TRIGGER library_book_fts_au AFTER UPDATE OF title, author_id ON library_book BEGIN
+        UPDATE {FTS_TABLE}
+        SET title = NEW.title,
+            author = (SELECT name FROM library_author WHERE id = NEW.author_id)
+        WHERE rowid = NEW.id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER library_book_fts_ad AFTER DELETE ON library_book BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = OLD.id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER library_author_fts_au AFTER UPDATE OF name ON library_author BEGIN
+        UPDATE {FTS_TABLE} SET author = NEW.name
+        WHERE rowid IN (SELECT id FROM library_book WHERE author_id = NEW.id);
+    END
+    """,
+    f"""
+    CREATE TRIGGER library_booktag_fts_ai AFTER INSERT ON library_booktag BEGIN
+        UPDATE {FTS_TABLE} SET tags = {TAGS_FOR_BOOK.format(book_id='NEW.book_id')}
+        WHERE rowid = NEW.book_id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER library_booktag_fts_ad AFTER DELETE ON library_booktag BEGIN
+        UPDATE {FTS_TABLE} SET tags = {TAGS_FOR_BOOK.format(book_id='OLD.book_id')}
+        WHERE rowid = OLD.book_id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER library_tag_fts_au AFTER UPDATE OF name ON library_tag BEGIN
+        UPDATE {FTS_TABLE} SET tags = {TAGS_FOR_BOOK.format(book_id=FTS_TABLE + '.rowid')}
+        WHERE rowid IN (SELECT book_id FROM library_booktag WHERE tag_id = NEW.id);
+    END
+    """,
+    f"""
+    INSERT INTO {FTS_TABLE}(rowid, title, author, tags)
+    SELECT b.id, b.title, a.name, {TAGS_FOR_BOOK.format(book_id='b.id')}
+    FROM library_book b JOIN library_author a ON a.id = b.author_id
+    """,
+]
+
+DROP_SQL = [
+    'DROP TRIGGER IF EXISTS library_tag_fts_au',
+    'DROP TRIGGER IF EXISTS library_booktag_fts_ad',
+    'DROP TRIGGER IF EXISTS library_booktag_fts_ai',
+    'DROP TRIGGER IF EXISTS library_author_fts_au',
+    'DROP TRIGGER IF EXISTS library_book_fts_ad',
+    'DROP TRIGGER IF EXISTS library_book_fts_au',
+    'DROP TRIGGER IF EXISTS library_book_fts_ai',
+    f'DROP TABLE IF EXISTS {FTS_TABLE}',
+]
+
+
+def has_fts5(schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return False
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+        return bool(cursor.fetchone()[0])
+
+
+def create_search_index(apps, schema_editor):
+    if not has_fts5(schema_editor):
+        return
+    for sql in CREATE_SQL:
+        schema_editor.execute(sql)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in DROP_SQL:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0002_phase2_extended_models'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
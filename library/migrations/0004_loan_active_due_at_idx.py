@@ -0,0 +1,17 @@
+# Partial index for overdue loan lookups
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0003_book_search_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='loan',
+            index=models.Index(condition=models.Q(('returned_at__isnull', True)), fields=['due_at'], name='loan_active_due_at_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Bookkeeping for the risk recomputation service
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0004_loan_active_due_at_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RiskRecomputeRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('started_at', models.DateTimeField(help_text='When the run started (loans changed after this are rescanned next time)')),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('incremental', models.BooleanField(default=False)),
+                ('members_scanned', models.PositiveIntegerField(default=0)),
+                ('profiles_changed', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['-started_at'],
+                'get_latest_by': 'started_at',
+            },
+        ),
+    ]
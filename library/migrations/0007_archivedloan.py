@@ -0,0 +1,29 @@
+# Archive table for returned loans moved out of library_loan
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0006_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedLoan',
+            fields=[
+                ('id', models.BigIntegerField(help_text='Id of the original Loan', primary_key=True, serialize=False)),
+                ('loaned_at', models.DateTimeField()),
+                ('due_at', models.DateTimeField()),
+                ('returned_at', models.DateTimeField()),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='archived_loans', to='library.book')),
+                ('member', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_loans', to='library.member')),
+            ],
+            options={
+                'ordering': ['-loaned_at'],
+                'indexes': [models.Index(fields=['member', '-loaned_at', '-id'], name='archloan_member_loaned_at_idx')],
+            },
+        ),
+    ]
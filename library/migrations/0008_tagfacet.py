@@ -0,0 +1,96 @@
+# Materialized tag x status book counts, maintained by triggers (SQLite)
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+FACET_TABLE = 'library_tagfacet'
+
+ADD_ONE = f"""
+    INSERT INTO {FACET_TABLE}(tag_id, status, book_count)
+    SELECT {{tag_id}}, {{status}}, 1 FROM {{source}}
+    ON CONFLICT(tag_id, status) DO UPDATE SET book_count = book_count + 1;
+"""
+
+CREATE_SQL = [
+    f"""
+    CREATE TRIGGER library_booktag_facet_ai AFTER INSERT ON library_booktag BEGIN
+        {ADD_ONE.format(tag_id='NEW.tag_id', status='status', source='library_book WHERE id = NEW.book_id')}
+    END
+    """,
+    f"""
+    CREATE TRIGGER library_booktag_facet_ad AFTER DELETE ON library_booktag BEGIN
+        UPDATE {FACET_TABLE} SET book_count = book_count - 1
+        WHERE tag_id = OLD.tag_id
+          AND status = (SELECT status FROM library_book WHERE id = OLD.book_id);
+    END
+    """,
+    f"""
+    CREATE TRIGGER library_booktag_facet_au AFTER UPDATE OF book_id, tag_id ON library_booktag BEGIN
+        UPDATE {FACET_TABLE} SET book_count = book_count - 1
+        WHERE tag_id = OLD.tag_id
+          AND status = (SELECT status FROM library_book WHERE id = OLD.book_id);
+        {ADD_ONE.format(tag_id='NEW.tag_id', status='status', source='library_book WHERE id = NEW.book_id')}
+    END
+    """,
+    f"""
+    CREATE TRIGGER library_book_facet_au AFTER UPDATE OF status ON library_book
+    WHEN OLD.status <> NEW.status BEGIN
+        UPDATE {FACET_TABLE} SET book_count = book_count - 1
+        WHERE status = OLD.status
+          AND tag_id IN (SELECT tag_id FROM library_booktag WHERE book_id = NEW.id);
+        {ADD_ONE.format(tag_id='tag_id', status='NEW.status', source='library_booktag WHERE book_id = NEW.id')}
+    END
+    """,
+    f"""
+    INSERT INTO {FACET_TABLE}(tag_id, status, book_count)
+    SELECT bt.tag_id, b.status, COUNT(*)
+    FROM library_booktag bt JOIN library_book b ON b.id = bt.book_id
+    GROUP BY bt.tag_id, b.status
+    """,
+]
+
+DROP_SQL = [
+    'DROP TRIGGER IF EXISTS library_book_facet_au',
+    'DROP TRIGGER IF EXISTS library_booktag_facet_au',
+    'DROP TRIGGER IF EXISTS library_booktag_facet_ad',
+    'DROP TRIGGER IF EXISTS library_booktag_facet_ai',
+]
+
+
+def create_facet_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in CREATE_SQL:
+        schema_editor.execute(sql)
+
+
+def drop_facet_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in DROP_SQL:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0007_archivedloan'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TagFacet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('AVAILABLE', 'Available'), ('LOANED', 'Loaned'), ('LOST', 'Lost')], max_length=20)),
+                ('book_count', models.IntegerField(default=0)),
+                ('tag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='facets', to='library.tag')),
+            ],
+            options={
+                'ordering': ['tag', 'status'],
+                'constraints': [models.UniqueConstraint(fields=('tag', 'status'), name='unique_tag_facet')],
+            },
+        ),
+        migrations.RunPython(create_facet_triggers, drop_facet_triggers),
+    ]
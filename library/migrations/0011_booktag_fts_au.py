@@ -0,0 +1,47 @@
+# Refresh the search index's tags when a BookTag is moved to another book or tag
+
+from django.db import migrations
+
+
+FTS_TABLE = 'library_book_fts'
+
+TAGS_FOR_BOOK = """
+    COALESCE((SELECT group_concat(t.name, ' ')
+              FROM library_booktag bt JOIN library_tag t ON t.id = bt.tag_id
+              WHERE bt.book_id = {book_id}), '')
+"""
+
+CREATE_SQL = f"""
+    CREATE TRIGGER library_booktag_fts_au AFTER UPDATE OF book_id, tag_id ON library_booktag BEGIN
+        UPDATE {FTS_TABLE} SET tags = {TAGS_FOR_BOOK.format(book_id='OLD.book_id')}
+        WHERE rowid = OLD.book_id;
+        UPDATE {FTS_TABLE} SET tags = {TAGS_FOR_BOOK.format(book_id='NEW.book_id')}
+        WHERE rowid = NEW.book_id;
+    END
+"""
+
+DROP_SQL = 'DROP TRIGGER IF EXISTS library_booktag_fts_au'
+
+
+def create_trigger(apps, schema_editor):
+    # Only where migration 0003 could create the FTS5 index
+    if FTS_TABLE not in schema_editor.connection.introspection.table_names():
+        return
+    schema_editor.execute(CREATE_SQL)
+
+
+def drop_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(DROP_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0010_job'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigger, drop_trigger),
+    ]
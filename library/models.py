@@ -1,7 +1,57 @@
-from django.db import models
-from django.core.exceptions import ValidationError
+from collections import namedtuple
+from itertools import islice
+
+from django.db import connections, models, transaction
+from django.db.models.functions import Coalesce
+from django.core.exceptions import EmptyResultSet, ValidationError
 from django.utils import timezone
 
+from . import availability
+
+
+# SQLite caps the number of bound parameters per statement, so large id lists
+# are split into chunks of this size before being used in ``IN (...)`` lookups.
+IN_CLAUSE_CHUNK_SIZE = 500
+
+
+def chunked(items, size=IN_CLAUSE_CHUNK_SIZE):
+    """Yield successive lists of at most ``size`` items from ``items``."""
+    items = iter(items)
+    while chunk := list(islice(items, size)):
+        yield chunk
+
+
+def pk_ranges(queryset):
+    """
+    Return the primary keys of ``queryset`` as ``[first, last]`` runs of
+    consecutive ids, computed in SQL. A large selection (e.g. a whole admin
+    changelist) is usually a few runs, so it fits in a job payload.
+    """
+    try:
+        sql, params = queryset.order_by().values_list('pk').query.sql_with_params()
+    except EmptyResultSet:
+        return []
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(
+            f'WITH selected(id) AS ({sql}) '
+            f'SELECT MIN(id), MAX(id) FROM ('
+            f'  SELECT id, id - ROW_NUMBER() OVER (ORDER BY id) AS run FROM selected'
+            f') GROUP BY run ORDER BY 1',
+            params,
+        )
+        return [[first, last] for first, last in cursor.fetchall()]
+
+
+def range_size(ranges):
+    """Number of ids covered by ``pk_ranges()`` output."""
+    return sum(last - first + 1 for first, last in ranges)
+
+
+def expand_ranges(ranges):
+    """Iterate over the ids in ``pk_ranges()`` output."""
+    for first, last in ranges:
+        yield from range(first, last + 1)
+
 
 class Author(models.Model):
     """
@@ -20,6 +70,9 @@ class Author(models.Model):
     class Meta:
         ordering = ['name']
         verbose_name_plural = "Authors"
+        indexes = [
+            models.Index(fields=['name', 'id'], name='author_name_id_idx'),
+        ]
 
     def __str__(self):
         if self.country:
@@ -63,11 +116,35 @@ class Book(models.Model):
         indexes = [
             models.Index(fields=['isbn']),
             models.Index(fields=['status']),
+            models.Index(fields=['title', 'id'], name='book_title_id_idx'),
         ]
 
     def __str__(self):
         return f"{self.title} by {self.author.name}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored ISBN so a change can drop the old cache entry
+        instance._loaded_isbn = instance.__dict__.get('isbn')
+        return instance
+
+    def save(self, *args, **kwargs):
+        """Save and write the status through to the availability cache."""
+        super().save(*args, **kwargs)
+        loaded_isbn = getattr(self, '_loaded_isbn', None)
+        if loaded_isbn and loaded_isbn != self.isbn:
+            availability.invalidate(isbns=[loaded_isbn])
+        self._loaded_isbn = self.isbn
+        availability.set_statuses({self.pk: self.status})
+
+    def delete(self, *args, **kwargs):
+        """Delete and drop the book from the availability cache."""
+        book_id, isbn = self.pk, self.isbn
+        result = super().delete(*args, **kwargs)
+        availability.invalidate(book_ids=[book_id], isbns=[isbn])
+        return result
+
     @property
     def is_available(self):
         """Check if book is available for lending."""
@@ -79,6 +156,24 @@ class Book(models.Model):
         self.save()
 
 
+class MemberQuerySet(models.QuerySet):
+    """QuerySet helpers for Member."""
+
+    def with_loan_counts(self):
+        """
+        Annotate ``loan_count`` (archived loans included) and
+        ``active_loan_count`` in a single query.
+        """
+        archived = (
+            ArchivedLoan.objects.filter(member=models.OuterRef('pk'))
+            .order_by().values('member').annotate(count=models.Count('pk')).values('count')
+        )
+        return self.annotate(
+            loan_count=models.Count('loans') + Coalesce(models.Subquery(archived), 0),
+            active_loan_count=models.Count('loans', filter=models.Q(loans__returned_at__isnull=True)),
+        )
+
+
 class Member(models.Model):
     """
     Library Member model.
@@ -88,6 +183,8 @@ class Member(models.Model):
     email = models.EmailField(unique=True, help_text="Member's email (unique)")
     joined_at = models.DateTimeField(auto_now_add=True)
 
+    objects = MemberQuerySet.as_manager()
+
     class Meta:
         ordering = ['full_name']
 
@@ -95,6 +192,154 @@ class Member(models.Model):
         return self.full_name
 
 
+CheckoutOutcome = namedtuple('CheckoutOutcome', ['book_id', 'member_id', 'loan', 'reason'])
+
+
+class BulkCheckoutResult:
+    """
+    Per-item result of ``Loan.objects.bulk_checkout()``.
+    ``outcomes`` keeps the input order; rejected items carry a reason.
+    """
+
+    def __init__(self, outcomes):
+        self.outcomes = outcomes
+
+    @property
+    def loans(self):
+        return [outcome.loan for outcome in self.outcomes if outcome.loan is not None]
+
+    @property
+    def rejected(self):
+        return [outcome for outcome in self.outcomes if outcome.reason is not None]
+
+    def __len__(self):
+        return len(self.outcomes)
+
+    def __iter__(self):
+        return iter(self.outcomes)
+
+
+class LoanQuerySet(models.QuerySet):
+    """QuerySet with set-based operations for Loan."""
+
+    def active(self):
+        """Loans that have not been returned yet."""
+        return self.filter(returned_at__isnull=True)
+
+    def overdue(self, at=None):
+        """
+        Active loans whose due date has passed, checked in SQL.
+        Served by the partial index on ``due_at WHERE returned_at IS NULL``.
+        """
+        return self.active().filter(due_at__lt=at or timezone.now())
+
+    def bulk_checkout(self, pairs, due_at):
+        """
+        Check out many books at once.
+
+        ``pairs`` is an iterable of ``(book, member)`` tuples (instances or ids).
+        Availability is checked for the whole batch in one query, loans are
+        inserted with ``bulk_create`` and the books are flipped to LOANED with a
+        single UPDATE, all inside one transaction. Per-row ``full_clean()`` and
+        ``Book.save()`` are skipped, so the checks done in ``Loan.clean()`` are
+        applied here in bulk instead.
+        """
+        if due_at <= timezone.now():
+            raise ValidationError("Due date must be after the loan date")
+
+        pairs = [(getattr(book, 'pk', book), getattr(member, 'pk', member)) for book, member in pairs]
+        book_ids = {book_id for book_id, _ in pairs}
+        member_ids = {member_id for _, member_id in pairs}
+
+        with transaction.atomic(using=self.db):
+            book_state = {}
+            for chunk in chunked(book_ids):
+                rows = (
+                    Book.objects.using(self.db)
+                    .select_for_update()
+                    .filter(pk__in=chunk)
+                    .annotate(has_active_loan=models.Exists(
+                        self.model.objects.filter(book=models.OuterRef('pk'), returned_at__isnull=True)
+                    ))
+                    .order_by()
+                    .values_list('pk', 'status', 'has_active_loan')
+                )
+                book_state.update((pk, (status, active)) for pk, status, active in rows)
+
+            known_members = set()
+            for chunk in chunked(member_ids):
+                known_members.update(
+                    Member.objects.using(self.db).filter(pk__in=chunk).order_by().values_list('pk', flat=True)
+                )
+
+            outcomes = []
+            accepted = []
+            claimed = set()
+            for book_id, member_id in pairs:
+                state = book_state.get(book_id)
+                if state is None:
+                    reason = "Book does not exist"
+                elif member_id not in known_members:
+                    reason = "Member does not exist"
+                elif book_id in claimed:
+                    reason = "Book appears more than once in this batch"
+                elif state[0] != 'AVAILABLE':
+                    reason = f"Book is not available (status: {state[0]})"
+                elif state[1]:
+                    reason = "This book already has an active loan"
+                else:
+                    reason = None
+                    claimed.add(book_id)
+                    accepted.append(len(outcomes))
+                outcomes.append(CheckoutOutcome(book_id, member_id, None, reason))
+
+            loans = self.bulk_create([
+                self.model(book_id=outcomes[i].book_id, member_id=outcomes[i].member_id, due_at=due_at)
+                for i in accepted
+            ])
+            for i, loan in zip(accepted, loans):
+                outcomes[i] = outcomes[i]._replace(loan=loan)
+
+            for chunk in chunked(claimed):
+                Book.objects.using(self.db).filter(pk__in=chunk).update(status='LOANED')
+            availability.set_status(claimed, 'LOANED')
+
+        return BulkCheckoutResult(outcomes)
+
+    def bulk_return(self, queryset=None, returned_at=None):
+        """
+        Return every active loan in ``queryset`` (defaults to this queryset).
+
+        Issues set-based UPDATEs inside one transaction: the books of the
+        active loans are set to AVAILABLE and the loans get ``returned_at``.
+        The book UPDATE comes first so the transaction takes SQLite's write
+        lock (waiting on ``busy_timeout``) before it reads anything; a read
+        first would fail at once on the lock upgrade whenever another
+        connection is writing. Returns a ``(loans_returned, books_updated)``
+        tuple.
+        """
+        if queryset is None:
+            queryset = self
+        returned_at = returned_at or timezone.now()
+        active = queryset.filter(returned_at__isnull=True).order_by()
+
+        with transaction.atomic(using=self.db):
+            books_updated = Book.objects.using(self.db).filter(
+                pk__in=active.values('book_id')
+            ).update(status='AVAILABLE')
+            if not books_updated:
+                # Every loan has a book, so no book means no active loan
+                return 0, 0
+            book_ids = list(active.values_list('book_id', flat=True))
+            loans_returned = active.update(returned_at=returned_at)
+            availability.set_status(book_ids, 'AVAILABLE')
+
+        return loans_returned, books_updated
+
+
+LoanManager = models.Manager.from_queryset(LoanQuerySet)
+
+
 class Loan(models.Model):
     """
     Loan model linking Book and Member.
@@ -124,6 +369,8 @@ class Loan(models.Model):
         help_text="Actual return date (null if not returned)"
     )
 
+    objects = LoanManager()
+
     class Meta:
         ordering = ['-loaned_at']
         constraints = [
@@ -134,6 +381,14 @@ class Loan(models.Model):
                 violation_error_message='This book already has an active loan'
             ),
         ]
+        indexes = [
+            models.Index(fields=['member', '-loaned_at', '-id'], name='loan_member_loaned_at_idx'),
+            models.Index(
+                fields=['due_at'],
+                condition=models.Q(returned_at__isnull=True),
+                name='loan_active_due_at_idx',
+            ),
+        ]
 
     def __str__(self):
         status = "Active" if not self.returned_at else "Returned"
@@ -174,11 +429,49 @@ class Loan(models.Model):
     @property
     def is_overdue(self):
         """Check if loan is overdue."""
-        if self.returned_at:
+        if self.returned_at or self.due_at is None:
             return False
         return timezone.now() > self.due_at
 
 
+class ArchivedLoanQuerySet(models.QuerySet):
+    """Mirrors ``LoanQuerySet``'s filters; archived loans are never active."""
+
+    def active(self):
+        return self.none()
+
+    def overdue(self, at=None):
+        return self.none()
+
+
+class ArchivedLoan(models.Model):
+    """
+    A returned loan moved out of ``library_loan`` by ``archive_loans``.
+    Keeps the original loan id and only the columns history queries need.
+    """
+    id = models.BigIntegerField(primary_key=True, help_text="Id of the original Loan")
+    book = models.ForeignKey(Book, on_delete=models.PROTECT, related_name='archived_loans')
+    member = models.ForeignKey(Member, on_delete=models.CASCADE, related_name='archived_loans')
+    loaned_at = models.DateTimeField()
+    due_at = models.DateTimeField()
+    returned_at = models.DateTimeField()
+
+    objects = ArchivedLoanQuerySet.as_manager()
+
+    class Meta:
+        ordering = ['-loaned_at']
+        indexes = [
+            models.Index(fields=['member', '-loaned_at', '-id'], name='archloan_member_loaned_at_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.book.title} to {self.member.full_name} (Archived)"
+
+    @property
+    def is_overdue(self):
+        return False
+
+
 # ============================================================================
 # FASE 2: Extended Models (OneToOne, ManyToMany with through)
 # ============================================================================
@@ -224,6 +517,14 @@ class MemberProfile(models.Model):
         return f"Profile of {self.member.full_name}{nickname_text} - Risk: {self.get_risk_level_display()}"
 
 
+class TagQuerySet(models.QuerySet):
+    """QuerySet helpers for Tag."""
+
+    def with_book_counts(self):
+        """Annotate ``book_count`` with the number of books carrying each tag."""
+        return self.annotate(book_count=models.Count('book_tags'))
+
+
 class Tag(models.Model):
     """
     Tag model for categorizing books.
@@ -239,6 +540,8 @@ class Tag(models.Model):
         help_text="Description of the tag"
     )
 
+    objects = TagQuerySet.as_manager()
+
     class Meta:
         ordering = ['name']
 
@@ -273,3 +576,128 @@ class BookTag(models.Model):
 
     def __str__(self):
         return f"{self.book.title} -> {self.tag.name}"
+
+
+class TagFacet(models.Model):
+    """
+    Materialized number of books per (tag, status).
+    Kept current by database triggers on BookTag and Book.status (see
+    migration 0008); ``library.facets.rebuild()`` recomputes it from scratch.
+    """
+    tag = models.ForeignKey(Tag, on_delete=models.CASCADE, related_name='facets')
+    status = models.CharField(max_length=20, choices=Book.STATUS_CHOICES)
+    book_count = models.IntegerField(default=0)
+
+    class Meta:
+        ordering = ['tag', 'status']
+        constraints = [
+            models.UniqueConstraint(fields=['tag', 'status'], name='unique_tag_facet'),
+        ]
+
+    def __str__(self):
+        return f"{self.tag.name} / {self.status}: {self.book_count}"
+
+
+class BookRecommendation(models.Model):
+    """
+    One "members who borrowed this also borrowed" neighbour of a book.
+    Rows are written by ``library.recommendations.build()``; ``position``
+    1 is the book most often borrowed by the same members.
+    """
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='recommendations')
+    position = models.PositiveSmallIntegerField()
+    recommended = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='+')
+    co_borrowers = models.PositiveIntegerField(help_text="Members who borrowed both books")
+
+    class Meta:
+        ordering = ['book', 'position']
+        constraints = [
+            models.UniqueConstraint(fields=['book', 'position'], name='unique_book_recommendation'),
+        ]
+
+    def __str__(self):
+        return f"{self.book_id} -> {self.recommended_id} (#{self.position})"
+
+
+# ============================================================================
+# Maintenance bookkeeping
+# ============================================================================
+
+
+class RiskRecomputeRun(models.Model):
+    """
+    One execution of the member risk recomputation.
+    The latest finished run is the starting point for incremental runs.
+    """
+    started_at = models.DateTimeField(help_text="When the run started (loans changed after this are rescanned next time)")
+    finished_at = models.DateTimeField(null=True, blank=True)
+    incremental = models.BooleanField(default=False)
+    members_scanned = models.PositiveIntegerField(default=0)
+    profiles_changed = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['-started_at']
+        get_latest_by = 'started_at'
+
+    def __str__(self):
+        kind = "Incremental" if self.incremental else "Full"
+        return f"{kind} risk run at {self.started_at:%Y-%m-%d %H:%M} ({self.profiles_changed} changed)"
+
+
+class RecommendationBuild(models.Model):
+    """
+    One execution of the "also borrowed" build.
+    ``last_loan_id`` is the high-water mark incremental builds continue from.
+    """
+    started_at = models.DateTimeField()
+    finished_at = models.DateTimeField(null=True, blank=True)
+    incremental = models.BooleanField(default=False)
+    last_loan_id = models.BigIntegerField(default=0, help_text="Highest Loan id folded into this build")
+    books_updated = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['-started_at']
+        get_latest_by = 'started_at'
+
+    def __str__(self):
+        kind = "Incremental" if self.incremental else "Full"
+        return f"{kind} recommendation build at {self.started_at:%Y-%m-%d %H:%M} ({self.books_updated} books)"
+
+
+class Job(models.Model):
+    """
+    A unit of background work executed by ``run_worker`` (see library/jobs.py).
+    Failed jobs go back to QUEUED with a delayed ``run_after`` until
+    ``max_attempts`` is used up.
+    """
+    STATUS_CHOICES = [
+        ('QUEUED', 'Queued'),
+        ('RUNNING', 'Running'),
+        ('DONE', 'Done'),
+        ('FAILED', 'Failed'),
+    ]
+
+    kind = models.CharField(max_length=50, help_text="Handler name registered in library.jobs")
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='QUEUED')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=3)
+    run_after = models.DateTimeField(default=timezone.now, help_text="Not claimed before this time")
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True, help_text="Last progress report from the worker")
+    worker = models.CharField(max_length=100, blank=True)
+    progress = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(null=True, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'run_after', 'id'], name='job_claim_idx'),
+        ]
+
+    def __str__(self):
+        return f"#{self.pk} {self.kind} ({self.status.lower()})"
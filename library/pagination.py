@@ -0,0 +1,170 @@
+"""
+Pagination helpers for the library app.
+
+Keyset (cursor) pagination: instead of ``OFFSET n`` each page is fetched
+with a ``WHERE`` clause that continues after the last row of the previous
+page, so page 10,000 costs the same single indexed query as page one. The
+ordering must end with a unique column (normally ``id``) so the cursor
+always points at exactly one row.
+
+``ApproximateCountPaginator`` is the admin side: changelists over large
+tables stop paying for an exact ``COUNT(*)`` on every page view.
+"""
+
+import base64
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+
+class InvalidCursor(ValueError):
+    """Raised when a client sends a cursor that cannot be decoded."""
+
+
+def encode_cursor(values):
+    raw = json.dumps(values, separators=(',', ':'), default=str).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor, count):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError) as exc:
+        raise InvalidCursor("Invalid cursor") from exc
+    if not isinstance(values, list) or len(values) != count:
+        raise InvalidCursor("Invalid cursor")
+    # Cursors only ever hold scalars, and ordering columns are never NULL
+    if any(value is None or isinstance(value, (list, dict)) for value in values):
+        raise InvalidCursor("Invalid cursor")
+    return values
+
+
+def after_filter(ordering, values):
+    """
+    Build the Q object selecting rows strictly after ``values`` in ``ordering``.
+
+    For ordering (a, -b, c) this is:
+    a >= x AND (a > x  OR  (a = x AND b < y)  OR  (a = x AND b = y AND c > z))
+
+    The redundant leading ``a >= x`` lets the database seek straight to the
+    cursor position in an index on the ordering columns.
+    """
+    condition = Q()
+    equal = {}
+    for field, value in zip(ordering, values):
+        name = field.lstrip('-')
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        condition |= Q(**equal, **{f'{name}__{lookup}': value})
+        equal[name] = value
+    first = ordering[0]
+    bound = Q(**{f"{first.lstrip('-')}__{'lte' if first.startswith('-') else 'gte'}": values[0]})
+    return bound & condition
+
+
+def seek(queryset, ordering, cursor):
+    """Order ``queryset`` by ``ordering`` and skip to just after ``cursor``."""
+    queryset = queryset.order_by(*ordering)
+    if cursor:
+        names = [field.lstrip('-') for field in ordering]
+        raw_values = decode_cursor(cursor, len(names))
+        try:
+            values = [
+                queryset.model._meta.get_field(name).to_python(value)
+                for name, value in zip(names, raw_values)
+            ]
+        except (ValidationError, TypeError, ValueError) as exc:
+            raise InvalidCursor("Invalid cursor") from exc
+        queryset = queryset.filter(after_filter(ordering, values))
+    return queryset
+
+
+def split_page(rows, ordering, limit):
+    """Trim ``limit + 1`` fetched rows to a page and its next cursor."""
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([rows[-1][field.lstrip('-')] for field in ordering])
+    return rows, next_cursor
+
+
+def keyset_page(queryset, ordering, fields, cursor=None, limit=50):
+    """
+    Return ``(rows, next_cursor)`` for one page of ``queryset``.
+
+    ``rows`` are ``values(*fields)`` dicts; ``ordering`` field names must be
+    included in ``fields``. ``next_cursor`` is None on the last page.
+    """
+    rows = list(seek(queryset, ordering, cursor).values(*fields)[:limit + 1])
+    return split_page(rows, ordering, limit)
+
+
+def keyset_union_page(querysets, ordering, fields, cursor=None, limit=50):
+    """
+    Like ``keyset_page`` over the union of several querysets.
+
+    Each queryset is seeked and limited on its own (one indexed query per
+    store) and the pages are merged in Python, which avoids ``UNION`` with
+    per-branch ``ORDER BY``/``LIMIT`` that SQLite cannot express. Rows must
+    be unique on ``ordering`` across all querysets.
+    """
+    rows = []
+    for queryset in querysets:
+        rows.extend(seek(queryset, ordering, cursor).values(*fields)[:limit + 1])
+    for field in reversed(ordering):
+        rows.sort(key=lambda row: row[field.lstrip('-')], reverse=field.startswith('-'))
+    return split_page(rows[:limit + 1], ordering, limit)
+
+
+class ApproximateCountPaginator(Paginator):
+    """
+    Admin paginator that never counts more than ``threshold`` rows.
+
+    The count is first taken over at most ``threshold + 1`` rows
+    (``COUNT(*)`` over a ``LIMIT`` subquery). Below the threshold that is
+    the exact count. Above it, the set is counted only as far as the
+    requested page plus one row, so navigation degrades to "next page
+    exists" and never links to a page past the end. (The highest primary
+    key is no estimate: deleted and archived rows leave gaps.) Capped counts
+    are cached for ``LIBRARY_ADMIN_COUNT_TIMEOUT`` seconds per query.
+    ``exact`` tells the template whether to print the count as is.
+    """
+
+    def __init__(self, object_list, per_page, orphans=0, allow_empty_first_page=True, page_number=1):
+        super().__init__(object_list, per_page, orphans, allow_empty_first_page)
+        try:
+            self.page_number = max(int(page_number), 1)
+        except (TypeError, ValueError):
+            self.page_number = 1
+        self.threshold = getattr(settings, 'LIBRARY_ADMIN_COUNT_THRESHOLD', 10000)
+        self.timeout = getattr(settings, 'LIBRARY_ADMIN_COUNT_TIMEOUT', 60)
+        self.exact = True
+
+    def cache_key(self, suffix):
+        sql, params = self.object_list.query.sql_with_params()
+        digest = hashlib.md5(f'{sql}|{params!r}'.encode()).hexdigest()
+        return f'library:admin-count:{self.object_list.model._meta.label_lower}:{digest}:{suffix}'
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list.order_by()
+        key = self.cache_key('capped')
+        capped = cache.get(key)
+        if capped is None:
+            capped = queryset[:self.threshold + 1].count()
+            cache.set(key, capped, self.timeout)
+        if capped <= self.threshold:
+            return capped
+
+        self.exact = False
+        # Pretend the set ends one row after the requested page, if it goes on
+        end = self.page_number * self.per_page
+        if end < self.threshold or queryset[end:end + 1].exists():
+            return max(end + 1, capped)
+        return end
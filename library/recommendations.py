@@ -0,0 +1,137 @@
+"""
+"Members who borrowed this also borrowed" recommendations.
+
+The co-occurrence matrix C = Bᵀ·B, where B is the member x book
+"has borrowed" matrix, is computed set-based in SQL: the distinct
+(member, book) pairs from live and archived loans are loaded into an
+indexed temporary table, a self-join on member produces the non-zero
+entries of C for a block of books, and ``ROW_NUMBER()`` keeps the top
+``k`` neighbours of each book. Only those rows are stored, in
+``BookRecommendation``, so serving a book's list is one lookup on the
+``(book, position)`` index.
+
+An incremental build folds in loans created since the previous build:
+a new (member, book) pair changes row ``book`` of C and every row of the
+books that member borrowed before, so exactly those rows are recomputed.
+"""
+
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import IN_CLAUSE_CHUNK_SIZE, BookRecommendation, Loan, RecommendationBuild, chunked
+
+
+DEFAULT_TOP_K = 10
+BOOKS_PER_BLOCK = 2000
+
+BORROWED_TABLE = 'library_rec_borrowed'
+TARGET_TABLE = 'library_rec_target'
+
+PREPARE_SQL = [
+    f'DROP TABLE IF EXISTS {BORROWED_TABLE}',
+    f'DROP TABLE IF EXISTS {TARGET_TABLE}',
+    f"""
+    CREATE TEMP TABLE {BORROWED_TABLE} AS
+    SELECT DISTINCT member_id, book_id FROM (
+        SELECT member_id, book_id FROM library_loan
+        UNION ALL
+        SELECT member_id, book_id FROM library_archivedloan
+    ) AS loans
+    """,
+    f'CREATE INDEX {BORROWED_TABLE}_member ON {BORROWED_TABLE}(member_id, book_id)',
+    f'CREATE INDEX {BORROWED_TABLE}_book ON {BORROWED_TABLE}(book_id, member_id)',
+    f'CREATE TEMP TABLE {TARGET_TABLE} (book_id INTEGER PRIMARY KEY)',
+]
+
+ALL_BOOKS_SQL = f'INSERT INTO {TARGET_TABLE}(book_id) SELECT DISTINCT book_id FROM {BORROWED_TABLE}'
+
+# Books whose row of C changes when members borrow something new
+AFFECTED_BOOKS_SQL = f"""
+    INSERT OR IGNORE INTO {TARGET_TABLE}(book_id)
+    SELECT b.book_id FROM {BORROWED_TABLE} b
+    WHERE b.member_id IN (SELECT member_id FROM library_loan WHERE id > %s)
+"""
+
+TOP_K_SQL = f"""
+    INSERT INTO library_bookrecommendation(book_id, position, recommended_id, co_borrowers)
+    SELECT book_id, position, recommended_id, co_borrowers FROM (
+        SELECT a.book_id AS book_id,
+               b.book_id AS recommended_id,
+               COUNT(*) AS co_borrowers,
+               ROW_NUMBER() OVER (
+                   PARTITION BY a.book_id ORDER BY COUNT(*) DESC, b.book_id
+               ) AS position
+        FROM {BORROWED_TABLE} a
+        JOIN {BORROWED_TABLE} b ON b.member_id = a.member_id AND b.book_id <> a.book_id
+        WHERE a.book_id BETWEEN %s AND %s
+          AND a.book_id IN (SELECT book_id FROM {TARGET_TABLE})
+        GROUP BY a.book_id, b.book_id
+    ) AS ranked
+    WHERE position <= %s
+"""
+
+
+def build(incremental=False, top_k=DEFAULT_TOP_K, block_size=BOOKS_PER_BLOCK, progress=None):
+    """
+    Rebuild the stored neighbour lists and return the finished ``RecommendationBuild``.
+    ``progress(books_updated, total)`` is called after every block.
+
+    With ``incremental=True`` only books affected by loans created since the
+    last finished build are recomputed; without a previous build this falls
+    back to a full build.
+    """
+    previous = RecommendationBuild.objects.filter(finished_at__isnull=False).first()
+    incremental = bool(incremental and previous)
+    run = RecommendationBuild.objects.create(
+        started_at=timezone.now(),
+        incremental=incremental,
+        last_loan_id=Loan.objects.aggregate(last=Max('pk'))['last'] or 0,
+    )
+
+    with connection.cursor() as cursor:
+        for sql in PREPARE_SQL:
+            cursor.execute(sql)
+        try:
+            if incremental:
+                cursor.execute(AFFECTED_BOOKS_SQL, [previous.last_loan_id])
+            else:
+                cursor.execute(ALL_BOOKS_SQL)
+            cursor.execute(f'SELECT book_id FROM {TARGET_TABLE} ORDER BY book_id')
+            book_ids = [row[0] for row in cursor.fetchall()]
+
+            # Each block is replaced in its own transaction, so readers keep
+            # seeing the previous lists until the new ones are written.
+            # A full build also clears books that no longer have any loans.
+            done = 0
+            for block in chunked(book_ids, block_size):
+                with transaction.atomic():
+                    if incremental:
+                        for chunk in chunked(block, IN_CLAUSE_CHUNK_SIZE):
+                            BookRecommendation.objects.filter(book_id__in=chunk).delete()
+                    else:
+                        BookRecommendation.objects.filter(book_id__gt=done, book_id__lte=block[-1]).delete()
+                    cursor.execute(TOP_K_SQL, [block[0], block[-1], top_k])
+                done = block[-1]
+                run.books_updated += len(block)
+                if progress:
+                    progress(run.books_updated, len(book_ids))
+            if not incremental:
+                BookRecommendation.objects.filter(book_id__gt=done).delete()
+        finally:
+            cursor.execute(f'DROP TABLE IF EXISTS {BORROWED_TABLE}')
+            cursor.execute(f'DROP TABLE IF EXISTS {TARGET_TABLE}')
+
+    run.finished_at = timezone.now()
+    run.save()
+    return run
+
+
+def also_borrowed(book_id, limit=DEFAULT_TOP_K):
+    """The stored neighbours of ``book_id``, best first, with their authors."""
+    return list(
+        BookRecommendation.objects
+        .filter(book_id=book_id, position__lte=limit)
+        .select_related('recommended__author')
+        .order_by('position')
+    )
@@ -0,0 +1,142 @@
+"""
+Member risk level computation.
+
+``MemberProfile.risk_level`` is derived from each member's loan history:
+loans currently overdue, the share of returns that came back late and
+books lost while on loan. Members are processed in batches of ids; each
+batch costs one grouped aggregate query, one profile lookup and at most
+one ``bulk_update``/``bulk_create``, and only profiles whose level changes
+are written.
+"""
+
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import ArchivedLoan, Loan, Member, MemberProfile, RiskRecomputeRun, chunked
+
+
+# Thresholds used by score()
+HIGH_OVERDUE = 3
+HIGH_LATE_RATIO = 0.5
+MED_LATE_RATIO = 0.2
+MIN_RETURNS_FOR_RATIO = 2
+
+
+def score(overdue, returned, late, lost):
+    """Return the risk level for one member's loan aggregates."""
+    late_ratio = late / returned if returned >= MIN_RETURNS_FOR_RATIO else 0.0
+    if lost or overdue >= HIGH_OVERDUE or late_ratio >= HIGH_LATE_RATIO:
+        return 'HIGH'
+    if overdue or late_ratio >= MED_LATE_RATIO:
+        return 'MED'
+    return 'LOW'
+
+
+def archived_count(**filters):
+    """Per-member count of archived loans, as a correlated subquery."""
+    archived = ArchivedLoan.objects.filter(member=OuterRef('pk'), **filters).order_by().values('member')
+    return Coalesce(Subquery(archived.annotate(n=Count('pk')).values('n')), 0)
+
+
+def loan_aggregates(member_queryset, now):
+    """
+    Annotate overdue, returned, late and lost loan counts per member.
+    Archived loans count towards ``returned`` and ``late``.
+    """
+    return member_queryset.annotate(
+        overdue=Count('loans', filter=Q(loans__returned_at__isnull=True, loans__due_at__lt=now)),
+        returned=Count('loans', filter=Q(loans__returned_at__isnull=False)) + archived_count(),
+        late=(
+            Count('loans', filter=Q(loans__returned_at__gt=F('loans__due_at')))
+            + archived_count(returned_at__gt=F('due_at'))
+        ),
+        lost=Count('loans', filter=Q(loans__returned_at__isnull=True, loans__book__status='LOST')),
+    ).order_by('pk').values_list('pk', 'overdue', 'returned', 'late', 'lost')
+
+
+def changed_members(since, now):
+    """
+    Members with a loan created, returned or fallen due in ``(since, now]``,
+    or whose level may be stale because a borrowed book changed status.
+
+    Book status changes carry no timestamp, but a book on an active loan is
+    LOANED unless it was marked LOST (or back to AVAILABLE) since. A lost
+    book always scores HIGH, so those borrowers are rescanned until their
+    profile says so; active loans on AVAILABLE books are always rescanned.
+    """
+    changed = Loan.objects.filter(
+        Q(loaned_at__gt=since)
+        | Q(returned_at__gt=since)
+        | Q(returned_at__isnull=True, due_at__gt=since, due_at__lte=now)
+        | (Q(returned_at__isnull=True, book__status='LOST') & ~Q(member__profile__risk_level='HIGH'))
+        | Q(returned_at__isnull=True, book__status='AVAILABLE')
+    ).values('member_id')
+    return Member.objects.filter(pk__in=changed)
+
+
+def recompute(incremental=False, batch_size=2000, progress=None):
+    """
+    Recompute risk levels and return the finished ``RiskRecomputeRun``.
+    ``progress(members_scanned)`` is called after every batch.
+
+    With ``incremental=True`` only members whose loans changed since the
+    last finished run are rescanned; without a previous run this falls back
+    to a full scan.
+    """
+    now = timezone.now()
+    previous = RiskRecomputeRun.objects.filter(finished_at__isnull=False).first()
+    members = Member.objects.all()
+    if incremental and previous:
+        members = changed_members(previous.started_at, now)
+    run = RiskRecomputeRun.objects.create(started_at=now, incremental=bool(incremental and previous))
+
+    last_pk = 0
+    while True:
+        rows = list(loan_aggregates(members.filter(pk__gt=last_pk), now)[:batch_size])
+        if not rows:
+            break
+        last_pk = rows[-1][0]
+        run.members_scanned += len(rows)
+        run.profiles_changed += apply_levels({pk: score(*counts) for pk, *counts in rows}, now)
+        if progress:
+            progress(run.members_scanned)
+
+    run.finished_at = timezone.now()
+    run.save()
+    return run
+
+
+def recompute_members(member_ids, now=None):
+    """
+    Rescore ``member_ids`` right away, e.g. after a sweep found them overdue.
+    Returns the number of profiles changed.
+    """
+    now = now or timezone.now()
+    changed = 0
+    for chunk in chunked(member_ids):
+        rows = loan_aggregates(Member.objects.filter(pk__in=chunk), now)
+        changed += apply_levels({pk: score(*counts) for pk, *counts in rows}, now)
+    return changed
+
+
+def apply_levels(levels, now):
+    """Write ``{member_id: level}`` where it differs from the stored profile."""
+    profiles = MemberProfile.objects.filter(member_id__in=list(levels)).only('pk', 'member_id', 'risk_level')
+    changed = []
+    for profile in profiles:
+        level = levels.pop(profile.member_id)
+        if profile.risk_level != level:
+            profile.risk_level = level
+            profile.updated_at = now
+            changed.append(profile)
+    # Members without a profile only need one when they are not LOW risk
+    missing = [
+        MemberProfile(member_id=member_id, risk_level=level)
+        for member_id, level in levels.items() if level != 'LOW'
+    ]
+    with transaction.atomic():
+        MemberProfile.objects.bulk_update(changed, ['risk_level', 'updated_at'])
+        MemberProfile.objects.bulk_create(missing)
+    return len(changed) + len(missing)
@@ -0,0 +1,111 @@
+"""
+Full-text catalog search for the library app.
+
+Book titles, author names and tag names are indexed in the SQLite FTS5
+virtual table ``library_book_fts`` (rowid = book id). The table and the
+triggers that keep it in sync with Book/Author/Tag/BookTag writes are
+created by migration 0003. On other database backends, or SQLite builds
+without FTS5, ``is_available()`` is False and callers fall back to the
+regular ``icontains`` search.
+"""
+
+import re
+
+from django.db import connection, transaction
+from django.db.models.expressions import RawSQL
+
+from .models import Book
+
+
+FTS_TABLE = 'library_book_fts'
+
+# bm25() column weights: title, author, tags
+RANK_WEIGHTS = (10.0, 5.0, 2.0)
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+POPULATE_SQL = f"""
+    INSERT INTO {FTS_TABLE}(rowid, title, author, tags)
+    SELECT b.id, b.title, a.name,
+           COALESCE((SELECT group_concat(t.name, ' ')
+                     FROM library_booktag bt JOIN library_tag t ON t.id = bt.tag_id
+                     WHERE bt.book_id = b.id), '')
+    FROM library_book b JOIN library_author a ON a.id = b.author_id
+    WHERE b.id BETWEEN %s AND %s
+"""
+
+
+# Databases (by NAME) already seen to have the index, so search requests
+# do not introspect the schema every time
+_indexed_databases = set()
+
+
+def is_available():
+    """Return True if the FTS5 index exists on the current connection."""
+    if connection.vendor != 'sqlite':
+        return False
+    name = connection.settings_dict['NAME']
+    if name not in _indexed_databases:
+        if FTS_TABLE not in connection.introspection.table_names():
+            return False
+        _indexed_databases.add(name)
+    return True
+
+
+def build_match_query(text):
+    """
+    Turn free user input into a safe FTS5 MATCH expression.
+    Every word becomes a quoted prefix term and all terms must match.
+    Returns an empty string if the input has no searchable words.
+    """
+    return ' '.join(f'"{token}"*' for token in TOKEN_RE.findall(text))
+
+
+def matching_book_ids_sql(text):
+    """Return ``(sql, params)`` selecting the ids of books matching ``text``."""
+    return f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [build_match_query(text)]
+
+
+def filter_books(queryset, text):
+    """Restrict a Book queryset to rows matching ``text`` in the index."""
+    sql, params = matching_book_ids_sql(text)
+    return queryset.filter(pk__in=RawSQL(sql, params))
+
+
+def search_book_ids(text, limit=50, offset=0):
+    """Return ids of books matching ``text``, best match first."""
+    match = build_match_query(text)
+    if not match:
+        return []
+    weights = ', '.join(str(weight) for weight in RANK_WEIGHTS)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+            f'ORDER BY bm25({FTS_TABLE}, {weights}) LIMIT %s OFFSET %s',
+            [match, limit, offset],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def search_books(text, limit=50, offset=0):
+    """Return matching Book instances (with authors loaded), best match first."""
+    ids = search_book_ids(text, limit=limit, offset=offset)
+    books = Book.objects.select_related('author').in_bulk(ids)
+    return [books[book_id] for book_id in ids if book_id in books]
+
+
+def rebuild_index(batch_size=50000):
+    """Repopulate the whole index from the catalog tables. Returns the row count."""
+    total = 0
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        cursor.execute('SELECT MIN(id), MAX(id) FROM library_book')
+        low, high = cursor.fetchone()
+        if low is None:
+            return 0
+        for start in range(low, high + 1, batch_size):
+            with transaction.atomic():
+                cursor.execute(POPULATE_SQL, [start, start + batch_size - 1])
+                total += cursor.rowcount
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')")
+    return total
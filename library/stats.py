@@ -0,0 +1,192 @@
+"""
+Circulation statistics computed in SQL.
+
+Every report is a single aggregate query over the loans of a period,
+live and archived alike (``UNION ALL`` of ``library_loan`` and
+``library_archivedloan``); rankings use window functions, so nothing is
+iterated in Python beyond the result rows. Date arithmetic uses SQLite's
+``julianday``/``strftime`` and months are calendar months in UTC, which
+is how the datetimes are stored.
+
+Each report returns ``(header, rows)``; ``collect()`` runs them all.
+"""
+
+from datetime import datetime, timezone as dt_timezone
+
+from django.db import connection
+from django.utils import timezone
+
+
+PERIOD_FORMATS = {'month': '%Y-%m', 'year': '%Y'}
+
+# Loans loaned in [since, until) from both stores
+LOANS_CTE = """
+    WITH loans AS (
+        SELECT book_id, member_id, loaned_at, due_at, returned_at FROM library_loan
+        WHERE loaned_at >= %(since)s AND loaned_at < %(until)s
+        UNION ALL
+        SELECT book_id, member_id, loaned_at, due_at, returned_at FROM library_archivedloan
+        WHERE loaned_at >= %(since)s AND loaned_at < %(until)s
+    )
+"""
+
+# Loans overlapping [since, until), for utilisation
+OVERLAP_CTE = """
+    WITH loans AS (
+        SELECT book_id, loaned_at, returned_at FROM library_loan
+        WHERE loaned_at < %(until)s AND (returned_at IS NULL OR returned_at > %(since)s)
+        UNION ALL
+        SELECT book_id, loaned_at, returned_at FROM library_archivedloan
+        WHERE loaned_at < %(until)s AND returned_at > %(since)s
+    )
+"""
+
+REPORTS = {
+    'loans_per_author': (
+        ['rank', 'author_id', 'author', 'loans', 'borrowers', 'books'],
+        LOANS_CTE + """
+        SELECT RANK() OVER (ORDER BY COUNT(*) DESC), a.id, a.name,
+               COUNT(*), COUNT(DISTINCT l.member_id), COUNT(DISTINCT l.book_id)
+        FROM loans l
+        JOIN library_book b ON b.id = l.book_id
+        JOIN library_author a ON a.id = b.author_id
+        GROUP BY a.id, a.name
+        ORDER BY COUNT(*) DESC, a.id
+        LIMIT %(limit)s
+        """,
+    ),
+    'loans_per_tag': (
+        ['rank', 'tag_id', 'tag', 'loans', 'borrowers', 'share'],
+        LOANS_CTE + """
+        SELECT RANK() OVER (ORDER BY COUNT(*) DESC), t.id, t.name,
+               COUNT(*), COUNT(DISTINCT l.member_id),
+               ROUND(COUNT(*) * 1.0 / (SELECT COUNT(*) FROM loans), 4)
+        FROM loans l
+        JOIN library_booktag bt ON bt.book_id = l.book_id
+        JOIN library_tag t ON t.id = bt.tag_id
+        GROUP BY t.id, t.name
+        ORDER BY COUNT(*) DESC, t.id
+        LIMIT %(limit)s
+        """,
+    ),
+    'loan_duration': (
+        ['loans', 'returned', 'avg_days', 'min_days', 'max_days', 'avg_days_late', 'late_rate'],
+        LOANS_CTE + """,
+        returned AS (
+            SELECT julianday(returned_at) - julianday(loaned_at) AS days,
+                   MAX(julianday(returned_at) - julianday(due_at), 0) AS days_late,
+                   returned_at > due_at AS late
+            FROM loans WHERE returned_at IS NOT NULL
+        )
+        SELECT (SELECT COUNT(*) FROM loans), COUNT(*),
+               ROUND(AVG(days), 2), ROUND(MIN(days), 2), ROUND(MAX(days), 2),
+               ROUND(AVG(CASE WHEN late THEN days_late END), 2),
+               ROUND(AVG(late), 4)
+        FROM returned
+        """,
+    ),
+    'late_returns_by_month': (
+        ['month', 'returned', 'late', 'late_rate', 'late_rate_12m'],
+        LOANS_CTE + """,
+        monthly AS (
+            SELECT strftime('%%Y-%%m', returned_at) AS month, COUNT(*) AS returned,
+                   SUM(returned_at > due_at) AS late
+            FROM loans WHERE returned_at IS NOT NULL
+            GROUP BY month
+        )
+        SELECT month, returned, late, ROUND(late * 1.0 / returned, 4),
+               ROUND(SUM(late) OVER last_year * 1.0 / SUM(returned) OVER last_year, 4)
+        FROM monthly
+        WINDOW last_year AS (ORDER BY month ROWS BETWEEN 11 PRECEDING AND CURRENT ROW)
+        ORDER BY month
+        """,
+    ),
+    'utilisation': (
+        ['rank', 'book_id', 'title', 'loans', 'days_loaned', 'days_in_catalog', 'utilisation'],
+        OVERLAP_CTE + """,
+        per_book AS (
+            SELECT book_id, COUNT(*) AS loans, MIN(loaned_at) AS first_loan,
+                   SUM(julianday(MIN(COALESCE(returned_at, %(until)s), %(until)s))
+                       - julianday(MAX(loaned_at, %(since)s))) AS days_loaned
+            FROM loans GROUP BY book_id
+        ),
+        lifetimes AS (
+            SELECT b.id, b.title, COALESCE(p.loans, 0) AS loans, COALESCE(p.days_loaned, 0) AS days_loaned,
+                   julianday(%(until)s)
+                   - julianday(MAX(MIN(b.created_at, COALESCE(p.first_loan, b.created_at)), %(since)s))
+                   AS days_in_catalog
+            FROM library_book b LEFT JOIN per_book p ON p.book_id = b.id
+            WHERE b.created_at < %(until)s OR p.book_id IS NOT NULL
+        )
+        SELECT RANK() OVER (ORDER BY days_loaned / days_in_catalog DESC), id, title, loans,
+               ROUND(days_loaned, 2), ROUND(days_in_catalog, 2), ROUND(days_loaned / days_in_catalog, 4)
+        FROM lifetimes WHERE days_in_catalog > 0
+        ORDER BY days_loaned / days_in_catalog DESC, id
+        LIMIT %(limit)s
+        """,
+    ),
+    'catalog_utilisation': (
+        ['books', 'days_loaned', 'days_in_catalog', 'utilisation'],
+        OVERLAP_CTE + """,
+        per_book AS (
+            SELECT book_id, MIN(loaned_at) AS first_loan,
+                   SUM(julianday(MIN(COALESCE(returned_at, %(until)s), %(until)s))
+                       - julianday(MAX(loaned_at, %(since)s))) AS days_loaned
+            FROM loans GROUP BY book_id
+        ),
+        lifetimes AS (
+            SELECT COALESCE(p.days_loaned, 0) AS days_loaned,
+                   julianday(%(until)s)
+                   - julianday(MAX(MIN(b.created_at, COALESCE(p.first_loan, b.created_at)), %(since)s))
+                   AS days_in_catalog
+            FROM library_book b LEFT JOIN per_book p ON p.book_id = b.id
+        )
+        SELECT COUNT(*), ROUND(SUM(days_loaned), 2), ROUND(SUM(days_in_catalog), 2),
+               ROUND(SUM(days_loaned) / SUM(days_in_catalog), 4)
+        FROM lifetimes WHERE days_in_catalog > 0
+        """,
+    ),
+    'top_books_per_period': (
+        ['period', 'rank', 'book_id', 'title', 'loans'],
+        LOANS_CTE + """,
+        counts AS (
+            SELECT strftime(%(period_format)s, loaned_at) AS period, book_id, COUNT(*) AS loans
+            FROM loans GROUP BY period, book_id
+        ),
+        ranked AS (
+            SELECT period, book_id, loans,
+                   ROW_NUMBER() OVER (PARTITION BY period ORDER BY loans DESC, book_id) AS position
+            FROM counts
+        )
+        SELECT r.period, r.position, r.book_id, b.title, r.loans
+        FROM ranked r JOIN library_book b ON b.id = r.book_id
+        WHERE r.position <= %(top)s
+        ORDER BY r.period, r.position
+        """,
+    ),
+}
+
+
+def params(since=None, until=None, limit=100, top=10, period='month'):
+    """Query parameters for ``report()``; datetimes are adapted for the backend."""
+    adapt = connection.ops.adapt_datetimefield_value
+    return {
+        'since': adapt(since or datetime(1, 1, 1, tzinfo=dt_timezone.utc)),
+        'until': adapt(until or timezone.now()),
+        'limit': limit,
+        'top': top,
+        'period_format': PERIOD_FORMATS[period],
+    }
+
+
+def report(name, **options):
+    """Run one report and return ``(header, rows)``."""
+    header, sql = REPORTS[name]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params(**options))
+        return header, cursor.fetchall()
+
+
+def collect(names=None, **options):
+    """Run several reports (all by default): ``{name: (header, rows)}``."""
+    return {name: report(name, **options) for name in (names or REPORTS)}
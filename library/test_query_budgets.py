@@ -0,0 +1,282 @@
+"""
+Query-budget regression tests for the library app.
+
+Each test states how many queries a model method or admin changelist may
+run. Changelists are rendered with more rows than fit on one page, so an
+N+1 query shows up as a failure with the offending SQL printed by
+``assertNumQueries``.
+"""
+
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from library import search
+from library.models import Author, Book, Member, MemberProfile, Loan, Tag, BookTag
+
+
+ROWS = 120
+
+# Where Django wraps work in savepoints differs between versions
+SAVEPOINT_STATEMENTS = ('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT')
+
+
+class QueryBudgetTestCase(TestCase):
+    """Shared catalog with more than one admin page of every model."""
+
+    @classmethod
+    def setUpTestData(cls):
+        authors = Author.objects.bulk_create(
+            Author(name=f"Author {i}", country="Chile" if i % 2 else None) for i in range(ROWS)
+        )
+        cls.books = Book.objects.bulk_create(
+            Book(title=f"Book {i}", isbn=f"isbn-{i}", author=authors[i % ROWS]) for i in range(ROWS * 2)
+        )
+        members = Member.objects.bulk_create(
+            Member(full_name=f"Member {i}", email=f"member{i}@example.com") for i in range(ROWS)
+        )
+        MemberProfile.objects.bulk_create(
+            MemberProfile(member=member, nickname=f"Nick {i}") for i, member in enumerate(members)
+        )
+        tags = Tag.objects.bulk_create(Tag(name=f"Tag {i}") for i in range(ROWS))
+        BookTag.objects.bulk_create(
+            BookTag(book=book, tag=tags[i % ROWS]) for i, book in enumerate(cls.books)
+        )
+        due_at = timezone.now() + timedelta(days=14)
+        Loan.objects.bulk_checkout(
+            [(book, members[i % ROWS]) for i, book in enumerate(cls.books[:ROWS])], due_at=due_at
+        )
+        Loan.objects.bulk_return(Loan.objects.all())
+        Loan.objects.bulk_checkout(
+            [(book, members[i % ROWS]) for i, book in enumerate(cls.books[ROWS:])], due_at=due_at
+        )
+        cls.member = members[0]
+        cls.superuser = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+
+    @contextmanager
+    def assertNumStatements(self, num):
+        """Like ``assertNumQueries``, but without counting savepoint statements."""
+        with CaptureQueriesContext(connection) as context:
+            yield
+        statements = [
+            query['sql'] for query in context.captured_queries
+            if not query['sql'].startswith(SAVEPOINT_STATEMENTS)
+        ]
+        self.assertEqual(
+            len(statements), num,
+            "%d statements executed, %d expected\nCaptured statements were:\n%s" % (
+                len(statements), num, '\n'.join(f'{i}. {sql}' for i, sql in enumerate(statements, 1))
+            ),
+        )
+
+
+class ModelMethodQueryBudgetTest(QueryBudgetTestCase):
+    """Query budgets for model methods."""
+
+    def test_loan_save_budget(self):
+        """Test Loan.save(): FK and constraint checks, book UPDATE and loan INSERT."""
+        book = Book.objects.filter(status='AVAILABLE').first()
+        loan = Loan(book=book, member=self.member, due_at=timezone.now() + timedelta(days=14))
+        # book/member existence, active-loan constraint, book UPDATE, INSERT
+        with self.assertNumStatements(5):
+            loan.save()
+
+    def test_loan_return_book_budget(self):
+        """Test Loan.return_book(): book UPDATE, full_clean() and loan UPDATE."""
+        loan = Loan.objects.select_related('book').filter(returned_at__isnull=True).first()
+        # book UPDATE, book/member existence, loan UPDATE
+        with self.assertNumStatements(4):
+            loan.return_book()
+
+    def test_book_mark_lost_budget(self):
+        """Test Book.mark_lost(): a single UPDATE."""
+        book = Book.objects.first()
+        with self.assertNumQueries(1):
+            book.mark_lost()
+
+    def test_str_budgets_with_related_objects_loaded(self):
+        """Test that __str__ runs no queries once related objects are loaded."""
+        author = Author.objects.first()
+        book = Book.objects.select_related('author').first()
+        member = Member.objects.first()
+        profile = MemberProfile.objects.select_related('member').first()
+        loan = Loan.objects.select_related('book', 'member').first()
+        tag = Tag.objects.first()
+        book_tag = BookTag.objects.select_related('book', 'tag').first()
+        with self.assertNumQueries(0):
+            for obj in (author, book, member, profile, loan, tag, book_tag):
+                str(obj)
+
+    def test_str_budgets_without_related_objects_loaded(self):
+        """Test the lazy loads each __str__ is allowed to trigger on a bare instance."""
+        budgets = [
+            (Book.objects.first(), 1),
+            (MemberProfile.objects.first(), 1),
+            (Loan.objects.first(), 2),
+            (BookTag.objects.first(), 2),
+        ]
+        for obj, budget in budgets:
+            with self.subTest(model=type(obj).__name__), self.assertNumQueries(budget):
+                str(obj)
+
+
+class AdminChangelistQueryBudgetTest(QueryBudgetTestCase):
+    """Query budgets for every ModelAdmin changelist page."""
+
+    # Session, user, two COUNTs (one capped COUNT for the approximate-count
+    # admins), the page and any filter sidebar queries
+    BUDGETS = {
+        Author: 6,
+        Book: 4,
+        Member: 5,
+        MemberProfile: 5,
+        Loan: 4,
+        Tag: 5,
+        BookTag: 5,
+    }
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.superuser)
+
+    def assertChangelistBudget(self, model, params=None):
+        url = reverse(f'admin:library_{model._meta.model_name}_changelist')
+        with self.assertNumQueries(self.BUDGETS[model]):
+            response = self.client.get(url, params or {})
+        self.assertEqual(response.status_code, 200)
+
+    def test_author_changelist_budget(self):
+        """Test that the Author changelist stays within its query budget."""
+        self.assertChangelistBudget(Author)
+
+    def test_book_changelist_budget(self):
+        """Test that the Book changelist stays within its query budget."""
+        self.assertChangelistBudget(Book)
+
+    def test_member_changelist_budget(self):
+        """Test that the Member changelist stays within its query budget."""
+        self.assertChangelistBudget(Member)
+
+    def test_memberprofile_changelist_budget(self):
+        """Test that the MemberProfile changelist stays within its query budget."""
+        self.assertChangelistBudget(MemberProfile)
+
+    def test_loan_changelist_budget(self):
+        """Test that the Loan changelist stays within its query budget."""
+        self.assertChangelistBudget(Loan)
+
+    def test_tag_changelist_budget(self):
+        """Test that the Tag changelist stays within its query budget."""
+        self.assertChangelistBudget(Tag)
+
+    def test_booktag_changelist_budget(self):
+        """Test that the BookTag changelist stays within its query budget."""
+        self.assertChangelistBudget(BookTag)
+
+    def test_computed_columns_sort_within_budget(self):
+        """Test that sorting and filtering by annotated columns keeps the same budget."""
+        self.assertChangelistBudget(Member, {'o': '-4'})
+        self.assertChangelistBudget(Member, {'loan_count': '1-5'})
+        self.assertChangelistBudget(Tag, {'o': '-2'})
+        self.assertChangelistBudget(Tag, {'book_count': '0'})
+        self.assertChangelistBudget(Loan, {'o': '-6'})
+        self.assertChangelistBudget(Book, {'author': 'Author 1'})
+        self.assertChangelistBudget(Book, {'author': str(self.books[0].author_id)})
+
+    def test_author_filter_does_not_list_authors(self):
+        """Test that the author filter is a text box, not one link per author."""
+        url = reverse('admin:library_book_changelist')
+        response = self.client.get(url, {'author': 'Author 11', 'status__exact': 'LOANED'})
+        self.assertContains(response, 'name="author" value="Author 11"')
+        self.assertContains(response, '<input type="hidden" name="status__exact" value="LOANED">', html=True)
+        self.assertNotContains(response, 'author__id__exact')
+        expected = Book.objects.filter(author__name__icontains='Author 11', status='LOANED').count()
+        self.assertEqual(response.context['cl'].result_count, expected)
+
+
+class AdminFormQueryBudgetTest(QueryBudgetTestCase):
+    """Relation widgets must not render one <option> per related row."""
+
+    # Session, user and the content type; the widgets themselves query nothing
+    BUDGETS = {
+        Book: 3,
+        MemberProfile: 3,
+        Loan: 3,
+        BookTag: 3,
+    }
+
+    def setUp(self):
+        self.client.force_login(self.superuser)
+
+    def test_add_forms_use_autocomplete(self):
+        """Test that add forms render relation widgets without listing related rows."""
+        for model, budget in self.BUDGETS.items():
+            url = reverse(f'admin:library_{model._meta.model_name}_add')
+            with self.subTest(model=model.__name__), self.assertNumStatements(budget):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertContains(response, 'admin-autocomplete')
+            self.assertNotContains(response, f'>{self.books[0]}<')
+
+    def test_autocomplete_budget(self):
+        """Test that one page of autocomplete results is a fixed number of queries."""
+        url = reverse('admin:autocomplete')
+        # Session, user, the "more pages" COUNT and the page of results
+        # (the full-text index check is made once per database)
+        search.is_available()
+        budgets = (('loan', 'book', 4), ('loan', 'member', 4), ('booktag', 'tag', 4))
+        for model_name, field_name, budget in budgets:
+            params = {'app_label': 'library', 'model_name': model_name, 'field_name': field_name, 'term': '1'}
+            with self.subTest(field=f'{model_name}.{field_name}'), self.assertNumQueries(budget):
+                response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.json()['results'])
+
+
+@override_settings(LIBRARY_ADMIN_COUNT_THRESHOLD=50)
+class AdminApproximateCountTest(QueryBudgetTestCase):
+    """Changelists above the count threshold use capped counts and "next page" navigation."""
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.superuser)
+
+    def get_changelist(self, params=None):
+        response = self.client.get(reverse('admin:library_book_changelist'), params or {})
+        self.assertEqual(response.status_code, 200)
+        return response, response.context['cl']
+
+    def test_unfiltered_count_ignores_id_gaps(self):
+        """Test that an id far past the row count does not create empty pages."""
+        Book.objects.create(id=100000, title="Far away", isbn="isbn-far", author=self.books[0].author)
+        response, cl = self.get_changelist()
+        self.assertFalse(cl.paginator.exact)
+        self.assertEqual((cl.result_count, cl.paginator.num_pages), (101, 2))
+        self.assertIsNone(cl.full_result_count)
+        self.assertContains(response, 'More than 50 books')
+        _, cl = self.get_changelist({'p': '3'})
+        self.assertEqual((cl.paginator.num_pages, len(cl.result_list)), (3, 41))
+
+    def test_filtered_count_stops_after_requested_page(self):
+        """Test that a filtered count goes one row past the requested page."""
+        # 120 LOANED books, 100 per page
+        _, cl = self.get_changelist({'status__exact': 'LOANED'})
+        self.assertEqual((cl.result_count, cl.paginator.num_pages), (101, 2))
+        _, cl = self.get_changelist({'status__exact': 'LOANED', 'p': '2'})
+        self.assertEqual((cl.result_count, len(cl.result_list)), (200, 20))
+
+    def test_small_results_are_exact_and_cached(self):
+        """Test that counts under the threshold are exact and served from the cache."""
+        _, cl = self.get_changelist({'status__exact': 'LOST'})
+        self.assertTrue(cl.paginator.exact)
+        self.assertEqual(cl.result_count, 0)
+        # Session, user and the page; the count comes from the cache
+        with self.assertNumQueries(3):
+            self.get_changelist({'status__exact': 'LOST'})
@@ -4,12 +4,28 @@ Tests for the library app.
 Example test structure for the models.
 """
 
-from django.test import TestCase
+import json
+import os
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection
+from django.db.models import F
+from django.test import TestCase, TransactionTestCase, override_settings
 from django.core.exceptions import ValidationError
 from django.utils import timezone
-from datetime import timedelta
+from datetime import datetime, timedelta, timezone as dt_timezone
 
-from library.models import Author, Book, Member, MemberProfile, Loan, Tag, BookTag
+from library import archive, availability, checkout, dashboard, db, exports, facets, jobs, recommendations, risk, search, stats
+from library.models import (
+    ArchivedLoan, Author, Book, Job, Member, MemberProfile, Loan, Tag, BookTag, TagFacet, pk_ranges,
+)
+from library.pagination import encode_cursor
 
 
 class AuthorModelTest(TestCase):
@@ -291,3 +307,1253 @@ class BookTagModelTest(TestCase):
         
         with self.assertRaises(Exception):
             BookTag.objects.create(book=self.book, tag=self.tag)
+
+
+class LoanBulkCheckoutTest(TestCase):
+    """Test cases for Loan.objects.bulk_checkout()."""
+
+    def setUp(self):
+        self.author = Author.objects.create(name="Test Author")
+        self.books = [
+            Book.objects.create(title=f"Book {i}", isbn=f"isbn-{i}", author=self.author)
+            for i in range(3)
+        ]
+        self.member = Member.objects.create(full_name="Test Member", email="test@example.com")
+        self.due = timezone.now() + timedelta(days=14)
+
+    def test_bulk_checkout_creates_loans_and_flips_status(self):
+        """Test that accepted books get a loan and become LOANED."""
+        result = Loan.objects.bulk_checkout(
+            [(book, self.member) for book in self.books], due_at=self.due
+        )
+
+        self.assertEqual(len(result.loans), 3)
+        self.assertEqual(result.rejected, [])
+        self.assertEqual(Book.objects.filter(status='LOANED').count(), 3)
+        self.assertEqual(Loan.objects.filter(returned_at__isnull=True).count(), 3)
+
+    def test_bulk_checkout_reports_rejections(self):
+        """Test that unavailable, duplicate and missing books are rejected with a reason."""
+        self.books[1].mark_lost()
+        result = Loan.objects.bulk_checkout(
+            [
+                (self.books[0], self.member),
+                (self.books[0], self.member),
+                (self.books[1], self.member),
+                (999999, self.member),
+                (self.books[2], 999999),
+            ],
+            due_at=self.due,
+        )
+
+        self.assertEqual([outcome.loan is not None for outcome in result], [True, False, False, False, False])
+        reasons = [outcome.reason for outcome in result.rejected]
+        self.assertIn("Book appears more than once in this batch", reasons)
+        self.assertIn("Book is not available (status: LOST)", reasons)
+        self.assertIn("Book does not exist", reasons)
+        self.assertIn("Member does not exist", reasons)
+        self.books[2].refresh_from_db()
+        self.assertEqual(self.books[2].status, "AVAILABLE")
+
+    def test_bulk_checkout_query_count(self):
+        """Test that the number of queries does not grow with the batch size."""
+        # savepoint, book check, member check, INSERT, UPDATE, release
+        with self.assertNumQueries(6):
+            Loan.objects.bulk_checkout([(book, self.member) for book in self.books], due_at=self.due)
+
+    def test_bulk_checkout_rejects_past_due_date(self):
+        """Test that a due date in the past is rejected for the whole batch."""
+        with self.assertRaises(ValidationError):
+            Loan.objects.bulk_checkout(
+                [(self.books[0], self.member)], due_at=timezone.now() - timedelta(days=1)
+            )
+
+
+class LoanBulkReturnTest(TestCase):
+    """Test cases for Loan.objects.bulk_return()."""
+
+    def setUp(self):
+        self.author = Author.objects.create(name="Test Author")
+        self.member = Member.objects.create(full_name="Test Member", email="test@example.com")
+        books = [
+            Book.objects.create(title=f"Book {i}", isbn=f"isbn-{i}", author=self.author)
+            for i in range(3)
+        ]
+        Loan.objects.bulk_checkout(
+            [(book, self.member) for book in books], due_at=timezone.now() + timedelta(days=14)
+        )
+
+    def test_bulk_return_updates_loans_and_books(self):
+        """Test that active loans are returned and their books become available."""
+        loans_returned, books_updated = Loan.objects.bulk_return(Loan.objects.all())
+
+        self.assertEqual((loans_returned, books_updated), (3, 3))
+        self.assertFalse(Loan.objects.filter(returned_at__isnull=True).exists())
+        self.assertEqual(Book.objects.filter(status='AVAILABLE').count(), 3)
+
+    def test_bulk_return_skips_returned_loans(self):
+        """Test that already returned loans keep their original return date."""
+        returned_at = timezone.now() - timedelta(days=1)
+        Loan.objects.bulk_return(Loan.objects.all(), returned_at=returned_at)
+
+        with self.assertNumQueries(3):
+            self.assertEqual(Loan.objects.bulk_return(Loan.objects.all()), (0, 0))
+        self.assertEqual(Loan.objects.filter(returned_at=returned_at).count(), 3)
+
+
+class SeedDemoScaleTest(TestCase):
+    """Test cases for the synthetic seed_demo --scale mode."""
+
+    def test_scaled_seed_is_consistent(self):
+        """Test that generated loans agree with Book.status."""
+        with self.assertRaises(CommandError):
+            call_command('seed_demo', scale=10, loans_per_book=-1, stdout=StringIO())
+        call_command('seed_demo', scale=200, seed=7, batch_size=50, loans_per_book=20, stdout=StringIO())
+
+        self.assertEqual(Book.objects.count(), 200)
+        self.assertTrue(Member.objects.exists())
+        self.assertEqual(MemberProfile.objects.count(), Member.objects.count())
+        self.assertTrue(BookTag.objects.exists())
+        active = Loan.objects.filter(returned_at__isnull=True)
+        self.assertEqual(
+            set(active.values_list('book_id', flat=True)),
+            set(Book.objects.filter(status='LOANED').values_list('id', flat=True)),
+        )
+        self.assertTrue(Loan.objects.filter(returned_at__isnull=False).exists())
+        self.assertTrue(active.filter(due_at__lt=timezone.now()).exists())
+        self.assertTrue(Loan.objects.filter(loaned_at__lt=timezone.now() - timedelta(days=365)).exists())
+
+        previous = {}
+        for book_id, loaned_at, returned_at in Loan.objects.order_by('book_id', 'loaned_at').values_list(
+            'book_id', 'loaned_at', 'returned_at'
+        ):
+            if book_id in previous:
+                self.assertIsNotNone(previous[book_id])
+                self.assertGreaterEqual(loaned_at, previous[book_id])
+            previous[book_id] = returned_at
+
+    def test_scaled_seed_is_deterministic(self):
+        """Test that the same seed produces the same catalog."""
+        call_command('seed_demo', scale=50, seed=3, stdout=StringIO())
+        first = list(Book.objects.order_by('isbn').values_list('title', 'status'))
+        Loan.objects.all().delete()
+        BookTag.objects.all().delete()
+        Book.objects.all().delete()
+        Author.objects.all().delete()
+        Tag.objects.all().delete()
+        Member.objects.all().delete()
+
+        call_command('seed_demo', scale=50, seed=3, stdout=StringIO())
+        self.assertEqual(list(Book.objects.order_by('isbn').values_list('title', 'status')), first)
+
+
+class BenchLibraryCommandTest(TestCase):
+    """Smoke test for the bench_library management command."""
+
+    def test_bench_library_reports_every_benchmark(self):
+        """Test that each benchmark reports latency percentiles and query counts."""
+        call_command('seed_demo', scale=30, seed=1, stdout=StringIO())
+        out = StringIO()
+        call_command('bench_library', iterations=2, warmup=0, bulk_size=3, stdout=out)
+
+        output = out.getvalue()
+        for name in ('checkout.single', 'checkout.bulk', 'loan.return_book', 'loan.is_overdue_scan',
+                     'tag.lookup', 'admin.changelist.book', 'admin.changelist.loan'):
+            self.assertIn(name, output)
+        self.assertIn('p99', output)
+
+
+class CountAnnotationTest(TestCase):
+    """Test cases for Member.with_loan_counts() and Tag.with_book_counts()."""
+
+    def setUp(self):
+        author = Author.objects.create(name="Test Author")
+        self.books = [
+            Book.objects.create(title=f"Book {i}", isbn=f"isbn-{i}", author=author) for i in range(3)
+        ]
+        self.member = Member.objects.create(full_name="Test Member", email="test@example.com")
+        Member.objects.create(full_name="Idle Member", email="idle@example.com")
+        due = timezone.now() + timedelta(days=14)
+        Loan.objects.bulk_checkout([(self.books[0], self.member), (self.books[1], self.member)], due_at=due)
+        Loan.objects.bulk_return(Loan.objects.filter(book=self.books[0]))
+        self.tag = Tag.objects.create(name="Fiction")
+        Tag.objects.create(name="Unused")
+        BookTag.objects.create(book=self.books[0], tag=self.tag)
+        BookTag.objects.create(book=self.books[2], tag=self.tag)
+
+    def test_member_loan_counts(self):
+        """Test that total and active loan counts are annotated per member."""
+        counts = {
+            member.email: (member.loan_count, member.active_loan_count)
+            for member in Member.objects.with_loan_counts()
+        }
+        self.assertEqual(counts, {'test@example.com': (2, 1), 'idle@example.com': (0, 0)})
+
+    def test_tag_book_counts_sort_and_filter(self):
+        """Test that book counts can be sorted and filtered on."""
+        tags = Tag.objects.with_book_counts().order_by('-book_count')
+        self.assertEqual([(tag.name, tag.book_count) for tag in tags], [('Fiction', 2), ('Unused', 0)])
+        self.assertEqual(list(tags.filter(book_count=0).values_list('name', flat=True)), ['Unused'])
+
+
+class CatalogSearchTest(TestCase):
+    """Test cases for the FTS5 catalog search index."""
+
+    def setUp(self):
+        self.tolkien = Author.objects.create(name="J.R.R. Tolkien")
+        self.rowling = Author.objects.create(name="J.K. Rowling")
+        self.hobbit = Book.objects.create(title="The Hobbit", isbn="978-0261102217", author=self.tolkien)
+        self.potter = Book.objects.create(
+            title="Harry Potter and the Philosopher's Stone", isbn="978-0439136969", author=self.rowling
+        )
+        self.tag = Tag.objects.create(name="Fantasy")
+
+    def test_search_by_title_author_and_prefix(self):
+        """Test that titles, author names and word prefixes match."""
+        self.assertEqual(search.search_books("hobbit"), [self.hobbit])
+        self.assertEqual(search.search_books("rowling"), [self.potter])
+        self.assertEqual(search.search_books("philos"), [self.potter])
+        self.assertEqual(search.search_books("'; DROP TABLE"), [])
+
+    def test_index_follows_writes(self):
+        """Test that the index is updated on book, author and tag writes."""
+        BookTag.objects.create(book=self.hobbit, tag=self.tag)
+        self.assertEqual(search.search_books("fantasy"), [self.hobbit])
+
+        self.tag.name = "Mythology"
+        self.tag.save()
+        self.assertEqual(search.search_books("mythology"), [self.hobbit])
+
+        self.tolkien.name = "John Ronald Reuel Tolkien"
+        self.tolkien.save()
+        self.assertEqual(search.search_books("reuel"), [self.hobbit])
+
+        self.hobbit.title = "There and Back Again"
+        self.hobbit.save()
+        self.assertEqual(search.search_books("hobbit"), [])
+        self.assertEqual(search.search_books("again"), [self.hobbit])
+
+        adventure = Tag.objects.create(name="Adventure")
+        BookTag.objects.update(tag=adventure)
+        self.assertEqual(search.search_books("mythology"), [])
+        self.assertEqual(search.search_books("adventure"), [self.hobbit])
+        BookTag.objects.update(book=self.potter)
+        self.assertEqual(search.search_books("adventure"), [self.potter])
+
+        BookTag.objects.all().delete()
+        self.assertEqual(search.search_books("adventure"), [])
+
+    def test_rebuild_index(self):
+        """Test that the rebuild command repopulates the index."""
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(search.search_books("tolkien"), [self.hobbit])
+
+    def test_admin_search_uses_index_and_isbn(self):
+        """Test that the Book changelist search finds title words and exact ISBNs."""
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        response = self.client.get('/admin/library/book/', {'q': 'hobb'})
+        self.assertEqual(list(response.context['cl'].result_list), [self.hobbit])
+        response = self.client.get('/admin/library/book/', {'q': '978-0439136969'})
+        self.assertEqual(list(response.context['cl'].result_list), [self.potter])
+
+
+class OverdueLoanTest(TestCase):
+    """Test cases for Loan.objects.overdue() and the sweep_overdue command."""
+
+    def setUp(self):
+        author = Author.objects.create(name="Test Author")
+        self.member = Member.objects.create(full_name="Test Member", email="test@example.com")
+        self.profile = MemberProfile.objects.create(member=self.member)
+        self.books = [
+            Book.objects.create(title=f"Book {i}", isbn=f"isbn-{i}", author=author) for i in range(3)
+        ]
+        Loan.objects.bulk_checkout(
+            [(book, self.member) for book in self.books], due_at=timezone.now() + timedelta(days=14)
+        )
+        # Push two loans past their due date, one of them far past it
+        Loan.objects.filter(book=self.books[0]).update(due_at=timezone.now() - timedelta(days=2))
+        Loan.objects.filter(book=self.books[1]).update(due_at=timezone.now() - timedelta(days=120))
+
+    def test_overdue_queryset(self):
+        """Test that overdue() matches the is_overdue property."""
+        overdue = set(Loan.objects.overdue())
+        self.assertEqual(overdue, {loan for loan in Loan.objects.all() if loan.is_overdue})
+        self.assertEqual(len(overdue), 2)
+
+        Loan.objects.bulk_return(Loan.objects.filter(book=self.books[0]))
+        self.assertEqual(Loan.objects.overdue().count(), 1)
+
+    def test_sweep_overdue_flags_members_and_books(self):
+        """Test that the sweep reports overdue loans, rescores members and marks books lost."""
+        call_command('sweep_overdue', flag_members=True, stdout=StringIO())
+        self.profile.refresh_from_db()
+        # Two overdue loans score MED, as in recompute_risk
+        self.assertEqual(self.profile.risk_level, 'MED')
+
+        out = StringIO()
+        call_command('sweep_overdue', flag_members=True, mark_lost_after=90, stdout=out)
+
+        self.assertIn('Overdue loans: 2', out.getvalue())
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.risk_level, 'HIGH')
+        self.assertEqual(
+            list(Book.objects.filter(status='LOST').values_list('pk', flat=True)), [self.books[1].pk]
+        )
+
+
+class RiskRecomputeTest(TestCase):
+    """Test cases for the member risk recomputation service."""
+
+    def setUp(self):
+        author = Author.objects.create(name="Test Author")
+        self.books = [
+            Book.objects.create(title=f"Book {i}", isbn=f"isbn-{i}", author=author) for i in range(4)
+        ]
+        self.careful = Member.objects.create(full_name="Careful Member", email="careful@example.com")
+        self.late = Member.objects.create(full_name="Late Member", email="late@example.com")
+        self.loser = Member.objects.create(full_name="Losing Member", email="loser@example.com")
+        MemberProfile.objects.create(member=self.careful, risk_level='HIGH')
+        MemberProfile.objects.create(member=self.late)
+        due = timezone.now() + timedelta(days=14)
+        Loan.objects.bulk_checkout(
+            [(self.books[0], self.careful), (self.books[1], self.late), (self.books[2], self.loser)], due_at=due
+        )
+        Loan.objects.filter(member=self.late).update(due_at=timezone.now() - timedelta(days=3))
+        self.books[2].mark_lost()
+
+    def test_score(self):
+        """Test the scoring thresholds."""
+        self.assertEqual(risk.score(overdue=0, returned=10, late=0, lost=0), 'LOW')
+        self.assertEqual(risk.score(overdue=1, returned=0, late=0, lost=0), 'MED')
+        self.assertEqual(risk.score(overdue=0, returned=10, late=3, lost=0), 'MED')
+        self.assertEqual(risk.score(overdue=0, returned=4, late=2, lost=0), 'HIGH')
+        self.assertEqual(risk.score(overdue=0, returned=1, late=1, lost=0), 'LOW')
+        self.assertEqual(risk.score(overdue=0, returned=0, late=0, lost=1), 'HIGH')
+
+    def test_full_recompute(self):
+        """Test that levels are written only where they change."""
+        run = risk.recompute()
+
+        self.assertEqual(run.members_scanned, 3)
+        self.assertEqual(run.profiles_changed, 3)
+        levels = dict(MemberProfile.objects.values_list('member__email', 'risk_level'))
+        self.assertEqual(levels, {
+            'careful@example.com': 'LOW',
+            'late@example.com': 'MED',
+            'loser@example.com': 'HIGH',
+        })
+        self.assertEqual(risk.recompute().profiles_changed, 0)
+
+    def test_incremental_recompute_only_scans_changed_members(self):
+        """Test that incremental runs rescan members with recent loan activity."""
+        risk.recompute()
+        Loan.objects.bulk_return(Loan.objects.filter(member=self.late))
+
+        run = risk.recompute(incremental=True)
+        self.assertTrue(run.incremental)
+        self.assertEqual(run.members_scanned, 1)
+        self.assertEqual(MemberProfile.objects.get(member=self.late).risk_level, 'LOW')
+
+    def test_incremental_recompute_sees_lost_books(self):
+        """Test that a book lost on an active loan after the last run rescans its borrower."""
+        risk.recompute()
+        Book.objects.filter(pk=self.books[0].pk).update(status='LOST')
+
+        run = risk.recompute(incremental=True)
+        self.assertEqual(run.members_scanned, 1)
+        self.assertEqual(MemberProfile.objects.get(member=self.careful).risk_level, 'HIGH')
+
+        Book.objects.filter(pk=self.books[0].pk).update(status='AVAILABLE')
+        risk.recompute(incremental=True)
+        self.assertEqual(MemberProfile.objects.get(member=self.careful).risk_level, 'LOW')
+
+    def test_recompute_risk_command(self):
+        """Test the recompute_risk management command."""
+        out = StringIO()
+        call_command('recompute_risk', stdout=out)
+        self.assertIn('scanned 3 members', out.getvalue())
+
+
+class CatalogApiTest(TestCase):
+    """Test cases for the read-only JSON catalog API."""
+
+    def setUp(self):
+        self.author = Author.objects.create(name="Test Author")
+        Book.objects.bulk_create(
+            Book(title=f"Book {i:02d}", isbn=f"isbn-{i}", author=self.author) for i in range(25)
+        )
+        # Duplicate titles exercise the id tie-breaker
+        Book.objects.create(title="Book 05", isbn="isbn-dup", author=self.author)
+        self.member = Member.objects.create(full_name="Test Member", email="test@example.com")
+        cache.clear()
+
+    def walk(self, url):
+        """Follow ``next`` links and return every row."""
+        rows = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            data = response.json()
+            rows.extend(data['results'])
+            url = data['next']
+        return rows
+
+    def test_book_pages_cover_catalog_in_order(self):
+        """Test that keyset pages return every book once, in title/id order."""
+        rows = self.walk('/api/books/?limit=7')
+        expected = list(Book.objects.order_by('title', 'id').values_list('id', flat=True))
+        self.assertEqual([row['id'] for row in rows], expected)
+        self.assertEqual(rows[0]['author__name'], "Test Author")
+
+    def test_deep_page_query_count(self):
+        """Test that a page deep into the list costs one query."""
+        response = self.client.get('/api/books/', {'limit': 5})
+        for _ in range(3):
+            response = self.client.get(response.json()['next'])
+        with self.assertNumQueries(1):
+            self.client.get(response.json()['next'])
+
+    def test_member_loans_and_availability(self):
+        """Test member loan history (staff only) and book availability lookups."""
+        books = list(Book.objects.all()[:3])
+        Loan.objects.bulk_checkout(
+            [(book, self.member) for book in books], due_at=timezone.now() + timedelta(days=14)
+        )
+        Loan.objects.bulk_return(Loan.objects.filter(book=books[0]))
+
+        loans_url = f'/api/members/{self.member.pk}/loans/'
+        self.assertEqual(self.client.get(loans_url).status_code, 302)
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        rows = self.walk(f'{loans_url}?limit=2')
+        self.assertEqual(len(rows), 3)
+        active = self.walk(f'/api/members/{self.member.pk}/loans/?active=1')
+        self.assertEqual({row['book_id'] for row in active}, {books[1].pk, books[2].pk})
+        self.assertEqual(self.client.get('/api/members/999999/loans/').status_code, 404)
+
+        response = self.client.get('/api/books/availability/', {'isbn': [books[0].isbn, books[1].isbn]})
+        availability = {row['isbn']: row['available'] for row in response.json()['results']}
+        self.assertEqual(availability, {books[0].isbn: True, books[1].isbn: False})
+
+    def test_invalid_cursor(self):
+        """Test that a malformed cursor is rejected."""
+        self.assertEqual(self.client.get('/api/books/', {'cursor': 'not-a-cursor'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/authors/').status_code, 200)
+        self.assertEqual(self.client.get('/api/tags/').status_code, 200)
+
+    def test_crafted_cursors_and_filters(self):
+        """Test that well-formed cursors with bad values and bad filters get a 400."""
+        self.assertEqual(self.client.get('/api/books/', {'cursor': encode_cursor([None, 1])}).status_code, 400)
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        loans_url = f'/api/members/{self.member.pk}/loans/'
+        self.assertEqual(self.client.get(loans_url, {'cursor': encode_cursor([[1], 1])}).status_code, 400)
+        self.assertEqual(self.client.get('/api/books/', {'author': 'abc'}).status_code, 400)
+        self.assertEqual(len(self.client.get('/api/books/', {'author': self.author.pk}).json()['results']), 26)
+
+
+# The test process is the only writer, so its locmem cache is safe here
+@override_settings(LIBRARY_AVAILABILITY_CACHE='default')
+class AvailabilityCacheTest(TestCase):
+    """Test cases for the write-through book availability cache."""
+
+    def setUp(self):
+        cache.clear()
+        availability.reset_stats()
+        author = Author.objects.create(name="Test Author")
+        self.books = [
+            Book.objects.create(title=f"Book {i}", isbn=f"isbn-{i}", author=author) for i in range(3)
+        ]
+        self.member = Member.objects.create(full_name="Test Member", email="test@example.com")
+        self.due = timezone.now() + timedelta(days=14)
+
+    def test_misses_are_loaded_once(self):
+        """Test that a miss reads the database once and later lookups hit the cache."""
+        with self.assertNumQueries(1):
+            statuses, isbn_to_id = availability.get_many(
+                ids=[self.books[0].pk], isbns=[self.books[1].isbn, 'missing']
+            )
+        self.assertEqual(statuses, {self.books[0].pk: 'AVAILABLE', self.books[1].pk: 'AVAILABLE'})
+        self.assertEqual(isbn_to_id, {self.books[1].isbn: self.books[1].pk})
+
+        with self.assertNumQueries(0):
+            self.assertTrue(availability.is_available(isbn=self.books[1].isbn))
+            self.assertTrue(availability.is_available(book_id=self.books[0].pk))
+        self.assertEqual(availability.stats()['hits'], 3)
+
+    def test_write_through_on_status_changes(self):
+        """Test that checkouts, returns, mark_lost and bulk operations update the cache."""
+        availability.get_many(ids=[book.pk for book in self.books])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            loan = Loan.objects.create(book=self.books[0], member=self.member, due_at=self.due)
+        self.assertEqual(availability.get_status(self.books[0].pk), 'LOANED')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            loan.return_book()
+        self.assertEqual(availability.get_status(self.books[0].pk), 'AVAILABLE')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.books[1].mark_lost()
+        self.assertEqual(availability.get_status(self.books[1].pk), 'LOST')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Loan.objects.bulk_checkout([(self.books[2], self.member)], due_at=self.due)
+        self.assertEqual(availability.get_status(self.books[2].pk), 'LOANED')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Loan.objects.bulk_return(Loan.objects.all())
+        self.assertFalse(availability.is_available(book_id=self.books[1].pk))
+        self.assertTrue(availability.is_available(book_id=self.books[2].pk))
+        self.assertEqual(availability.stats()['misses'], 3)
+
+    def test_admin_bulk_actions_write_through(self):
+        """Test that the BookAdmin bulk actions keep the cache in sync."""
+        availability.get_many(ids=[book.pk for book in self.books])
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/admin/library/book/', {
+                'action': 'mark_as_lost',
+                '_selected_action': [book.pk for book in self.books[:2]],
+            })
+        self.assertEqual(availability.get_status(self.books[0].pk), 'LOST')
+        self.assertEqual(availability.get_status(self.books[2].pk), 'AVAILABLE')
+
+    def test_isbn_change_drops_old_mapping(self):
+        """Test that the old ISBN no longer resolves after it changes."""
+        old_isbn = self.books[0].isbn
+        availability.get_many(isbns=[old_isbn])
+        book = Book.objects.get(pk=self.books[0].pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            book.isbn = 'isbn-new'
+            book.save()
+        self.assertIsNone(availability.get_status_by_isbn(old_isbn))
+        self.assertEqual(availability.get_status_by_isbn('isbn-new'), 'AVAILABLE')
+
+    def test_cache_must_be_shared_or_off(self):
+        """Test that a locmem cache fails the system check and None reads the database."""
+        self.assertEqual([error.id for error in availability.check_shared_cache()], ['library.E001'])
+
+        with override_settings(LIBRARY_AVAILABILITY_CACHE=None):
+            self.assertEqual(availability.check_shared_cache(), [])
+            with self.captureOnCommitCallbacks(execute=True):
+                self.books[0].mark_lost()
+            for _ in range(2):
+                with self.assertNumQueries(1):
+                    self.assertEqual(availability.get_status(self.books[0].pk), 'LOST')
+        self.assertIsNone(cache.get(availability.STATUS_KEY.format(self.books[0].pk)))
+
+
+class ExportTest(TestCase):
+    """Test cases for the streaming CSV/NDJSON exports."""
+
+    def setUp(self):
+        author = Author.objects.create(name="Test Author")
+        self.books = [
+            Book.objects.create(title=f"Book, {i}", isbn=f"isbn-{i}", author=author) for i in range(2)
+        ]
+        self.member = Member.objects.create(full_name="Test Member", email="test@example.com")
+        Loan.objects.bulk_checkout(
+            [(book, self.member) for book in self.books], due_at=timezone.now() + timedelta(days=14)
+        )
+        Loan.objects.filter(book=self.books[0]).update(loaned_at=timezone.now() - timedelta(days=40))
+
+    def test_loan_export_csv_with_date_filter(self):
+        """Test that loans are joined with book and member data and filtered by date."""
+        out = StringIO()
+        since = (timezone.now() - timedelta(days=1)).date().isoformat()
+        call_command('export_data', 'loans', loaned_after=since, stdout=out)
+        lines = out.getvalue().splitlines()
+
+        self.assertEqual(lines[0].split(',')[:4], ['id', 'book_id', 'book_title', 'book_isbn'])
+        self.assertEqual(len(lines), 2)
+        self.assertIn('"Book, 1",isbn-1', lines[1])
+        self.assertIn('test@example.com', lines[1])
+
+    def test_loan_export_includes_archive(self):
+        """Test that archived loans are exported with the hot ones, in id order."""
+        Loan.objects.bulk_return(Loan.objects.filter(book=self.books[0]),
+                                 returned_at=timezone.now() - timedelta(days=30))
+        call_command('archive_loans', older_than=7, stdout=StringIO())
+        self.assertEqual(ArchivedLoan.objects.count(), 1)
+
+        header, rows = exports.export_queryset('loans')
+        rows = [dict(zip(header, row)) for row in rows]
+        expected = [*ArchivedLoan.objects.values_list('pk', flat=True), *Loan.objects.values_list('pk', flat=True)]
+        self.assertEqual([row['id'] for row in rows], sorted(expected))
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[0]['book_isbn'], 'isbn-0')
+        header, rows = exports.export_queryset('loans', {'returned_after': '2000-01-01'})
+        self.assertEqual(len(list(rows)), 1)
+
+    def test_export_view_streams_ndjson_for_staff_only(self):
+        """Test the streaming export endpoint."""
+        self.assertEqual(self.client.get('/api/export/books/').status_code, 302)
+
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        response = self.client.get('/api/export/members/', {'format': 'ndjson'})
+        self.assertTrue(response.streaming)
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(rows, [{
+            'id': self.member.pk,
+            'full_name': 'Test Member',
+            'email': 'test@example.com',
+            'joined_at': rows[0]['joined_at'],
+        }])
+        self.assertEqual(self.client.get('/api/export/books/', {'format': 'xml'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/export/books/', {'loaned_after': '2024-01-01'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/export/loans/', {'loaned_after': '2024-02-30'}).status_code, 400)
+        with self.assertRaises(CommandError):
+            call_command('export_data', 'loans', loaned_after='2024-02-30', stdout=StringIO())
+
+
+class ImportCatalogTest(TestCase):
+    """Test cases for the import_catalog management command."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.existing = Book.objects.create(
+            title="Old Title", isbn="111", author=Author.objects.create(name="J.R.R. Tolkien")
+        )
+
+    def write_feed(self, name, content):
+        path = os.path.join(self.tmpdir.name, name)
+        with open(path, 'w') as fh:
+            fh.write(content)
+        return path
+
+    def test_csv_import_upserts_on_isbn(self):
+        """Test that existing ISBNs are updated and authors and tags are reused."""
+        path = self.write_feed('feed.csv', (
+            "isbn,title,author,country,tags\n"
+            "111,The Hobbit,J.R.R. Tolkien,,Fantasy|Classic\n"
+            "222,Dune,Frank Herbert,United States,Sci-Fi\n"
+            ",Missing ISBN,Nobody,,\n"
+            "333,The Silmarillion,J.R.R. Tolkien,,Fantasy\n"
+        ))
+        call_command('import_catalog', path, chunk_size=2, stdout=StringIO(), stderr=StringIO())
+
+        self.existing.refresh_from_db()
+        self.assertEqual(self.existing.title, "The Hobbit")
+        self.assertEqual(Book.objects.count(), 3)
+        self.assertEqual(Author.objects.filter(name="J.R.R. Tolkien").count(), 1)
+        self.assertEqual(Author.objects.get(name="Frank Herbert").country, "United States")
+        self.assertEqual(
+            set(BookTag.objects.values_list('book__isbn', 'tag__name')),
+            {('111', 'Fantasy'), ('111', 'Classic'), ('222', 'Sci-Fi'), ('333', 'Fantasy')},
+        )
+        self.assertFalse(os.path.exists(f'{path}.checkpoint'))
+
+    def test_ndjson_import_resumes_from_checkpoint(self):
+        """Test that --resume skips records committed by an earlier run."""
+        path = self.write_feed('feed.ndjson', '\n'.join(json.dumps(record) for record in [
+            {'isbn': '444', 'title': 'Skipped', 'author': 'Someone'},
+            {'isbn': '555', 'title': 'Emma', 'author': 'Jane Austen', 'tags': ['Classic']},
+        ]))
+        with open(f'{path}.checkpoint', 'w') as fh:
+            json.dump({'records': 1}, fh)
+
+        out = StringIO()
+        call_command('import_catalog', path, resume=True, stdout=out)
+        self.assertIn('Resuming after 1 records', out.getvalue())
+        self.assertFalse(Book.objects.filter(isbn='444').exists())
+        self.assertTrue(BookTag.objects.filter(book__isbn='555', tag__name='Classic').exists())
+
+
+class SQLiteTuningTest(TestCase):
+    """Test cases for the SQLite connection profile."""
+
+    def test_configure_sqlite_applies_configured_pragmas(self):
+        """Test that the connection_created receiver runs the configured pragmas."""
+        with connection.cursor() as cursor:
+            original = db.read_pragmas(cursor, ['cache_size', 'busy_timeout'])
+        self.addCleanup(lambda: db.apply_pragmas(connection.cursor(), original))
+
+        with override_settings(LIBRARY_SQLITE_PRAGMAS={'cache_size': -4000, 'busy_timeout': 2500}):
+            db.configure_sqlite(sender=None, connection=connection)
+            out = StringIO()
+            call_command('check_sqlite', stdout=out)
+
+        self.assertIn('cache_size     -4000  ✓', out.getvalue())
+        self.assertIn('busy_timeout   2500  ✓', out.getvalue())
+
+    def test_expected_value_normalizes_enums(self):
+        """Test that symbolic pragma values compare against SQLite's integers."""
+        self.assertEqual(db.expected_value('synchronous', 'NORMAL'), 1)
+        self.assertEqual(db.expected_value('journal_mode', 'WAL'), 'wal')
+        self.assertEqual(db.expected_value('cache_size', -64000), -64000)
+
+
+class AsyncApiTest(TestCase):
+    """Test cases for the async read endpoints."""
+
+    def setUp(self):
+        cache.clear()
+        author = Author.objects.create(name="Ursula K. Le Guin")
+        self.books = [
+            Book.objects.create(title=title, isbn=f"isbn-{i}", author=author)
+            for i, title in enumerate(["A Wizard of Earthsea", "The Dispossessed", "The Lathe of Heaven"])
+        ]
+        self.member = Member.objects.create(full_name="Test Member", email="test@example.com")
+        Loan.objects.bulk_checkout(
+            [(book, self.member) for book in self.books[:2]], due_at=timezone.now() + timedelta(days=14)
+        )
+
+    def assertSameAsSync(self, sync_url, async_url):
+        expected = self.client.get(sync_url)
+        response = async_to_sync(self.async_client.get)(async_url)
+        self.assertEqual(response.status_code, expected.status_code)
+        self.assertEqual(response.json(), expected.json())
+        return response
+
+    def test_async_views_match_sync_views(self):
+        """Test that each async endpoint returns the same payload as its sync version."""
+        admin = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.force_login(admin)
+        self.async_client.force_login(admin)
+        response = self.assertSameAsSync(
+            f'/api/books/availability/?isbn={self.books[0].isbn}&id={self.books[2].pk}',
+            f'/api/async/books/availability/?isbn={self.books[0].isbn}&id={self.books[2].pk}',
+        )
+        self.assertEqual([row['available'] for row in response.json()['results']], [False, True])
+
+        response = self.assertSameAsSync(
+            f'/api/members/{self.member.pk}/active-loans/',
+            f'/api/async/members/{self.member.pk}/active-loans/',
+        )
+        self.assertEqual(response.json()['count'], 2)
+
+        response = self.assertSameAsSync('/api/search/?q=earthsea', '/api/async/search/?q=earthsea')
+        self.assertEqual([row['id'] for row in response.json()['results']], [self.books[0].pk])
+
+    def test_async_views_errors(self):
+        """Test login, 404 and method checks on the async endpoints."""
+        for prefix in ('/api', '/api/async'):
+            response = async_to_sync(self.async_client.get)(f'{prefix}/members/{self.member.pk}/active-loans/')
+            self.assertEqual(response.status_code, 302)
+            self.assertTrue(response['Location'].startswith('/admin/login/'))
+
+        self.async_client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        response = async_to_sync(self.async_client.get)('/api/async/members/999999/active-loans/')
+        self.assertEqual(response.status_code, 404)
+        response = async_to_sync(self.async_client.post)('/api/async/search/')
+        self.assertEqual(response.status_code, 405)
+
+
+class CheckoutServiceTest(TestCase):
+    """Test cases for the race-free checkout service."""
+
+    def setUp(self):
+        cache.clear()
+        self.author = Author.objects.create(name="Test Author")
+        self.book = Book.objects.create(title="Hot Book", isbn="hot-1", author=self.author)
+        self.member = Member.objects.create(full_name="Test Member", email="test@example.com")
+        self.due = timezone.now() + timedelta(days=14)
+
+    def test_checkout_and_checkin(self):
+        """Test that the first checkout wins and a return frees the book."""
+        with self.captureOnCommitCallbacks(execute=True):
+            loan = checkout.checkout(self.book.pk, self.member.pk, self.due)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.status, 'LOANED')
+        self.assertEqual(availability.get_status(self.book.pk), 'LOANED')
+
+        with self.assertRaisesMessage(checkout.BookUnavailable, 'status: LOANED'):
+            checkout.checkout(self.book.pk, self.member.pk, self.due)
+        self.assertEqual(Loan.objects.active().count(), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(checkout.checkin(loan.pk))
+        self.assertFalse(checkout.checkin(loan.pk))
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.status, 'AVAILABLE')
+        self.assertEqual(availability.get_status(self.book.pk), 'AVAILABLE')
+
+    def test_checkout_rejections(self):
+        """Test missing books and past due dates."""
+        with self.assertRaisesMessage(checkout.BookUnavailable, 'does not exist'):
+            checkout.checkout(999999, self.member.pk, self.due)
+        with self.assertRaises(ValidationError):
+            checkout.checkout(self.book.pk, self.member.pk, timezone.now() - timedelta(days=1))
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.status, 'AVAILABLE')
+
+    def test_lock_errors_are_retried(self):
+        """Test that "database is locked" is retried and other errors are not."""
+        calls = []
+
+        def flaky():
+            calls.append(1)
+            if len(calls) < 3:
+                raise OperationalError('database is locked')
+            return 'ok'
+
+        self.assertEqual(checkout.with_lock_retry(flaky, backoff=0), 'ok')
+        self.assertEqual(len(calls), 3)
+        with self.assertRaises(OperationalError):
+            checkout.with_lock_retry(lambda: (_ for _ in ()).throw(OperationalError('no such table')), backoff=0)
+
+
+class CheckoutCommitTest(TransactionTestCase):
+    """Checkout tests that need real commits (deferred FK checks, threads)."""
+
+    def test_unknown_member_rolls_back(self):
+        """Test that a failed FK check at commit leaves the book AVAILABLE."""
+        author = Author.objects.create(name="Test Author")
+        book = Book.objects.create(title="Hot Book", isbn="hot-1", author=author)
+        with self.assertRaises(ValidationError):
+            checkout.checkout(book.pk, 999999, timezone.now() + timedelta(days=14))
+        book.refresh_from_db()
+        self.assertEqual(book.status, 'AVAILABLE')
+        self.assertFalse(Loan.objects.exists())
+
+    def test_no_invariant_violations(self):
+        """Test that stress_checkout finds no double loans and cleans up its data."""
+        out = StringIO()
+        call_command('stress_checkout', threads=2, books=2, members=5, attempts=100, stdout=out)
+        self.assertIn('No invariant violations', out.getvalue())
+        self.assertFalse(Book.objects.exists())
+        self.assertFalse(Loan.objects.exists())
+
+
+class ArchiveLoansTest(TestCase):
+    """Test cases for loan archival and history read-through."""
+
+    def setUp(self):
+        self.author = Author.objects.create(name="Test Author")
+        self.member = Member.objects.create(full_name="Test Member", email="test@example.com")
+        now = timezone.now()
+        self.loans = []
+        for i in range(5):
+            book = Book.objects.create(title=f"Book {i}", isbn=f"isbn-{i}", author=self.author)
+            loan = Loan.objects.create(book=book, member=self.member, due_at=now + timedelta(days=14))
+            self.loans.append(loan)
+        # Loans 0-2 were returned late two years ago, loan 3 last week, loan 4 is active
+        old = now - timedelta(days=730)
+        Loan.objects.filter(pk__in=[loan.pk for loan in self.loans[:3]]).update(
+            loaned_at=old, due_at=old + timedelta(days=14), returned_at=old + timedelta(days=30)
+        )
+        Loan.objects.filter(pk=self.loans[3].pk).update(returned_at=now - timedelta(days=7))
+
+    def test_archive_moves_only_old_returned_loans(self):
+        """Test that only loans returned before the cutoff are archived."""
+        out = StringIO()
+        call_command('archive_loans', older_than=365, batch_size=2, stdout=out)
+        self.assertIn('3 loans', out.getvalue())
+        self.assertEqual(
+            sorted(ArchivedLoan.objects.values_list('pk', flat=True)),
+            [loan.pk for loan in self.loans[:3]],
+        )
+        self.assertEqual(Loan.objects.count(), 2)
+
+        call_command('archive_loans', older_than=365, stdout=StringIO())
+        self.assertEqual(ArchivedLoan.objects.count(), 3)
+
+    def test_history_stores_cover_both_tables(self):
+        """Test that loan_stores() splits a filter across the hot and archive tables."""
+        call_command('archive_loans', older_than=365, stdout=StringIO())
+        loans, archived = archive.loan_stores(member=self.member)
+        self.assertEqual((loans.count(), archived.count()), (2, 3))
+        self.assertEqual(archived.get(pk=self.loans[0].pk).book_id, self.loans[0].book_id)
+        member = Member.objects.with_loan_counts().get()
+        self.assertEqual((member.loan_count, member.active_loan_count), (5, 1))
+
+    def test_member_loans_api_includes_archive(self):
+        """Test that the member loans API pages over hot and archived loans."""
+        call_command('archive_loans', older_than=365, stdout=StringIO())
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        ids = []
+        url = f'/api/members/{self.member.pk}/loans/?limit=2'
+        while url:
+            data = self.client.get(url).json()
+            ids += [row['id'] for row in data['results']]
+            url = data['next']
+        self.assertEqual(ids, [loan.pk for loan in reversed(self.loans)])
+
+        data = self.client.get(f'/api/members/{self.member.pk}/loans/?active=1').json()
+        self.assertEqual([row['id'] for row in data['results']], [self.loans[4].pk])
+
+    def test_risk_counts_archived_loans(self):
+        """Test that archiving loans does not change risk levels."""
+        risk.recompute()
+        level = MemberProfile.objects.get(member=self.member).risk_level
+        self.assertEqual(level, 'HIGH')
+        call_command('archive_loans', older_than=365, stdout=StringIO())
+        risk.recompute()
+        self.assertEqual(MemberProfile.objects.get(member=self.member).risk_level, level)
+
+
+class TagFacetTest(TestCase):
+    """Test cases for the materialized tag x status counts."""
+
+    def setUp(self):
+        self.author = Author.objects.create(name="Test Author")
+        self.fantasy = Tag.objects.create(name="Fantasy")
+        self.poetry = Tag.objects.create(name="Poetry")
+        self.books = [
+            Book.objects.create(title=f"Book {i}", isbn=f"isbn-{i}", author=self.author)
+            for i in range(3)
+        ]
+        for book in self.books:
+            BookTag.objects.create(book=book, tag=self.fantasy)
+        BookTag.objects.create(book=self.books[0], tag=self.poetry)
+        self.member = Member.objects.create(full_name="Test Member", email="test@example.com")
+
+    def counts(self):
+        return {facet['name']: facet['counts'] for facet in facets.tag_facets()}
+
+    def test_counts_follow_tags_and_status(self):
+        """Test that the facet triggers track tagging and status changes."""
+        self.assertEqual(self.counts()['Fantasy'], {'AVAILABLE': 3, 'LOANED': 0, 'LOST': 0})
+
+        loan = Loan.objects.create(book=self.books[0], member=self.member, due_at=timezone.now() + timedelta(days=7))
+        self.books[1].mark_lost()
+        self.assertEqual(self.counts()['Fantasy'], {'AVAILABLE': 1, 'LOANED': 1, 'LOST': 1})
+        self.assertEqual(self.counts()['Poetry'], {'AVAILABLE': 0, 'LOANED': 1, 'LOST': 0})
+
+        Loan.objects.filter(pk=loan.pk).bulk_return()
+        BookTag.objects.filter(book=self.books[2], tag=self.fantasy).delete()
+        BookTag.objects.filter(book=self.books[0], tag=self.poetry).update(tag=self.fantasy, book=self.books[2])
+        self.assertEqual(self.counts(), {'Fantasy': {'AVAILABLE': 2, 'LOANED': 0, 'LOST': 1}})
+        self.assertEqual(facets.drift(), {})
+
+    def test_rebuild_command_and_endpoint(self):
+        """Test the rebuild_tag_facets command and the facets endpoint."""
+        TagFacet.objects.update(book_count=0)
+        with self.assertRaises(CommandError):
+            call_command('rebuild_tag_facets', check=True, stdout=StringIO())
+        call_command('rebuild_tag_facets', stdout=StringIO())
+        self.assertEqual(facets.drift(), {})
+
+        response = self.client.get('/api/tags/facets/')
+        self.assertEqual(
+            [(row['name'], row['counts']['AVAILABLE'], row['total']) for row in response.json()['results']],
+            [('Fantasy', 3, 3), ('Poetry', 1, 1)],
+        )
+
+
+class RecommendationTest(TestCase):
+    """Test cases for the "also borrowed" recommendations."""
+
+    def setUp(self):
+        author = Author.objects.create(name="Test Author")
+        self.books = [
+            Book.objects.create(title=f"Book {i}", isbn=f"isbn-{i}", author=author)
+            for i in range(4)
+        ]
+        self.members = [
+            Member.objects.create(full_name=f"Member {i}", email=f"m{i}@example.com")
+            for i in range(3)
+        ]
+        # Books 0 and 1 are borrowed together twice, 0 and 2 once
+        self.borrow(self.members[0], [0, 1, 2])
+        self.borrow(self.members[1], [0, 1])
+
+    def borrow(self, member, indexes):
+        due = timezone.now() + timedelta(days=14)
+        for i in indexes:
+            Loan.objects.create(book=self.books[i], member=member, due_at=due).return_book()
+
+    def neighbours(self, index):
+        return [
+            (self.books.index(rec.recommended), rec.co_borrowers)
+            for rec in recommendations.also_borrowed(self.books[index].pk)
+        ]
+
+    def test_full_build(self):
+        """Test that a full build ranks books by shared borrowers."""
+        run = recommendations.build()
+        self.assertFalse(run.incremental)
+        self.assertEqual(run.books_updated, 3)
+        self.assertEqual(self.neighbours(0), [(1, 2), (2, 1)])
+        self.assertEqual(self.neighbours(2), [(0, 1), (1, 1)])
+        self.assertEqual(self.neighbours(3), [])
+
+    def test_incremental_build_folds_in_new_loans(self):
+        """Test that an incremental build picks up loans made since the last build."""
+        recommendations.build()
+        self.borrow(self.members[2], [3, 2])
+        self.borrow(self.members[1], [3])
+        run = recommendations.build(incremental=True)
+        self.assertTrue(run.incremental)
+        # Member 1 and member 2 borrowed books 0, 1, 2 and 3 between them
+        self.assertEqual(run.books_updated, 4)
+        self.assertEqual(self.neighbours(3), [(0, 1), (1, 1), (2, 1)])
+        self.assertEqual(self.neighbours(2), [(0, 1), (1, 1), (3, 1)])
+
+        incremental = {i: self.neighbours(i) for i in range(4)}
+        recommendations.build()
+        self.assertEqual({i: self.neighbours(i) for i in range(4)}, incremental)
+
+    def test_endpoint_is_one_lookup(self):
+        """Test that the also-borrowed endpoint serves the stored list without recomputing it."""
+        call_command('build_recommendations', top_k=1, stdout=StringIO())
+        with self.assertNumQueries(2):
+            response = self.client.get(f'/api/books/{self.books[0].pk}/also-borrowed/')
+        self.assertEqual(
+            response.json()['results'],
+            [{'id': self.books[1].pk, 'title': 'Book 1', 'author': 'Test Author', 'co_borrowers': 2}],
+        )
+        self.assertEqual(self.client.get('/api/books/999999/also-borrowed/').status_code, 404)
+
+
+class MemberDashboardTest(TestCase):
+    """Test cases for the member dashboard service and endpoint."""
+
+    def setUp(self):
+        self.author = Author.objects.create(name="Test Author")
+        self.member = Member.objects.create(full_name="Test Member", email="test@example.com")
+        MemberProfile.objects.create(member=self.member, nickname="Tee", risk_level='MED')
+        self.count = 0
+
+    def add_loans(self, active, returned):
+        now = timezone.now()
+        for _ in range(active + returned):
+            book = Book.objects.create(title=f"Book {self.count}", isbn=f"isbn-{self.count}", author=self.author)
+            self.count += 1
+            loan = Loan.objects.create(book=book, member=self.member, due_at=now + timedelta(days=14))
+            if returned:
+                returned -= 1
+                loan.return_book()
+
+    def test_query_count_does_not_grow_with_loans(self):
+        """Test that the dashboard costs four queries however many loans a member has."""
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        self.add_loans(active=1, returned=1)
+        # Session and user, then the dashboard's four queries
+        with self.assertNumQueries(6):
+            small = self.client.get(f'/api/members/{self.member.pk}/dashboard/').json()
+        self.add_loans(active=20, returned=30)
+        with self.assertNumQueries(6):
+            large = self.client.get(f'/api/members/{self.member.pk}/dashboard/').json()
+        self.assertEqual((len(small['active_loans']), len(small['recent_loans'])), (1, 1))
+        self.assertEqual((len(large['active_loans']), len(large['recent_loans'])), (21, dashboard.RECENT_LOANS))
+
+    def test_recent_loans_include_archive(self):
+        """Test that archived loans stay in the recent loans, merged newest first."""
+        self.add_loans(active=1, returned=3)
+        returned = list(Loan.objects.filter(returned_at__isnull=False).order_by('pk'))
+        for days, loan in zip((400, 2, 1), returned):
+            Loan.objects.filter(pk=loan.pk).update(returned_at=timezone.now() - timedelta(days=days))
+        call_command('archive_loans', older_than=365, stdout=StringIO())
+        self.assertEqual(ArchivedLoan.objects.get().pk, returned[0].pk)
+
+        summary = dashboard.member_summary(self.member.pk)
+        self.assertEqual([loan['id'] for loan in summary['recent_loans']], [loan.pk for loan in reversed(returned)])
+        summary = dashboard.member_summary(self.member.pk, recent=2)
+        self.assertEqual([loan['id'] for loan in summary['recent_loans']], [returned[2].pk, returned[1].pk])
+
+    def test_summary_flags(self):
+        """Test the overdue and returned-late flags, and that the endpoint is staff only."""
+        self.add_loans(active=2, returned=1)
+        overdue = Loan.objects.active().first()
+        Loan.objects.filter(pk=overdue.pk).update(due_at=timezone.now() - timedelta(days=1))
+        Loan.objects.filter(returned_at__isnull=False).update(due_at=F('returned_at') - timedelta(days=2))
+
+        summary = dashboard.member_summary(self.member.pk)
+        self.assertEqual(summary['profile'], {'nickname': 'Tee', 'risk_level': 'MED'})
+        self.assertEqual(summary['overdue_count'], 1)
+        self.assertEqual(summary['active_loans'][0]['id'], overdue.pk)
+        self.assertEqual(summary['active_loans'][0]['book']['author'], 'Test Author')
+        self.assertTrue(summary['recent_loans'][0]['returned_late'])
+
+        self.assertEqual(self.client.get(f'/api/members/{self.member.pk}/dashboard/').status_code, 302)
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        self.assertEqual(self.client.get('/api/members/999999/dashboard/').status_code, 404)
+
+
+class LibraryStatsTest(TestCase):
+    """Test cases for the SQL circulation statistics."""
+
+    def setUp(self):
+        self.le_guin = Author.objects.create(name="Ursula K. Le Guin")
+        self.tolkien = Author.objects.create(name="J.R.R. Tolkien")
+        fantasy = Tag.objects.create(name="Fantasy")
+        self.books = [
+            Book.objects.create(title="A Wizard of Earthsea", isbn="isbn-1", author=self.le_guin),
+            Book.objects.create(title="The Lathe of Heaven", isbn="isbn-2", author=self.le_guin),
+            Book.objects.create(title="The Hobbit", isbn="isbn-3", author=self.tolkien),
+        ]
+        BookTag.objects.create(book=self.books[0], tag=fantasy)
+        BookTag.objects.create(book=self.books[2], tag=fantasy)
+        member = Member.objects.create(full_name="Test Member", email="test@example.com")
+
+        def loan(book, loaned, days, due_days=14):
+            created = Loan.objects.create(book=book, member=member, due_at=timezone.now() + timedelta(days=1))
+            loaned_at = datetime(2024, *loaned, tzinfo=dt_timezone.utc)
+            Loan.objects.filter(pk=created.pk).update(
+                loaned_at=loaned_at,
+                due_at=loaned_at + timedelta(days=due_days),
+                returned_at=loaned_at + timedelta(days=days),
+            )
+            book.refresh_from_db()
+            book.status = 'AVAILABLE'
+            book.save()
+
+        loan(self.books[0], (1, 5), days=10)
+        loan(self.books[0], (1, 20), days=20)   # late, returned in February
+        loan(self.books[1], (2, 1), days=4)
+        loan(self.books[2], (2, 3), days=30)    # late
+        self.until = datetime(2024, 3, 1, tzinfo=dt_timezone.utc)
+
+    def rows(self, name, **options):
+        header, rows = stats.report(name, until=self.until, **options)
+        return [dict(zip(header, row)) for row in rows]
+
+    def test_counts_and_durations(self):
+        """Test the per-author, per-tag, duration and late-return reports."""
+        authors = self.rows('loans_per_author')
+        self.assertEqual([(row['author'], row['loans'], row['rank']) for row in authors],
+                         [("Ursula K. Le Guin", 3, 1), ("J.R.R. Tolkien", 1, 2)])
+        self.assertEqual([(row['tag'], row['loans']) for row in self.rows('loans_per_tag')], [("Fantasy", 3)])
+
+        duration, = self.rows('loan_duration')
+        self.assertEqual((duration['returned'], duration['avg_days'], duration['late_rate']), (4, 16.0, 0.5))
+
+        months = self.rows('late_returns_by_month')
+        self.assertEqual([(row['month'], row['returned'], row['late']) for row in months],
+                         [('2024-01', 1, 0), ('2024-02', 2, 1), ('2024-03', 1, 1)])
+
+    def test_rankings_and_utilisation(self):
+        """Test the top-books ranking and the utilisation report."""
+        top = self.rows('top_books_per_period', top=1)
+        self.assertEqual([(row['period'], row['book_id'], row['loans']) for row in top],
+                         [('2024-01', self.books[0].pk, 2), ('2024-02', self.books[1].pk, 1)])
+
+        window = {'since': datetime(2024, 2, 1, tzinfo=dt_timezone.utc)}
+        utilisation = {row['book_id']: row['days_loaned'] for row in self.rows('utilisation', **window)}
+        # Feb 1 - Mar 1: book 0 is out until Feb 9, book 1 for 4 days, book 2 from Feb 3 on
+        self.assertEqual(utilisation, {self.books[0].pk: 8.0, self.books[1].pk: 4.0, self.books[2].pk: 27.0})
+
+    def test_command_outputs(self):
+        """Test the library_stats JSON and CSV outputs."""
+        out = StringIO()
+        call_command('library_stats', until='2024-03-01', report=['loan_duration'], stdout=out)
+        self.assertEqual(json.loads(out.getvalue())['reports']['loan_duration'][0]['returned'], 4)
+
+        with tempfile.TemporaryDirectory() as directory:
+            call_command('library_stats', format='csv', output=directory, stdout=StringIO())
+            self.assertEqual(sorted(os.listdir(directory)), sorted(f'{name}.csv' for name in stats.REPORTS))
+
+
+class JobQueueTest(TestCase):
+    """Test cases for the background job queue and the admin actions that use it."""
+
+    def setUp(self):
+        cache.clear()
+        author = Author.objects.create(name="Test Author")
+        self.books = [
+            Book.objects.create(title=f"Book {i}", isbn=f"isbn-{i}", author=author) for i in range(3)
+        ]
+        self.member = Member.objects.create(full_name="Test Member", email="test@example.com")
+
+    def test_claim_is_exclusive_and_ordered(self):
+        """Test that the oldest due job is claimed once and future jobs wait."""
+        first = jobs.enqueue('facets.rebuild')
+        later = Job.objects.create(kind='facets.rebuild', run_after=timezone.now() + timedelta(hours=1))
+
+        claimed = jobs.claim('worker-1')
+        self.assertEqual((claimed.pk, claimed.status, claimed.attempts), (first.pk, 'RUNNING', 1))
+        self.assertIsNone(jobs.claim('worker-2'))
+        later.refresh_from_db()
+        self.assertEqual(later.status, 'QUEUED')
+
+        with self.assertRaises(ValidationError):
+            jobs.enqueue('no.such.job')
+
+    def test_run_reports_progress_and_result(self):
+        """Test that a finished job records its progress and result."""
+        jobs.enqueue('books.set_status', book_ranges=[[self.books[0].pk, self.books[1].pk]], status='LOST')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(jobs.work(burst=True), 1)
+
+        job = Job.objects.get()
+        self.assertEqual((job.status, job.progress, job.total), ('DONE', 2, 2))
+        self.assertEqual(job.result, {'books_updated': 2})
+        self.assertEqual(availability.get_status(self.books[0].pk), 'LOST')
+        self.assertEqual(Book.objects.get(pk=self.books[2].pk).status, 'AVAILABLE')
+
+    def test_failures_are_retried_then_failed(self):
+        """Test that a failing job is retried with a delay, then marked FAILED."""
+        def explode(progress):
+            raise RuntimeError("boom")
+
+        with mock.patch.dict(jobs.HANDLERS, {'test.explode': explode}):
+            job = jobs.enqueue('test.explode', max_attempts=2)
+            job = jobs.run(jobs.claim('worker'))
+            self.assertEqual(job.status, 'QUEUED')
+            self.assertIn("boom", job.error)
+            self.assertGreater(job.run_after, timezone.now())
+            self.assertIsNone(jobs.claim('worker'))
+
+            Job.objects.filter(pk=job.pk).update(run_after=timezone.now())
+            job = jobs.run(jobs.claim('worker'))
+            self.assertEqual((job.status, job.attempts), ('FAILED', 2))
+
+    def test_stale_jobs_are_requeued(self):
+        """Test that a RUNNING job without a heartbeat goes back in the queue."""
+        job = jobs.enqueue('facets.rebuild')
+        jobs.claim('dead-worker')
+        Job.objects.filter(pk=job.pk).update(heartbeat_at=timezone.now() - timedelta(hours=2))
+        self.assertEqual(jobs.requeue_stale(stale_after=3600), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'QUEUED')
+
+    def test_requeued_job_is_not_finished_by_its_old_worker(self):
+        """Test that a worker whose job was requeued as stale stops and records nothing."""
+        jobs.enqueue('facets.rebuild')
+        first = jobs.claim('worker-1')
+        Job.objects.filter(pk=first.pk).update(heartbeat_at=timezone.now() - timedelta(hours=2))
+        jobs.requeue_stale(stale_after=3600)
+        second = jobs.claim('worker-2')
+
+        self.assertIsNone(jobs.run(first))
+        job = Job.objects.get()
+        self.assertEqual((job.status, job.worker, job.attempts), ('RUNNING', 'worker-2', 2))
+        self.assertEqual(jobs.run(second).status, 'DONE')
+
+    def test_export_handler_writes_file(self):
+        """Test that run_worker runs an export job to a file."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'books.csv')
+            jobs.enqueue('export', kind='books', path=path)
+            call_command('run_worker', burst=True, stdout=StringIO())
+            with open(path) as output:
+                self.assertEqual(len(output.read().splitlines()), 4)
+        self.assertEqual(Job.objects.get().result, {'path': path, 'rows': 3})
+
+    def test_process_pool_needs_fork(self):
+        """Test that --pool process is refused where processes cannot be forked."""
+        with mock.patch('multiprocessing.get_all_start_methods', return_value=['spawn']):
+            with self.assertRaisesMessage(CommandError, "--pool thread"):
+                call_command('run_worker', pool='process', burst=True, stdout=StringIO())
+
+    @override_settings(LIBRARY_JOB_INLINE_LIMIT=1)
+    def test_large_admin_actions_are_enqueued(self):
+        """Test that admin actions over the inline limit are enqueued and small ones run inline."""
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        self.client.post('/admin/library/book/', {
+            'action': 'mark_as_lost',
+            '_selected_action': [book.pk for book in self.books[:2]],
+        })
+        self.assertEqual(Book.objects.filter(status='LOST').count(), 0)
+
+        Loan.objects.bulk_checkout([(self.books[2], self.member)], due_at=timezone.now() + timedelta(days=14))
+        self.client.post('/admin/library/loan/', {
+            'action': 'mark_as_returned',
+            '_selected_action': list(Loan.objects.values_list('pk', flat=True)),
+        })
+        self.assertTrue(Loan.objects.get().returned_at)   # a single loan stays inline
+
+        job = Job.objects.get()
+        self.assertEqual(job.kind, 'books.set_status')
+        self.assertEqual(job.payload, {'book_ranges': [[self.books[0].pk, self.books[1].pk]], 'status': 'LOST'})
+        jobs.work(burst=True)
+        self.assertEqual(Book.objects.filter(status='LOST').count(), 2)
+
+    def test_pk_ranges(self):
+        """Test that pk_ranges() collapses a selection into runs of consecutive ids."""
+        first, second, third = (book.pk for book in self.books)
+        self.assertEqual(pk_ranges(Book.objects.all()), [[first, third]])
+        self.assertEqual(pk_ranges(Book.objects.exclude(pk=second)), [[first, first], [third, third]])
+        self.assertEqual(pk_ranges(Book.objects.none()), [])
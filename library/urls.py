@@ -0,0 +1,29 @@
+"""
+URL configuration for the library app's JSON API.
+"""
+from django.urls import path
+
+from . import views
+
+app_name = 'library'
+
+urlpatterns = [
+    path('books/', views.book_list, name='book-list'),
+    path('books/availability/', views.book_availability, name='book-availability'),
+    path('books/<int:book_id>/also-borrowed/', views.also_borrowed, name='book-also-borrowed'),
+    path('authors/', views.author_list, name='author-list'),
+    path('tags/', views.tag_list, name='tag-list'),
+    path('tags/facets/', views.tag_facets, name='tag-facets'),
+    path('members/<int:member_id>/loans/', views.member_loans, name='member-loans'),
+    path('members/<int:member_id>/active-loans/', views.member_active_loans, name='member-active-loans'),
+    path('members/<int:member_id>/dashboard/', views.member_dashboard, name='member-dashboard'),
+    path('search/', views.catalog_search, name='catalog-search'),
+    path('async/books/availability/', views.async_book_availability, name='async-book-availability'),
+    path(
+        'async/members/<int:member_id>/active-loans/',
+        views.async_member_active_loans,
+        name='async-member-active-loans',
+    ),
+    path('async/search/', views.async_catalog_search, name='async-catalog-search'),
+    path('export/<str:kind>/', views.export, name='export'),
+]
@@ -1,6 +1,290 @@
 """
 Views for the library app.
 
-Currently empty - this project focuses on models, relationships, and migrations.
-In a full project, views would handle HTTP requests and display data.
+Read-only JSON endpoints for the catalog. Lists use keyset pagination
+(see ``library.pagination``) and serialize straight from ``values()``, so
+every page costs a fixed number of queries whatever its depth.
+
+The hottest lookups (availability, a member's active loans and catalog
+search) also have ``async`` versions under ``/api/async/`` built on the
+async ORM and cache APIs, for deployment behind ``library_demo.asgi``.
 """
+
+from asgiref.sync import sync_to_async
+from django.contrib.admin.views.decorators import staff_member_required
+from django.contrib.auth.views import redirect_to_login
+from django.core.exceptions import ValidationError
+from django.http import Http404, HttpResponseNotAllowed, JsonResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.views.decorators.http import require_GET
+
+from . import archive, availability, dashboard, exports, facets, recommendations, search
+from .models import Author, Book, Loan, Member, Tag
+from .pagination import InvalidCursor, keyset_page, keyset_union_page
+
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+def page_size(request):
+    try:
+        limit = int(request.GET.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        limit = DEFAULT_PAGE_SIZE
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def paginated_response(request, queryset, ordering, fields):
+    """
+    Render one keyset page as ``{"results": [...], "next": url}``.
+    ``queryset`` may also be a tuple of querysets to page over as one.
+    """
+    paginate = keyset_union_page if isinstance(queryset, tuple) else keyset_page
+    try:
+        rows, next_cursor = paginate(
+            queryset, ordering, fields, cursor=request.GET.get('cursor'), limit=page_size(request)
+        )
+    except InvalidCursor as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+
+    next_url = None
+    if next_cursor:
+        params = request.GET.copy()
+        params['cursor'] = next_cursor
+        next_url = f'{request.path}?{params.urlencode()}'
+    return JsonResponse({'results': rows, 'next': next_url})
+
+
+@require_GET
+def book_list(request):
+    """Books ordered by title, optionally filtered by status or author."""
+    queryset = Book.objects.all()
+    if request.GET.get('status'):
+        queryset = queryset.filter(status=request.GET['status'])
+    if request.GET.get('author'):
+        try:
+            queryset = queryset.filter(author_id=int(request.GET['author']))
+        except ValueError:
+            return JsonResponse({'error': "Invalid author id"}, status=400)
+    return paginated_response(
+        request, queryset, ('title', 'id'),
+        ('id', 'title', 'isbn', 'status', 'author_id', 'author__name'),
+    )
+
+
+@require_GET
+def author_list(request):
+    """Authors ordered by name."""
+    return paginated_response(request, Author.objects.all(), ('name', 'id'), ('id', 'name', 'country'))
+
+
+@require_GET
+def tag_list(request):
+    """Tags ordered by name."""
+    return paginated_response(request, Tag.objects.all(), ('name', 'id'), ('id', 'name', 'description'))
+
+
+@require_GET
+def tag_facets(request):
+    """Every tag with its book counts per status, from the materialized facet table."""
+    return JsonResponse({'results': facets.tag_facets()})
+
+
+@staff_member_required
+@require_GET
+def member_loans(request, member_id):
+    """
+    A member's loans, newest first, including archived ones;
+    ``?active=1`` limits to unreturned loans. Staff only.
+    """
+    get_object_or_404(Member.objects.only('pk'), pk=member_id)
+    if request.GET.get('active') in ('1', 'true'):
+        queryset = Loan.objects.filter(member_id=member_id).active()
+    else:
+        queryset = archive.loan_stores(member_id=member_id)
+    return paginated_response(
+        request, queryset, ('-loaned_at', '-id'),
+        ('id', 'book_id', 'book__title', 'book__isbn', 'loaned_at', 'due_at', 'returned_at'),
+    )
+
+
+def method_not_allowed(request):
+    """``require_GET`` for async views (the decorator only wraps async views on Django 5+)."""
+    if request.method not in ('GET', 'HEAD'):
+        return HttpResponseNotAllowed(['GET', 'HEAD'])
+    return None
+
+
+def is_staff(user):
+    return user.is_active and user.is_staff
+
+
+async def staff_login_required(request):
+    """``staff_member_required`` for async views: the admin login redirect, or None."""
+    if await sync_to_async(is_staff)(request.user):
+        return None
+    return redirect_to_login(request.get_full_path(), reverse('admin:login'))
+
+
+def availability_params(request):
+    """Return ``(isbns, ids, error_response)`` from ``?isbn=`` / ``?id=`` parameters."""
+    isbns = request.GET.getlist('isbn')[:MAX_PAGE_SIZE]
+    try:
+        ids = [int(book_id) for book_id in request.GET.getlist('id')[:MAX_PAGE_SIZE]]
+    except ValueError:
+        return isbns, [], JsonResponse({'error': 'id parameters must be integers'}, status=400)
+    if not isbns and not ids:
+        return isbns, ids, JsonResponse({'error': 'Pass at least one isbn or id parameter'}, status=400)
+    return isbns, ids, None
+
+
+def availability_response(isbns, ids, statuses, isbn_to_id):
+    results = [
+        {'id': isbn_to_id[isbn], 'isbn': isbn, 'status': statuses[isbn_to_id[isbn]]}
+        for isbn in isbns if isbn_to_id.get(isbn) in statuses
+    ]
+    results += [{'id': book_id, 'status': statuses[book_id]} for book_id in ids if book_id in statuses]
+    for row in results:
+        row['available'] = row['status'] == 'AVAILABLE'
+    return JsonResponse({'results': results})
+
+
+@require_GET
+def also_borrowed(request, book_id):
+    """Books most often borrowed by members who borrowed ``book_id``."""
+    get_object_or_404(Book.objects.only('pk'), pk=book_id)
+    results = [
+        {
+            'id': rec.recommended_id,
+            'title': rec.recommended.title,
+            'author': rec.recommended.author.name,
+            'co_borrowers': rec.co_borrowers,
+        }
+        for rec in recommendations.also_borrowed(book_id, limit=page_size(request))
+    ]
+    return JsonResponse({'results': results})
+
+
+@require_GET
+def book_availability(request):
+    """
+    Status of the books given by one or more ``?isbn=`` or ``?id=`` parameters.
+    Answered from the availability cache; misses cost one query.
+    """
+    isbns, ids, error = availability_params(request)
+    if error:
+        return error
+    return availability_response(isbns, ids, *availability.get_many(ids=ids, isbns=isbns))
+
+
+async def async_book_availability(request):
+    """Async version of ``book_availability``."""
+    if error := method_not_allowed(request):
+        return error
+    isbns, ids, error = availability_params(request)
+    if error:
+        return error
+    return availability_response(isbns, ids, *await availability.aget_many(ids=ids, isbns=isbns))
+
+
+ACTIVE_LOAN_FIELDS = ('id', 'book_id', 'book__title', 'book__isbn', 'loaned_at', 'due_at')
+
+
+def active_loans_queryset(member_id, limit):
+    return Loan.objects.filter(member_id=member_id).active().order_by('due_at').values(*ACTIVE_LOAN_FIELDS)[:limit]
+
+
+@staff_member_required
+@require_GET
+def member_active_loans(request, member_id):
+    """A member's active loans (soonest due first) and how many there are. Staff only."""
+    get_object_or_404(Member.objects.only('pk'), pk=member_id)
+    loans = list(active_loans_queryset(member_id, page_size(request)))
+    count = Loan.objects.filter(member_id=member_id).active().count()
+    return JsonResponse({'count': count, 'results': loans})
+
+
+@staff_member_required
+@require_GET
+def member_dashboard(request, member_id):
+    """A member's profile, active loans with overdue flags and recent returns. Staff only."""
+    try:
+        summary = dashboard.member_summary(member_id)
+    except Member.DoesNotExist:
+        raise Http404("No Member matches the given query.")
+    return JsonResponse(summary)
+
+
+async def async_member_active_loans(request, member_id):
+    """Async version of ``member_active_loans``."""
+    if error := method_not_allowed(request) or await staff_login_required(request):
+        return error
+    if not await Member.objects.filter(pk=member_id).aexists():
+        raise Http404("No Member matches the given query.")
+    loans = [loan async for loan in active_loans_queryset(member_id, page_size(request))]
+    count = await Loan.objects.filter(member_id=member_id).active().acount()
+    return JsonResponse({'count': count, 'results': loans})
+
+
+SEARCH_FIELDS = ('id', 'title', 'isbn', 'status', 'author__name')
+
+
+def search_results(book_ids, rows):
+    """Order ``rows`` by the rank order of ``book_ids``."""
+    by_id = {row['id']: row for row in rows}
+    return [by_id[book_id] for book_id in book_ids if book_id in by_id]
+
+
+@require_GET
+def catalog_search(request):
+    """Books matching ``?q=`` in title, author or tags, best match first."""
+    text = request.GET.get('q', '').strip()
+    if not text:
+        return JsonResponse({'results': []})
+    limit = page_size(request)
+    if not search.is_available():
+        rows = Book.objects.filter(title__icontains=text).values(*SEARCH_FIELDS)[:limit]
+        return JsonResponse({'results': list(rows)})
+    book_ids = search.search_book_ids(text, limit=limit)
+    rows = Book.objects.filter(pk__in=book_ids).values(*SEARCH_FIELDS)
+    return JsonResponse({'results': search_results(book_ids, rows)})
+
+
+async def async_catalog_search(request):
+    """Async version of ``catalog_search``."""
+    if error := method_not_allowed(request):
+        return error
+    text = request.GET.get('q', '').strip()
+    if not text:
+        return JsonResponse({'results': []})
+    limit = page_size(request)
+    if not await sync_to_async(search.is_available)():
+        rows = Book.objects.filter(title__icontains=text).values(*SEARCH_FIELDS)[:limit]
+        return JsonResponse({'results': [row async for row in rows]})
+    # The FTS query is raw SQL, which has no async API yet
+    book_ids = await sync_to_async(search.search_book_ids)(text, limit=limit)
+    rows = [row async for row in Book.objects.filter(pk__in=book_ids).values(*SEARCH_FIELDS)]
+    return JsonResponse({'results': search_results(book_ids, rows)})
+
+
+@staff_member_required
+@require_GET
+def export(request, kind):
+    """
+    Stream loans, books or members as CSV (default) or NDJSON.
+    Loan exports accept loaned_after/loaned_before/returned_after/returned_before.
+    """
+    fmt = request.GET.get('format', 'csv')
+    filters = {name: request.GET.get(name) for name in exports.LOAN_FILTERS if request.GET.get(name)}
+    try:
+        header, rows = exports.export_queryset(kind, filters)
+        lines = exports.render(fmt, header, rows)
+    except ValidationError as exc:
+        return JsonResponse({'error': exc.messages[0]}, status=400)
+
+    content_type = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    response = StreamingHttpResponse(lines, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{kind}.{fmt}"'
+    return response
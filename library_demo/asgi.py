@@ -0,0 +1,11 @@
+"""
+ASGI config for library_demo project.
+"""
+
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'library_demo.settings')
+
+application = get_asgi_application()
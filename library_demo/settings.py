@@ -56,8 +56,13 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'library_demo.wsgi.application'
+ASGI_APPLICATION = 'library_demo.asgi.application'
 
 # Database
+# LIBRARY_DB_PROFILE=production enables WAL mode and the other pragmas in
+# library/db.py on every connection, plus persistent connections.
+DB_PROFILE = os.environ.get('LIBRARY_DB_PROFILE', 'default')
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
@@ -65,6 +70,56 @@ DATABASES = {
     }
 }
 
+LIBRARY_SQLITE_PRAGMAS = {}
+
+if DB_PROFILE == 'production':
+    from library.db import PRODUCTION_PRAGMAS
+
+    # The lock wait comes from PRAGMA busy_timeout in PRODUCTION_PRAGMAS;
+    # sqlite3's ``timeout`` option would be overridden by it, so it is not set
+    DATABASES['default'].update({
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+    })
+    LIBRARY_SQLITE_PRAGMAS = PRODUCTION_PRAGMAS
+
+# Cache
+# LIBRARY_REDIS_URL (e.g. redis://localhost:6379/0, needs the redis package)
+# gives the web process, run_worker and the management commands one shared
+# cache; without it each process has its own locmem cache.
+REDIS_URL = os.environ.get('LIBRARY_REDIS_URL')
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'library-demo',
+            'OPTIONS': {'MAX_ENTRIES': 100000},
+        }
+    }
+
+# Book availability cache (see library/availability.py). Every process that
+# changes book status writes through to it, so it is only enabled on the
+# shared cache; None reads availability from the database.
+LIBRARY_AVAILABILITY_CACHE = 'default' if REDIS_URL else None
+LIBRARY_AVAILABILITY_TIMEOUT = 3600
+
+# Admin changelists for Book, Loan and BookTag stop counting exactly above
+# this many rows (see library.pagination.ApproximateCountPaginator)
+LIBRARY_ADMIN_COUNT_THRESHOLD = 10000
+LIBRARY_ADMIN_COUNT_TIMEOUT = 60
+
+# Admin bulk actions on more rows than this are handed to a background job
+# instead of running inside the request (see library/jobs.py, run_worker)
+LIBRARY_JOB_INLINE_LIMIT = 1000
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
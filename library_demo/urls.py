@@ -2,8 +2,9 @@
 URL Configuration for library_demo project.
 """
 from django.contrib import admin
-from django.urls import path
+from django.urls import include, path
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('api/', include('library.urls')),
 ]